@@ -7,27 +7,80 @@ from flask_login import LoginManager
 from config import Config
 import os
 from flask_wtf.csrf import CSRFProtect
+from startup_profile import phase, report
+from tenancy import TenantSession, tenant_names, using_tenant
 
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': TenantSession})
 login_manager = LoginManager()
 login_manager.login_view = 'login'
 
-def create_app():
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
     
     csrf = CSRFProtect(app)
 
-    db.init_app(app)
-    login_manager.init_app(app)
+    with phase('extensions'):
+        db.init_app(app)
+        login_manager.init_app(app)
 
-    with app.app_context():
-        from models import User, Device
-        db.create_all()
+    with phase('tenancy'):
+        from tenancy import init_tenancy
+        init_tenancy(app)
 
-    from routes import main as main_blueprint
-    app.register_blueprint(main_blueprint)
+    # Before anything writes, so migrations are journaled too
+    with phase('journal'):
+        from journal import init_journal
+        with app.app_context():
+            init_journal(app, db.engine)
 
+    with phase('models'):
+        import models
+
+    # Schema changes are an explicit step now, see migrations.py
+    with phase('schema check'):
+        from migrations import check_schema
+        for tenant in tenant_names(app):
+            with using_tenant(tenant):
+                check_schema(app)
+
+    with phase('asset index'):
+        from asset_index import init_asset_index
+        init_asset_index(app)
+
+    with phase('change tracking'):
+        from change_tracking import init_change_tracking
+        init_change_tracking(app)
+
+    with phase('change feed'):
+        from change_feed import init_change_feed
+        init_change_feed(app)
+
+    with phase('lifecycle'):
+        from lifecycle import init_lifecycle
+        init_lifecycle(app)
+
+    with phase('list cache'):
+        from list_cache import init_list_cache
+        init_list_cache(app)
+
+    with phase('scanning'):
+        from scanning import init_scanning
+        init_scanning(app)
+
+    with phase('metrics'):
+        from metrics import init_metrics
+        init_metrics(app)
+
+    with phase('query profiler'):
+        from query_profiler import init_query_profiler
+        init_query_profiler(app)
+
+    with phase('routes'):
+        from routes import main as main_blueprint
+        app.register_blueprint(main_blueprint)
+
+    report(app.logger)
     return app
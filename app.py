@@ -1,8 +1,13 @@
+import startup_profile
+startup_profile.install()
+
 from __init__ import create_app
 from scheduler import start_scheduler
+from task_queue import start_task_workers
 
 app = create_app()
-start_scheduler()
+start_scheduler(app)
+start_task_workers(app)
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,98 @@
+# Dev Dominic Minnich 2024
+# asset_index.py
+
+# Keeps the AssetIndex table in step with every column that holds an asset tag,
+# so /lookup/<asset> can find all references with one indexed query.
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from __init__ import db
+from models import AssetIndex, Device, Personnel, Staff, Repair
+
+
+ASSET_FIELDS = {
+    Device: ("device", ["asset_number"]),
+    Personnel: ("personnel", ["device_id", "powercord_id"]),
+    Staff: ("staff", ["device_id", "powercord_id"]),
+    Repair: ("repair", ["asset_id", "loaner_id", "new_computer_asset_id"]),
+}
+
+
+def normalize_asset(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def index_rows(obj, model=None):
+    # obj is a model instance, or a row with id and the asset columns
+    entity, fields = ASSET_FIELDS[model or type(obj)]
+    rows = []
+    for field in fields:
+        asset = normalize_asset(getattr(obj, field))
+        if asset:
+            rows.append(
+                {"asset": asset, "entity": entity, "entity_id": obj.id, "field": field}
+            )
+    return rows
+
+
+def asset_fields_changed(obj):
+    state = inspect(obj)
+    _, fields = ASSET_FIELDS[type(obj)]
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def remove_entries(connection, entity, entity_ids):
+    if entity_ids:
+        connection.execute(
+            AssetIndex.__table__.delete().where(
+                (AssetIndex.entity == entity) & (AssetIndex.entity_id.in_(entity_ids))
+            )
+        )
+
+
+def after_flush(session, flush_context):
+    stale = {}
+    rows = []
+    for obj in session.deleted:
+        if type(obj) in ASSET_FIELDS:
+            stale.setdefault(ASSET_FIELDS[type(obj)][0], []).append(obj.id)
+    for obj in session.dirty:
+        if type(obj) in ASSET_FIELDS and asset_fields_changed(obj):
+            stale.setdefault(ASSET_FIELDS[type(obj)][0], []).append(obj.id)
+            rows.extend(index_rows(obj))
+    for obj in session.new:
+        if type(obj) in ASSET_FIELDS:
+            rows.extend(index_rows(obj))
+
+    if not stale and not rows:
+        return
+    connection = session.connection()
+    for entity, entity_ids in stale.items():
+        remove_entries(connection, entity, entity_ids)
+    if rows:
+        connection.execute(AssetIndex.__table__.insert(), rows)
+
+
+def rebuild_asset_index():
+    # Full rebuild, used to backfill an existing database or repair drift
+    db.session.query(AssetIndex).delete()
+    rows = []
+    for model, (_, fields) in ASSET_FIELDS.items():
+        # Only the columns it needs: m002 runs this before later migrations
+        # have added the rest of the model's columns
+        columns = [model.id] + [getattr(model, field) for field in fields]
+        for row in db.session.query(*columns):
+            rows.extend(index_rows(row, model))
+    if rows:
+        db.session.execute(AssetIndex.__table__.insert(), rows)
+    db.session.commit()
+
+
+def init_asset_index(app):
+    # Existing databases are backfilled by a migration, see migrations.py
+    if not event.contains(Session, "after_flush", after_flush):
+        event.listen(Session, "after_flush", after_flush)
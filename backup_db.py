@@ -1,14 +1,16 @@
 # Dev Dominic Minnich 2024
 # backup_db.py
 
+import json
 import os
-import shutil
+import sqlite3
+import time
 from datetime import datetime
 
-def backup_database():
+def backup_database(source_file=None, backup_folder=None):
     # Define the paths
     instance_folder = os.path.join(os.getcwd(), 'instance')
-    backup_folder = os.path.join(os.getcwd(), 'backups')
+    backup_folder = backup_folder or os.path.join(os.getcwd(), 'backups')
 
     # Ensure the backup folder exists
     if not os.path.exists(backup_folder):
@@ -16,13 +18,36 @@ def backup_database():
 
     # Get the current date and time
     current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
+
     # Define the source and destination file paths
-    source_file = os.path.join(instance_folder, 'inventory.db')
+    source_file = source_file or os.path.join(instance_folder, 'inventory.db')
     destination_file = os.path.join(backup_folder, f'backup_{current_time}.db')
 
-    # Copy the file
-    shutil.copy2(source_file, destination_file)
+    # Copy the live database with SQLite's backup API. A second connection
+    # holds BEGIN IMMEDIATE so no writer can commit while the pages are
+    # copied, which makes the copy exactly the state at taken_ns and lets the
+    # change journal (journal.py) be replayed on top of it by restore_db.py.
+    # The backup can't run on the locking connection itself, SQLite reports it
+    # busy for as long as that connection has a write transaction open.
+    lock = sqlite3.connect(source_file, timeout=30, isolation_level=None)
+    source = sqlite3.connect(source_file, timeout=30)
+    destination = sqlite3.connect(destination_file)
+    try:
+        lock.execute('BEGIN IMMEDIATE')
+        taken_ns = time.time_ns()
+        source.backup(destination)
+        lock.execute('ROLLBACK')
+    finally:
+        destination.close()
+        source.close()
+        lock.close()
+
+    with open(snapshot_info_path(destination_file), 'w') as fh:
+        json.dump({'taken_ns': taken_ns, 'source': os.path.abspath(source_file)}, fh)
+    return destination_file
+
+def snapshot_info_path(backup_file):
+    return os.path.splitext(backup_file)[0] + '.json'
 
 if __name__ == '__main__':
     backup_database()
@@ -0,0 +1,218 @@
+# Dev Dominic Minnich 2024
+# backup_verify.py
+
+# Checks that backups are actually usable. A scheduler job picks up every
+# backup that hasn't been verified yet, hashes it, opens it read-only, runs
+# PRAGMA integrity_check and compares its row counts with the live tables.
+# The result is written to the backup's manifest (the JSON file next to it,
+# see backup_db.py) and the settings page shows the latest ones to admins.
+# The job is throttled: hashing is capped at BACKUP_VERIFY_MAX_MBPS and
+# integrity_check pauses every few thousand steps, so it never competes with
+# requests for disk I/O. prune_backups() keeps the folder to BACKUP_KEEP files
+# and tells the backup job how much of the change journal is still needed.
+
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from backup_db import snapshot_info_path
+from metrics import BACKUP_VERIFICATIONS
+from migrations import LATEST_VERSION, TABLES_SINCE
+from tenancy import tenant_dir
+
+
+CHUNK_SIZE = 1024 * 1024
+PROGRESS_STEPS = 10000  # SQLite VM steps between pauses
+PROGRESS_PAUSE = 0.002
+
+
+def backup_folder():
+    # Where the backup job writes the current tenant's backups
+    return os.path.join(tenant_dir() or os.getcwd(), "backups")
+
+
+def read_manifest(backup_file):
+    path = snapshot_info_path(backup_file)
+    if not os.path.exists(path):
+        return {}  # made before backups had manifests
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def write_manifest(backup_file, manifest):
+    path = snapshot_info_path(backup_file)
+    with open(path + ".tmp", "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def file_sha256(path, max_mbps):
+    digest = hashlib.sha256()
+    min_seconds = CHUNK_SIZE / (max_mbps * 1024 * 1024)
+    with open(path, "rb") as fh:
+        while True:
+            started = time.perf_counter()
+            chunk = fh.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            elapsed = time.perf_counter() - started
+            if elapsed < min_seconds:
+                time.sleep(min_seconds - elapsed)
+    return digest.hexdigest()
+
+
+def table_counts(conn):
+    names = [
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )
+    ]
+    return {name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in names}
+
+
+def pause():
+    time.sleep(PROGRESS_PAUSE)
+    return 0  # keep going
+
+
+def verify_backup(backup_file, live_counts, max_mbps, min_row_ratio):
+    problems = []
+    result = {
+        "verified_at": datetime.now().isoformat(timespec="seconds"),
+        "size": os.path.getsize(backup_file),
+        "sha256": file_sha256(backup_file, max_mbps),
+    }
+
+    conn = sqlite3.connect(f"file:{backup_file}?mode=ro", uri=True)
+    try:
+        conn.set_progress_handler(pause, PROGRESS_STEPS)
+        messages = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        result["integrity"] = messages[0] if messages == ["ok"] else messages[:20]
+        if messages != ["ok"]:
+            problems.append("integrity_check failed")
+        backup_counts = table_counts(conn)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        result.setdefault("integrity", str(e))
+        problems.append(f"could not be read: {e}")
+        backup_counts = {}
+        version = None
+    finally:
+        conn.close()
+
+    # A backup from before an upgrade lacks the tables later migrations
+    # added. That is expected, so it's noted and those tables are skipped.
+    notes = []
+    result["schema_version"] = version
+    if version is not None and version < LATEST_VERSION:
+        notes.append(f"schema version {version}, current is {LATEST_VERSION}")
+    expected = {
+        table: live
+        for table, live in live_counts.items()
+        if version is None or TABLES_SINCE.get(table, 1) <= max(version, 1)
+    }
+
+    # The live database has moved on since the backup, and log rows get
+    # archived out of it, so only a backup that is missing a table or has far
+    # fewer rows than live counts as suspicious
+    if backup_counts:
+        for table, live in expected.items():
+            if table not in backup_counts:
+                problems.append(f"table {table} is missing")
+            elif backup_counts[table] < live * min_row_ratio:
+                problems.append(f"{table} has {backup_counts[table]} rows, live has {live}")
+    result["row_counts"] = {
+        table: {"backup": backup_counts.get(table), "live": live}
+        for table, live in live_counts.items()
+    }
+    result["problems"] = problems
+    result["notes"] = notes
+    result["ok"] = not problems
+    return result
+
+
+def verify_backups(app, db_path):
+    # Verifies every backup without a result yet, oldest first
+    backup_files = sorted(glob.glob(os.path.join(backup_folder(), "backup_*.db")))
+    pending = [path for path in backup_files if "verification" not in read_manifest(path)]
+    if not pending:
+        return []
+
+    live = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        live.set_progress_handler(pause, PROGRESS_STEPS)
+        live_counts = table_counts(live)
+    finally:
+        live.close()
+
+    results = []
+    for path in pending:
+        result = verify_backup(
+            path,
+            live_counts,
+            app.config["BACKUP_VERIFY_MAX_MBPS"],
+            app.config["BACKUP_VERIFY_MIN_ROW_RATIO"],
+        )
+        manifest = read_manifest(path)
+        manifest["verification"] = result
+        write_manifest(path, manifest)
+        BACKUP_VERIFICATIONS.inc("ok" if result["ok"] else "failed")
+        results.append((os.path.basename(path), result))
+    return results
+
+
+def prune_backups(keep):
+    # Deletes all but the newest `keep` backups (0 keeps them all). The newest
+    # one that passed verification always stays, so there is a good backup to
+    # restore from even if every recent one failed. Returns the taken_ns from
+    # which the change journal is still needed: that of the oldest backup left
+    # that restore_db.py could pick, or None while no backup has been verified.
+    backup_files = sorted(
+        glob.glob(os.path.join(backup_folder(), "backup_*.db")), reverse=True
+    )
+    manifests = {path: read_manifest(path) for path in backup_files}
+    verified = [
+        path
+        for path in backup_files
+        if "taken_ns" in manifests[path] and manifests[path].get("verification", {}).get("ok")
+    ]
+    kept = backup_files[:keep] if keep else backup_files
+    if verified and verified[0] not in kept:
+        kept.append(verified[0])
+    for path in backup_files:
+        if path not in kept:
+            os.remove(path)
+            if os.path.exists(snapshot_info_path(path)):
+                os.remove(snapshot_info_path(path))
+    if not verified:
+        return None
+    return min(
+        manifests[path]["taken_ns"]
+        for path in kept
+        if "taken_ns" in manifests[path]
+        and manifests[path].get("verification", {}).get("integrity", "ok") == "ok"
+    )
+
+
+def backup_statuses(limit=10):
+    # Newest backups first, for the settings page
+    backup_files = sorted(
+        glob.glob(os.path.join(backup_folder(), "backup_*.db")), reverse=True
+    )[:limit]
+    statuses = []
+    for path in backup_files:
+        verification = read_manifest(path).get("verification")
+        statuses.append(
+            {
+                "name": os.path.basename(path),
+                "size": os.path.getsize(path),
+                "verification": verification,
+            }
+        )
+    return statuses
@@ -0,0 +1,210 @@
+# Dev Dominic Minnich 2024
+# benchmark.py
+
+# Times the hot routes against a synthetic database through the Flask test
+# client and writes the results as JSON so two runs can be compared.
+#   python benchmark.py --scale 10k --output bench_10k.json
+#   python benchmark.py --compare before.json after.json
+
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        "runs": len(samples),
+        "min_ms": round(min(samples) * 1000, 3),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+    }
+
+
+def time_request(client, method, url, repeat, expect=200, data_factory=None):
+    samples = []
+    for _ in range(repeat):
+        kwargs = {}
+        if data_factory:
+            kwargs = data_factory()
+        started = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        response.get_data()
+        samples.append(time.perf_counter() - started)
+        if response.status_code != expect:
+            raise RuntimeError(f"{method.upper()} {url} returned {response.status_code}")
+    return summarize(samples)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def csv_upload(client, url, filename, fix_row=None):
+    # Re-import what the matching export produced, the update path of the import
+    body = client.get(url).get_data()
+    if fix_row:
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        out = io.StringIO()
+        csv.writer(out).writerows([rows[0]] + [fix_row(row) for row in rows[1:]])
+        body = out.getvalue().encode()
+    return lambda: {
+        "data": {"file": (io.BytesIO(body), filename)},
+        "content_type": "multipart/form-data",
+    }
+
+
+def run(scale_name, repeat, workdir):
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+
+    from config import Config
+    import seed_data
+
+    class BenchConfig(Config):
+        AUTO_MIGRATE = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        WTF_CSRF_ENABLED = False
+        METRICS_ENABLED = False
+        SQL_PROFILING = False
+        # Journaling fsyncs every write, which would swamp what is measured
+        JOURNAL_ENABLED = False
+
+    from __init__ import create_app
+
+    scale = seed_data.SCALES[scale_name]
+    app = create_app(BenchConfig)
+    seed_started = time.perf_counter()
+    with app.app_context():
+        counts = seed_data.seed_database(scale["devices"], scale["logs_per_device"])
+    counts.update(
+        seed_data.seed_explorer(
+            os.path.join(workdir, "miniRoot"), scale["folders"], scale["files_per_folder"]
+        )
+    )
+    seed_seconds = time.perf_counter() - seed_started
+
+    client = app.test_client()
+    client.post(
+        "/login",
+        data={"username": seed_data.BENCH_USERNAME, "password": seed_data.BENCH_PASSWORD},
+    )
+
+    def device_row(row):
+        # Export writes ISO dates, the import wants Month/Day/Year
+        row[5] = datetime.date.fromisoformat(row[5]).strftime("%m/%d/%Y")
+        return row
+
+    def personnel_row(row):
+        # Personnel import expects a trailing graduation year column the export lacks
+        return row + ["2030"]
+
+    busiest_device = scale["devices"] // 2
+    results = {}
+    cases = [
+        ("manage_devices", "get", "/devices", {}),
+        ("manage_devices_search", "get", "/devices?search=Chromebook", {}),
+        ("manage_devices_sort_manufacturer", "get", "/devices?sort_by=manufacturer", {}),
+        ("manage_devices_search_sort", "get", "/devices?search=Dell&sort_by=assigned_user", {}),
+        ("manage_personnels", "get", "/personnels?sort_by=last_name", {}),
+        ("manage_staffs", "get", "/staffs", {}),
+        ("manage_repairs", "get", "/repairs", {}),
+        ("device_detail", "get", f"/devices/{busiest_device}", {}),
+        ("personnel_detail", "get", f"/personnels/{busiest_device}", {}),
+        ("staff_detail", "get", "/staffs/1", {}),
+        ("repair_detail", "get", "/repair/1/detail", {}),
+        ("export_devices", "get", "/export_devices", {}),
+        ("export_personnel", "get", "/export_personnel", {}),
+        ("export_staff", "get", "/export_staff", {}),
+        ("import_devices", "post", "/import_devices",
+         {"data_factory": csv_upload(client, "/export_devices", "devices.csv", device_row)}),
+        ("import_personnel", "post", "/import_personnel",
+         {"data_factory": csv_upload(
+             client, "/export_personnel", "personnel.csv", personnel_row
+         )}),
+        ("import_staff", "post", "/import_staff",
+         {"data_factory": csv_upload(client, "/export_staff", "staff.csv")}),
+        ("list_root", "get", "/list?dir=/", {}),
+        ("list_folder", "get", "/list?dir=/Folder%20000/Scans", {}),
+        ("list_query", "get", "/list?dir=/&query=document_0001", {}),
+        ("download_folder", "get", "/download_folder?folder_path=/Folder%20000", {}),
+    ]
+    for name, method, url, kwargs in cases:
+        # Imports and exports are slow at large scales, a few runs is plenty
+        runs = max(1, repeat // 5) if name.startswith(("import", "export", "download")) else repeat
+        results[name] = time_request(client, method, url, runs, **kwargs)
+        print(f"{name:36s} median {results[name]['median_ms']:10.2f} ms")
+
+    return {
+        "scale": scale_name,
+        "counts": counts,
+        "seed_seconds": round(seed_seconds, 2),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+
+
+def compare(before_path, after_path):
+    with open(before_path) as fh:
+        before = json.load(fh)
+    with open(after_path) as fh:
+        after = json.load(fh)
+    print(f"{'case':36s} {'before':>10s} {'after':>10s} {'change':>8s}")
+    for name, result in after["results"].items():
+        if name not in before["results"]:
+            continue
+        old = before["results"][name]["median_ms"]
+        new = result["median_ms"]
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"{name:36s} {old:10.2f} {new:10.2f} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Vault's hot routes.")
+    parser.add_argument("--scale", default="1k", choices=["1k", "10k", "100k"])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    output = os.path.abspath(args.output or f"bench_{args.scale}.json")
+    with tempfile.TemporaryDirectory(prefix="vault-bench-") as workdir:
+        report = run(args.scale, args.repeat, workdir)
+        os.chdir(REPO_DIR)
+    with open(output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
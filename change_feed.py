@@ -0,0 +1,160 @@
+# Dev Dominic Minnich 2024
+# change_feed.py
+
+# Live change events for the list pages. Every flush that touches a device,
+# repair, personnel or staff row writes a ChangeEvent (entity, id, action and
+# the names of the changed columns, never their values) in the same
+# transaction, so only committed changes are ever published. /events streams
+# them as server-sent events by polling the table on its primary key, which
+# works the same no matter which worker process made the change. Browsers
+# resume from the Last-Event-ID header after a reconnect.
+
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from __init__ import db
+from models import ChangeEvent, Device, Personnel, Staff, Repair
+
+
+TRACKED = {
+    Device: "device",
+    Repair: "repair",
+    Personnel: "personnel",
+    Staff: "staff",
+}
+
+IGNORED_FIELDS = {"updated_at"}
+BATCH_SIZE = 500
+HEARTBEAT_SECONDS = 15
+
+
+def changed_fields(obj):
+    state = inspect(obj)
+    return sorted(
+        attr.key
+        for attr in state.mapper.column_attrs
+        if attr.key not in IGNORED_FIELDS and state.attrs[attr.key].history.has_changes()
+    )
+
+
+def record_events(connection, entity, action, entity_ids, fields=None):
+    # For set-based writes, which the flush hook never sees
+    if entity_ids:
+        fields = json.dumps(fields) if fields else None
+        now = datetime.utcnow()
+        connection.execute(
+            ChangeEvent.__table__.insert(),
+            [
+                {
+                    "entity": entity,
+                    "entity_id": entity_id,
+                    "action": action,
+                    "fields": fields,
+                    "created_at": now,
+                }
+                for entity_id in entity_ids
+            ],
+        )
+
+
+def after_flush(session, flush_context):
+    rows = []
+    now = datetime.utcnow()
+    for action, objs in (
+        ("created", session.new),
+        ("updated", session.dirty),
+        ("deleted", session.deleted),
+    ):
+        for obj in objs:
+            if type(obj) not in TRACKED:
+                continue
+            fields = None
+            if action == "updated":
+                fields = changed_fields(obj)
+                if not fields:
+                    continue
+            rows.append(
+                {
+                    "entity": TRACKED[type(obj)],
+                    "entity_id": obj.id,
+                    "action": action,
+                    "fields": json.dumps(fields) if fields else None,
+                    "created_at": now,
+                }
+            )
+    if rows:
+        session.connection().execute(ChangeEvent.__table__.insert(), rows)
+
+
+def latest_event_id():
+    return db.session.query(func.max(ChangeEvent.id)).scalar() or 0
+
+
+def events_after(last_id, entities):
+    return (
+        ChangeEvent.query.filter(
+            ChangeEvent.id > last_id, ChangeEvent.entity.in_(entities)
+        )
+        .order_by(ChangeEvent.id)
+        .limit(BATCH_SIZE)
+        .all()
+    )
+
+
+def format_event(change):
+    data = {
+        "entity": change.entity,
+        "id": change.entity_id,
+        "action": change.action,
+        "fields": json.loads(change.fields) if change.fields else [],
+    }
+    return f"id: {change.id}\nevent: change\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream(app, last_id, entities, max_stream):
+    # Runs inside the request context kept alive by stream_with_context.
+    # With max_stream 0 it sends what is pending and ends, and the browser
+    # comes back after the retry delay, which is plain polling.
+    poll = app.config["CHANGE_FEED_POLL_INTERVAL"]
+    deadline = time.monotonic() + max_stream
+    if last_id is None:
+        last_id = latest_event_id()
+    yield "retry: 3000\n\n"
+    quiet_since = time.monotonic()
+    while True:
+        changes = events_after(last_id, entities)
+        # Hand the connection back between polls
+        db.session.close()
+        if changes:
+            last_id = changes[-1].id
+            yield "".join(format_event(change) for change in changes)
+            quiet_since = time.monotonic()
+            if len(changes) == BATCH_SIZE:
+                continue
+        elif time.monotonic() - quiet_since > HEARTBEAT_SECONDS:
+            yield ": ping\n\n"
+            quiet_since = time.monotonic()
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(poll)
+
+
+def prune_events(max_age):
+    cutoff = datetime.utcnow() - max_age
+    # The newest row always stays: ids are plain rowids, and SQLite would
+    # start again from 1 in an empty table, below the ids browsers resume from
+    removed = ChangeEvent.query.filter(
+        ChangeEvent.created_at < cutoff, ChangeEvent.id < latest_event_id()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def init_change_feed(app):
+    # Existing databases get the table from a migration
+    if not event.contains(Session, "after_flush", after_flush):
+        event.listen(Session, "after_flush", after_flush)
@@ -0,0 +1,87 @@
+# Dev Dominic Minnich 2024
+# change_tracking.py
+
+# "Changed since" exports for downstream syncs. Device, personnel and staff rows
+# carry created_at/updated_at (set by the models on every ORM write), deletes
+# leave a Tombstone behind, and changes_since() pulls both with indexed range
+# queries. The watermark handed back is the newest timestamp seen; consumers
+# send it as ?since= next time. Rows and tombstones are re-sent for a short
+# overlap window before the watermark, so a write that committed just after an
+# export is never lost, which means consumers must treat rows as upserts.
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from __init__ import db
+from models import Tombstone, Device, Personnel, Staff
+
+
+TRACKED = {
+    Device: "device",
+    Personnel: "personnel",
+    Staff: "staff",
+}
+
+OVERLAP = timedelta(seconds=30)
+
+
+def parse_watermark(value):
+    # Raises ValueError on anything that is not an ISO 8601 timestamp
+    since = datetime.fromisoformat(value.strip())
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+def format_watermark(value):
+    return value.isoformat(timespec="microseconds")
+
+
+def record_tombstones(connection, entity, entity_ids):
+    if entity_ids:
+        now = datetime.utcnow()
+        connection.execute(
+            Tombstone.__table__.insert(),
+            [{"entity": entity, "entity_id": i, "deleted_at": now} for i in entity_ids],
+        )
+
+
+def after_flush(session, flush_context):
+    deleted = {}
+    for obj in session.deleted:
+        if type(obj) in TRACKED:
+            deleted.setdefault(TRACKED[type(obj)], []).append(obj.id)
+    if deleted:
+        connection = session.connection()
+        for entity, entity_ids in deleted.items():
+            record_tombstones(connection, entity, entity_ids)
+
+
+def changes_since(model, since):
+    # Returns (changed rows, ids deleted and not re-created, new watermark)
+    entity = TRACKED[model]
+    start = since - OVERLAP
+    items = (
+        model.query.filter(model.updated_at >= start)
+        .order_by(model.updated_at, model.id)
+        .all()
+    )
+    tombstones = (
+        db.session.query(Tombstone.entity_id, Tombstone.deleted_at)
+        .filter(Tombstone.entity == entity, Tombstone.deleted_at >= start)
+        .all()
+    )
+    live = {item.id for item in items}
+    deleted_ids = sorted({t.entity_id for t in tombstones} - live)
+
+    stamps = [item.updated_at for item in items] + [t.deleted_at for t in tombstones]
+    watermark = max(stamps + [since])
+    return items, deleted_ids, watermark
+
+
+def init_change_tracking(app):
+    # Existing databases get the columns and table from a migration
+    if not event.contains(Session, "after_flush", after_flush):
+        event.listen(Session, "after_flush", after_flush)
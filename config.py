@@ -7,3 +7,98 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your_secret_key'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///inventory.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Per-request SQL counting, see query_profiler.py
+    SQL_PROFILING = os.environ.get('SQL_PROFILING', '0') == '1'
+    SQL_N_PLUS_ONE_THRESHOLD = 5
+    # Raise instead of logging when a route goes over its budget (use in tests)
+    SQL_QUERY_BUDGET_STRICT = os.environ.get('SQL_QUERY_BUDGET_STRICT', '0') == '1'
+    SQL_QUERY_BUDGETS = {
+        'main.manage_devices': 3,
+        'main.manage_personnels': 3,
+        'main.manage_staffs': 3,
+        'main.device_detail': 4,
+        'main.personnel_detail': 4,
+        'main.staff_detail': 4,
+        'main.repair_detail': 4,
+        'main.manage_repairs': 6,  # counts plus one page per board column
+        'main.lookup_asset': 6,
+        'main.scan_device': 8,  # the write itself plus every flush hook
+    }
+
+    # Prometheus-style counters served at /metrics, see metrics.py
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+
+    # 'leader' elects one process to run scheduled jobs, 'off' runs none
+    SCHEDULER_MODE = os.environ.get('SCHEDULER_MODE', 'leader')
+    # Seconds between attempts by non-leader workers to take over
+    SCHEDULER_LEADER_RETRY = 30
+
+    # Background task worker threads per process, see task_queue.py
+    TASK_WORKERS = int(os.environ.get('TASK_WORKERS', '2'))
+    TASK_POLL_INTERVAL = 2
+    # Seconds before a 'running' task is assumed to belong to a dead worker
+    TASK_STALE_AFTER = 3600
+    # Seconds between checks for stale tasks while running
+    TASK_RECOVER_INTERVAL = 300
+    # Days a finished task's result files (exports, zips) stay downloadable
+    TASK_RESULT_RETENTION_DAYS = int(os.environ.get('TASK_RESULT_RETENTION_DAYS', '7'))
+
+    # Apply pending migrations at startup instead of refusing to start
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', '0') == '1'
+
+    # Rendered list rows cache per process, see list_cache.py
+    LIST_CACHE_ENABLED = os.environ.get('LIST_CACHE_ENABLED', '1') == '1'
+    LIST_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+    # Live change events served at /events, see change_feed.py
+    CHANGE_FEED_POLL_INTERVAL = 1
+    # Streams end after this many seconds and the browser reconnects. Only
+    # threaded servers stream; single-threaded workers answer each /events
+    # request at once and the browser polls (see wsgi.py)
+    CHANGE_FEED_MAX_STREAM = 300
+    CHANGE_FEED_RETENTION_HOURS = 24
+
+    # Log rows older than this move to compressed files, see log_archive.py
+    LOG_ARCHIVE_AFTER_DAYS = int(os.environ.get('LOG_ARCHIVE_AFTER_DAYS', '365'))
+    LOG_ARCHIVE_DIR = os.environ.get('LOG_ARCHIVE_DIR')  # default instance/log_archive
+    LOG_ARCHIVE_VACUUM = True
+    # Share of free pages in the database file before archiving runs VACUUM
+    LOG_ARCHIVE_VACUUM_FREE_RATIO = 0.25
+
+    # Lifecycle report windows in days and replacement age, see lifecycle.py
+    LIFECYCLE_WINDOWS = (30, 90, 365)
+    DEVICE_REPLACEMENT_YEARS = int(os.environ.get('DEVICE_REPLACEMENT_YEARS', '5'))
+
+    # File explorer batch operations, see /batch_files in routes.py. Workers
+    # are threads per request doing the disk work of one batch
+    FILE_BATCH_WORKERS = int(os.environ.get('FILE_BATCH_WORKERS', '4'))
+    FILE_BATCH_MAX_ITEMS = 1000
+
+    # Asset/serial -> device id entries kept per process for /scan
+    SCAN_CACHE_SIZE = 4096
+
+    # Committed writes are appended to <db>.changes/ for point-in-time
+    # restore, see journal.py and restore_db.py
+    JOURNAL_ENABLED = os.environ.get('JOURNAL_ENABLED', '1') == '1'
+    JOURNAL_FSYNC = True
+
+    # Backup verification throttle and row count sanity check, see
+    # backup_verify.py
+    BACKUP_VERIFY_MAX_MBPS = 20
+    BACKUP_VERIFY_MIN_ROW_RATIO = 0.5
+    # Newest backups the backup job keeps, 0 keeps all. The change journal is
+    # pruned back to the oldest backup kept, so this is also how far back a
+    # point-in-time restore can go (the job runs every 3 days)
+    BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', '20'))
+
+    # Several campuses in one process, see tenancy.py. Empty means a single
+    # campus using SQLALCHEMY_DATABASE_URI. For example
+    #   TENANTS = {'north': {'hosts': ['north.vault.example.org']},
+    #              'south': {'hosts': ['south.vault.example.org']}}
+    # with TENANT_ROUTING 'host', or 'path' to serve them as /north/, /south/
+    TENANTS = {}
+    TENANT_ROUTING = os.environ.get('TENANT_ROUTING', 'host')
+    TENANT_DIR = os.environ.get('TENANT_DIR') or os.path.join(os.getcwd(), 'tenants')
+    # Tenant engines kept open per process
+    TENANT_ENGINE_CACHE_SIZE = 8
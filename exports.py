@@ -0,0 +1,139 @@
+# Dev Dominic Minnich 2024
+# exports.py
+
+# Column layout of the device, personnel and staff exports, shared by the
+# export routes and the background export task. "Changed since" exports use
+# the same columns plus a trailing Change column, see change_tracking.py.
+
+import csv
+
+
+DEVICE_HEADER = [
+    "ID",
+    "Type",
+    "Asset Number",
+    "Serial Number",
+    "Manufacturer",
+    "Purchase Date",
+    "Warranty Information",
+    "Assigned User",
+    "Status",
+]
+
+PERSONNEL_HEADER = [
+    "ID",
+    "First Name",
+    "Last Name",
+    "Laptop Username",
+    "Laptop Password",
+    "Microsoft Email",
+    "Microsoft Password",
+    "Google Email",
+    "Google Password",
+    "Clever Email",
+    "Clever Password",
+    "Powerschool Email",
+    "Powerschool Password",
+    "Device ID",
+    "Powercord ID",
+]
+
+STAFF_HEADER = [
+    "ID",
+    "First Name",
+    "Last Name",
+    "Title",
+    "Laptop Username",
+    "Laptop Password",
+    "Microsoft Password",
+    "Google Password",
+    "XMedius Password",
+    "Pin Code Number",
+    "Keri Card Number",
+    "Apple",
+    "PC Asset Number",
+    "Powercord Asset Number",
+    "Notes",
+]
+
+
+def device_row(device):
+    return [
+        device.id,
+        device.model_name,
+        device.asset_number,
+        device.serial_number,
+        device.manufacturer,
+        device.purchase_date,
+        device.warranty_info,
+        device.assigned_user,
+        device.status,
+    ]
+
+
+def personnel_row(p):
+    return [
+        p.id,
+        p.first_name,
+        p.last_name,
+        p.laptop_username,
+        p.laptop_password,
+        p.microsoft_email,
+        p.microsoft_password,
+        p.google_email,
+        p.google_password,
+        p.clever_email,
+        p.clever_password,
+        p.powerschool_email,
+        p.powerschool_password,
+        p.device_id,
+        p.powercord_id,
+    ]
+
+
+def staff_row(s):
+    return [
+        s.id,
+        s.first_name,
+        s.last_name,
+        s.title,
+        s.laptop_username,
+        s.laptop_password,
+        s.microsoft_password,
+        s.google_password,
+        s.xmedius_password,
+        s.pin_code_number,
+        s.keri_card_number,
+        s.apple,
+        s.device_id,
+        s.powercord_id,
+        s.notes,
+    ]
+
+
+def export_spec(kind):
+    from models import Device, Personnel, Staff
+
+    return {
+        "devices": (Device, DEVICE_HEADER, device_row),
+        "personnel": (Personnel, PERSONNEL_HEADER, personnel_row),
+        "staff": (Staff, STAFF_HEADER, staff_row),
+    }[kind]
+
+
+def write_csv(fh, header, row_fn, items):
+    cw = csv.writer(fh)
+    cw.writerow(header)
+    for item in items:
+        cw.writerow(row_fn(item))
+
+
+def write_changes_csv(fh, header, row_fn, items, deleted_ids):
+    # Deleted rows only carry their ID
+    cw = csv.writer(fh)
+    cw.writerow(header + ["Change"])
+    for item in items:
+        cw.writerow(row_fn(item) + ["upsert"])
+    blank = [""] * (len(header) - 1)
+    for entity_id in deleted_ids:
+        cw.writerow([entity_id] + blank + ["delete"])
@@ -0,0 +1,223 @@
+# Dev Dominic Minnich 2024
+# folder_usage.py
+
+# Size and file count of every folder in miniRoot, subfolders included, kept
+# in FolderUsage so the explorer can show and sort by folder size without
+# walking the tree. The explorer routes call the functions below right after
+# they change the disk; each is a few upserts on the folder and its ancestors.
+# Changes made behind the app's back (files copied straight onto the share, a
+# crash between the disk change and the commit) are fixed by reconcile_usage(),
+# which the scheduler runs to rewalk the tree once with os.scandir. Per-folder
+# quotas live on the same rows, so upload checks them with one query.
+# Paths are relative to miniRoot with "/" separators, "" is miniRoot itself.
+
+import os
+from datetime import datetime
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects.sqlite import insert
+
+from __init__ import db
+from models import FolderUsage
+
+
+def rel_path(root, abs_path):
+    rel = os.path.relpath(os.path.realpath(abs_path), os.path.realpath(root))
+    return "" if rel == "." else rel.replace(os.sep, "/")
+
+
+def parent_of(rel):
+    return rel.rpartition("/")[0] if rel else None
+
+
+def ancestors(rel):
+    # The folder itself and every folder above it, up to ""
+    parts = rel.split("/") if rel else []
+    return [""] + ["/".join(parts[: i + 1]) for i in range(len(parts))]
+
+
+def adjust(rel, bytes_delta, files_delta):
+    table = FolderUsage.__table__
+    for path in ancestors(rel):
+        statement = insert(table).values(
+            path=path, parent=parent_of(path), total_bytes=bytes_delta, total_files=files_delta
+        )
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.path],
+                set_={
+                    "total_bytes": table.c.total_bytes + bytes_delta,
+                    "total_files": table.c.total_files + files_delta,
+                },
+            )
+        )
+
+
+def subtree(rel):
+    # Rows for the folder and everything below it. substr instead of LIKE so
+    # folder names with % or _ in them match literally.
+    prefix = rel + "/"
+    return db.or_(
+        FolderUsage.path == rel,
+        func.substr(FolderUsage.path, 1, len(prefix)) == prefix,
+    )
+
+
+def totals(rel):
+    row = db.session.get(FolderUsage, rel)
+    return (row.total_bytes, row.total_files) if row else (0, 0)
+
+
+def file_added(root, abs_file, size):
+    adjust(rel_path(root, os.path.dirname(abs_file)), size, 1)
+
+
+def file_removed(root, abs_file, size):
+    adjust(rel_path(root, os.path.dirname(abs_file)), -size, -1)
+
+
+def folder_created(root, abs_dir):
+    rel = rel_path(root, abs_dir)
+    db.session.execute(
+        insert(FolderUsage.__table__)
+        .values(path=rel, parent=parent_of(rel), total_bytes=0, total_files=0)
+        .on_conflict_do_nothing()
+    )
+
+
+def folder_copied(root, abs_dir, sizes):
+    # A folder copied in from elsewhere; sizes is walk_sizes() of the copy
+    rel = rel_path(root, abs_dir)
+    size, files = sizes[""]
+    adjust(parent_of(rel), size, files)
+    rows = []
+    for sub, (sub_size, sub_files) in sizes.items():
+        path = f"{rel}/{sub}" if sub else rel
+        rows.append(
+            {"path": path, "parent": parent_of(path), "total_bytes": sub_size, "total_files": sub_files}
+        )
+    db.session.execute(insert(FolderUsage.__table__).on_conflict_do_nothing(), rows)
+
+
+def folder_removed(root, abs_dir):
+    rel = rel_path(root, abs_dir)
+    size, files = totals(rel)
+    if rel:
+        adjust(parent_of(rel), -size, -files)
+    db.session.query(FolderUsage).filter(subtree(rel)).delete(synchronize_session=False)
+
+
+def path_moved(root, old_abs, new_abs, is_dir, size=0):
+    # A rename, or a move into another folder. Call after the rename succeeded.
+    old_rel = rel_path(root, old_abs)
+    new_rel = rel_path(root, new_abs)
+    if not is_dir:
+        adjust(parent_of(old_rel), -size, -1)
+        adjust(parent_of(new_rel), size, 1)
+        return
+
+    size, files = totals(old_rel)
+    adjust(parent_of(old_rel), -size, -files)
+    cut = len(old_rel) + 1
+    db.session.query(FolderUsage).filter(subtree(old_rel)).update(
+        {
+            FolderUsage.path: new_rel + func.substr(FolderUsage.path, cut),
+            FolderUsage.parent: case(
+                (FolderUsage.path == old_rel, parent_of(new_rel)),
+                else_=new_rel + func.substr(FolderUsage.parent, cut),
+            ),
+        },
+        synchronize_session=False,
+    )
+    adjust(parent_of(new_rel), size, files)
+
+
+def quota_exceeded(root, abs_dir, incoming):
+    # The first folder whose quota the upload would break, or None
+    rows = (
+        FolderUsage.query.filter(
+            FolderUsage.path.in_(ancestors(rel_path(root, abs_dir))),
+            FolderUsage.quota_bytes.isnot(None),
+        )
+        .order_by(func.length(FolderUsage.path).desc())
+        .all()
+    )
+    for row in rows:
+        if row.total_bytes + incoming > row.quota_bytes:
+            return row
+    return None
+
+
+def set_quota(root, abs_dir, quota_bytes):
+    rel = rel_path(root, abs_dir)
+    folder_created(root, abs_dir)
+    db.session.query(FolderUsage).filter_by(path=rel).update(
+        {"quota_bytes": quota_bytes}, synchronize_session=False
+    )
+
+
+def child_usage(root, abs_dir):
+    # name -> row for the folders directly inside abs_dir, one indexed lookup
+    rel = rel_path(root, abs_dir)
+    return {
+        row.path.rpartition("/")[2]: row
+        for row in FolderUsage.query.filter_by(parent=rel)
+    }
+
+
+def walk_sizes(root):
+    # (bytes, files) of every folder under root, subfolders included
+    sizes = {}
+
+    def visit(abs_dir, rel):
+        size = files = 0
+        try:
+            entries = list(os.scandir(abs_dir))
+        except OSError:
+            entries = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    child = f"{rel}/{entry.name}" if rel else entry.name
+                    child_size, child_files = visit(entry.path, child)
+                    size += child_size
+                    files += child_files
+                elif entry.is_file(follow_symlinks=False):
+                    size += entry.stat(follow_symlinks=False).st_size
+                    files += 1
+            except OSError:
+                continue  # deleted while we were looking
+        sizes[rel] = (size, files)
+        return size, files
+
+    visit(root, "")
+    return sizes
+
+
+def reconcile_usage(root):
+    # Rewrites every row from the disk, keeping the quotas. Uploads that land
+    # during the walk can leave a small drift until the next run.
+    sizes = walk_sizes(root) if os.path.isdir(root) else {"": (0, 0)}
+    quotas = dict(
+        db.session.query(FolderUsage.path, FolderUsage.quota_bytes).filter(
+            FolderUsage.quota_bytes.isnot(None)
+        )
+    )
+    now = datetime.now()
+    db.session.query(FolderUsage).delete()
+    db.session.execute(
+        FolderUsage.__table__.insert(),
+        [
+            {
+                "path": rel,
+                "parent": parent_of(rel),
+                "total_bytes": size,
+                "total_files": files,
+                "quota_bytes": quotas.get(rel),
+                "reconciled_at": now,
+            }
+            for rel, (size, files) in sizes.items()
+        ],
+    )
+    db.session.commit()
+    return len(sizes)
@@ -37,6 +37,22 @@ class LoginForm(FlaskForm):
     submit = SubmitField("Login")
 
 
+DEVICE_STATUS_CHOICES = [
+    ("Available", "Available"),
+    ("In Use", "In Use"),
+    ("In Repair", "In Repair"),
+]
+
+REPAIR_STATUS_CHOICES = [
+    ("repair_pending", "Repair Pending"),
+    ("repair_inprogress", "Repair In Progress"),
+    ("repair_completed", "Repair Completed"),
+    ("repair_impossible", "Repair Impossible"),
+]
+# Shown on the repair board by default, the rest only with ?closed=1
+OPEN_REPAIR_STATUSES = ["repair_pending", "repair_inprogress"]
+
+
 class DeviceForm(FlaskForm):
     model_name = StringField("Type", validators=[DataRequired()])
     asset_number = StringField("Asset Number", validators=[DataRequired()])
@@ -47,14 +63,7 @@ class DeviceForm(FlaskForm):
     )
     warranty_info = StringField("Warranty Information")
     assigned_user = StringField("Assigned User")
-    status = SelectField(
-        "Status",
-        choices=[
-            ("Available", "Available"),
-            ("In Use", "In Use"),
-            ("In Repair", "In Repair"),
-        ],
-    )
+    status = SelectField("Status", choices=DEVICE_STATUS_CHOICES)
     submit = SubmitField("Submit")
 
 
@@ -102,7 +111,7 @@ class AddRepairForm(FlaskForm):
     loaner_damage = TextAreaField('Loaner Damage', default='')
     slip_picture = FileField('Slip Picture', validators=[FileAllowed(['jpg', 'png'])])
     original_computer_damage_picture = FileField('Original Computer Damage Picture', validators=[FileAllowed(['jpg', 'png'])])
-    status = SelectField('Status', choices=[('repair_pending', 'Repair Pending'), ('repair_inprogress', 'Repair In Progress'), ('repair_completed', 'Repair Completed'), ('repair_impossible', 'Repair Impossible')])
+    status = SelectField('Status', choices=REPAIR_STATUS_CHOICES)
     new_computer = db.Column(db.String(50), nullable=True)  #doesn't get used
     new_computer_asset_id = StringField('New Computer Asset ID', default='')
     new_computer_damages = StringField('New Computer Damages', default='')
@@ -116,21 +125,24 @@ class EditRepairForm(AddRepairForm):
 
 class ImportDevicesForm(FlaskForm):
     file = FileField(
-        "CSV File", validators=[FileRequired(), FileAllowed(["csv"], "CSV files only!")]
+        "CSV or Excel File",
+        validators=[FileRequired(), FileAllowed(["csv", "xlsx"], "CSV or Excel files only!")],
     )
     submit = SubmitField("Upload")
 
 
 class ImportPersonnelForm(FlaskForm):
     file = FileField(
-        "CSV File", validators=[FileRequired(), FileAllowed(["csv"], "CSV files only!")]
+        "CSV or Excel File",
+        validators=[FileRequired(), FileAllowed(["csv", "xlsx"], "CSV or Excel files only!")],
     )
     submit = SubmitField("Upload")
 
 
 class ImportStaffForm(FlaskForm):
     file = FileField(
-        "CSV File", validators=[FileRequired(), FileAllowed(["csv"], "CSV files only!")]
+        "CSV or Excel File",
+        validators=[FileRequired(), FileAllowed(["csv", "xlsx"], "CSV or Excel files only!")],
     )
     submit = SubmitField("Upload")
 
@@ -0,0 +1,141 @@
+# Dev Dominic Minnich 2024
+# import_validation.py
+
+# Column-at-a-time validation for the device, personnel and staff imports.
+# Rows are split into per-column lists once, then each rule runs over a whole
+# column: every distinct value is parsed only once, duplicates come from a
+# Counter, and clashes with rows already in the database are found with
+# chunked indexed IN lookups. Every problem in the file is reported, not just
+# the first one.
+
+import datetime
+from collections import Counter
+
+from __init__ import db
+from models import Device, Personnel, Staff
+
+
+LOOKUP_CHUNK = 500
+
+IMPORT_SPECS = {
+    "devices": {
+        "model": Device,
+        "fields": 9,
+        "int": [(0, "ID")],
+        "optional_int": [],
+        "date": [(5, "purchase date")],
+        "unique": [(0, "ID"), (2, "Asset Number"), (3, "Serial Number")],
+        "unique_in_db": [(2, "asset_number", "Asset Number"), (3, "serial_number", "Serial Number")],
+    },
+    "personnel": {
+        "model": Personnel,
+        "fields": 16,
+        "int": [(0, "ID")],
+        "optional_int": [(13, "device_id"), (14, "powercord_id")],
+        "date": [],
+        "unique": [(0, "ID")],
+        "unique_in_db": [],
+    },
+    "staff": {
+        "model": Staff,
+        "fields": 15,
+        "int": [(0, "ID")],
+        "optional_int": [(12, "device_id"), (13, "powercord_id")],
+        "date": [],
+        "unique": [(0, "ID")],
+        "unique_in_db": [],
+    },
+}
+
+DATE_FORMAT = "%m/%d/%Y"
+
+
+def is_int(value):
+    value = value.strip()
+    return value[1:].isdigit() if value[:1] in "+-" else value.isdigit()
+
+
+def parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def existing_holders(model, column, values):
+    # value -> id of the row that already has it
+    attr = getattr(model, column)
+    found = {}
+    values = list(values)
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        chunk = values[start:start + LOOKUP_CHUNK]
+        for row_id, value in db.session.query(model.id, attr).filter(attr.in_(chunk)):
+            found[value] = row_id
+    return found
+
+
+def validate_rows(kind, rows, first_line=2):
+    # rows excludes the header; returns a sorted list of (line, message)
+    spec = IMPORT_SPECS[kind]
+    errors = []
+
+    lines = []
+    good = []
+    for line_number, row in enumerate(rows, start=first_line):
+        if len(row) != spec["fields"]:
+            errors.append(
+                (line_number, f"Each row must have {spec['fields']} fields, found {len(row)}.")
+            )
+        else:
+            lines.append(line_number)
+            good.append(row)
+    if not good:
+        return sorted(errors)
+
+    columns = list(zip(*good))
+    bad_rows = set()
+
+    for index, label in spec["int"]:
+        for line_number, value in zip(lines, columns[index]):
+            if not is_int(value):
+                errors.append((line_number, f"Invalid {label}: {value}"))
+                bad_rows.add(line_number)
+
+    for index, label in spec["optional_int"]:
+        for line_number, value in zip(lines, columns[index]):
+            if value and not is_int(value):
+                errors.append((line_number, f"Non-integer value for {label}: {value}"))
+
+    for index, label in spec["date"]:
+        parsed = {value: parse_date(value) for value in set(columns[index])}
+        for line_number, value in zip(lines, columns[index]):
+            if parsed[value] is None:
+                errors.append(
+                    (line_number, f"Invalid date format for {label}: {value}, should be Month/Day/Year")
+                )
+
+    for index, label in spec["unique"]:
+        counts = Counter(columns[index])
+        repeated = {value for value, count in counts.items() if count > 1}
+        if repeated:
+            seen = set()
+            for line_number, value in zip(lines, columns[index]):
+                if value in repeated:
+                    if value in seen:
+                        errors.append((line_number, f"Duplicate {label} found: {value}"))
+                    seen.add(value)
+
+    if spec["unique_in_db"]:
+        ids = [int(v) if line not in bad_rows else None for line, v in zip(lines, columns[0])]
+        ids_in_file = {i for i in ids if i is not None}
+        for index, column, label in spec["unique_in_db"]:
+            holders = existing_holders(spec["model"], column, set(columns[index]))
+            for line_number, row_id, value in zip(lines, ids, columns[index]):
+                holder = holders.get(value)
+                # Fine if it is the same row, or the holder is renumbered by this file
+                if holder is not None and holder != row_id and holder not in ids_in_file:
+                    errors.append(
+                        (line_number, f"{label} {value} already belongs to ID {holder}")
+                    )
+
+    return sorted(errors)
@@ -0,0 +1,211 @@
+# Dev Dominic Minnich 2024
+# journal.py
+
+# Change journal for point-in-time restore. Every statement that writes to
+# the database (INSERT, UPDATE, DELETE, DDL and PRAGMA user_version) is
+# captured at the cursor, exactly as SQLite ran it, and each committed
+# transaction is appended as one JSON line to
+#   <database>.changes/<YYYYMMDD>/<host>-<pid>.jsonl
+# One file per process means workers never share a file handle. Lines are
+# stamped with time.time_ns() right before the commit, while SQLite's write
+# lock is held, so timestamps put transactions in commit order and a snapshot
+# taken under BEGIN IMMEDIATE (see backup_db.py) splits them cleanly.
+# restore_db.py replays the journal on top of the newest snapshot, and after a
+# restore writes a fence line so the history it threw away is never replayed.
+# The backup job prunes the days from before the oldest backup it keeps; they
+# could never be replayed and hold every password ever saved.
+
+import base64
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+WRITE_PREFIXES = (
+    "INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "ALTER", "DROP",
+    "PRAGMA USER_VERSION",
+)
+
+journaled = {}  # database path -> fsync after each write
+files = {}
+files_lock = threading.Lock()
+
+
+def journal_dir(db_path):
+    return db_path + ".changes"
+
+
+def encode_value(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$b": base64.b64encode(bytes(value)).decode("ascii")}
+    return value
+
+
+def decode_value(value):
+    if isinstance(value, dict) and "$b" in value:
+        return base64.b64decode(value["$b"])
+    return value
+
+
+def encode_params(parameters, executemany):
+    if executemany:
+        return [[encode_value(v) for v in row] for row in parameters]
+    return [encode_value(v) for v in parameters or ()]
+
+
+def decode_params(parameters, executemany):
+    if executemany:
+        return [[decode_value(v) for v in row] for row in parameters]
+    return [decode_value(v) for v in parameters]
+
+
+def is_write(statement):
+    return " ".join(statement.split()[:2]).upper().startswith(WRITE_PREFIXES)
+
+
+def db_path_of(conn):
+    return conn.engine.url.database
+
+
+def day_of(ts):
+    return time.strftime("%Y%m%d", time.gmtime(ts / 1e9))
+
+
+def append_line(db_path, entry):
+    day = day_of(entry["ts"])
+    path = os.path.join(
+        journal_dir(db_path), day, f"{socket.gethostname()}-{os.getpid()}.jsonl"
+    )
+    line = (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8")
+    with files_lock:
+        fh = files.get(path)
+        if fh is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fh = files[path] = open(path, "ab")
+        fh.write(line)
+        fh.flush()
+        if journaled[db_path]:
+            os.fsync(fh.fileno())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if db_path_of(conn) in journaled and is_write(statement):
+        # Batched "insertmanyvalues" INSERTs report executemany but ran as one
+        # multi-row statement with flat parameters
+        executemany = executemany and isinstance(
+            parameters[0] if parameters else None, (list, tuple)
+        )
+        conn.info.setdefault("journal", []).append(
+            [statement, encode_params(parameters, executemany), executemany]
+        )
+
+
+def on_commit(conn):
+    statements = conn.info.pop("journal", None)
+    if not statements:
+        return
+    entry = {"ts": time.time_ns(), "statements": statements}
+    append_line(db_path_of(conn), entry)
+    conn.info["journal_committing"] = entry["ts"]
+
+
+def on_begin(conn):
+    conn.info.pop("journal_committing", None)
+
+
+def on_rollback(conn):
+    conn.info.pop("journal", None)
+
+
+def on_error(context):
+    # The line went out before the commit; if the commit itself then failed,
+    # tell restore to skip it
+    conn = context.connection
+    if conn is None:
+        return
+    ts = conn.info.pop("journal_committing", None)
+    if ts is not None:
+        append_line(db_path_of(conn), {"ts": time.time_ns(), "void": ts})
+
+
+def init_journal(app, engine):
+    if not app.config["JOURNAL_ENABLED"]:
+        return
+    db_path = engine.url.database
+    if not db_path or db_path == ":memory:":
+        return
+    journaled[db_path] = app.config["JOURNAL_FSYNC"]
+    if not event.contains(Engine, "after_cursor_execute", after_cursor_execute):
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(Engine, "commit", on_commit)
+        event.listen(Engine, "begin", on_begin)
+        event.listen(Engine, "rollback", on_rollback)
+        event.listen(Engine, "handle_error", on_error)
+
+
+def fence_journal(db_path, after_ns, until_ns):
+    # After a restore to after_ns, the transactions up to until_ns (the swap)
+    # are discarded history; read_entries skips them from then on
+    journaled.setdefault(db_path, True)
+    append_line(db_path, {"ts": time.time_ns(), "fence": [after_ns, until_ns]})
+
+
+def read_entries(db_path, after_ns, until_ns):
+    # Committed transactions with after_ns < ts <= until_ns, in commit order
+    root = journal_dir(db_path)
+    if not os.path.isdir(root):
+        return []
+    first_day = day_of(after_ns)
+    entries = []
+    voided = set()
+    fences = []
+    for day in sorted(os.listdir(root)):
+        if day < first_day:
+            continue
+        for name in os.listdir(os.path.join(root, day)):
+            with open(os.path.join(root, day, name), encoding="utf-8") as fh:
+                for line in fh:
+                    if not line.endswith("\n"):
+                        break  # torn last write of a crashed process
+                    entry = json.loads(line)
+                    if "void" in entry:
+                        voided.add(entry["void"])
+                    elif "fence" in entry:
+                        fences.append(entry["fence"])
+                    elif after_ns < entry["ts"] <= until_ns:
+                        entries.append(entry)
+    entries = [
+        e
+        for e in entries
+        if e["ts"] not in voided
+        and not any(start < e["ts"] <= end for start, end in fences)
+    ]
+    entries.sort(key=lambda e: e["ts"])
+    return entries
+
+
+def prune_journal(db_path, before_ns):
+    # Removes the day folders that end before before_ns, the day it falls on
+    # stays. Fence and void lines in them only ever cover transactions older
+    # than their own day, so nothing that can still be replayed changes.
+    root = journal_dir(db_path)
+    if not os.path.isdir(root):
+        return []
+    first_day = day_of(before_ns)
+    removed = []
+    for day in sorted(os.listdir(root)):
+        if day >= first_day:
+            break
+        path = os.path.join(root, day)
+        with files_lock:
+            for name in [name for name in files if os.path.dirname(name) == path]:
+                files.pop(name).close()
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(day)
+    return removed
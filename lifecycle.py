@@ -0,0 +1,207 @@
+# Dev Dominic Minnich 2024
+# lifecycle.py
+
+# Warranty and replacement tracking for devices. warranty_info is free text,
+# so its expiry date is parsed once when a device is written and stored in the
+# indexed Device.warranty_expires column. The lifecycle report (warranties
+# expiring and devices reaching replacement age in the next 30/90/365 days,
+# grouped by manufacturer and model) is built by a nightly scheduler job and
+# stored in StoredReport, so the report page never scans the inventory.
+
+import calendar
+import datetime
+import json
+import re
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from __init__ import db
+from models import Device, StoredReport
+
+
+REPORT_NAME = "lifecycle"
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+US_DATE = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{2}|\d{4})\b")
+DURATION = re.compile(
+    r"\b(\d+|" + "|".join(NUMBER_WORDS) + r")\s*-?\s*(years?|yrs?|months?|mos?|weeks?|wks?|days?)\b",
+    re.IGNORECASE,
+)
+
+
+def as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return datetime.date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def parse_warranty_expiry(purchase_date, warranty_info):
+    # An explicit date wins, then a duration counted from the purchase date.
+    # Returns None when the text says nothing usable.
+    text = (warranty_info or "").strip()
+    if not text:
+        return None
+    try:
+        match = ISO_DATE.search(text)
+        if match:
+            year, month, day = (int(g) for g in match.groups())
+            return datetime.date(year, month, day)
+        match = US_DATE.search(text)
+        if match:
+            month, day, year = (int(g) for g in match.groups())
+            return datetime.date(year + 2000 if year < 100 else year, month, day)
+    except ValueError:
+        return None
+
+    match = DURATION.search(text)
+    purchase_date = as_date(purchase_date)
+    if not match or purchase_date is None:
+        return None
+    amount = match.group(1).lower()
+    amount = NUMBER_WORDS.get(amount) or int(amount)
+    unit = match.group(2).lower()
+    try:
+        if unit.startswith("y"):
+            return add_months(purchase_date, 12 * amount)
+        if unit.startswith("mo"):
+            return add_months(purchase_date, amount)
+        if unit.startswith("w"):
+            return purchase_date + datetime.timedelta(weeks=amount)
+        return purchase_date + datetime.timedelta(days=amount)
+    except (ValueError, OverflowError):
+        return None  # e.g. "100000 years" runs past the last date Python has
+
+
+def before_flush(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Device):
+            expires = parse_warranty_expiry(obj.purchase_date, obj.warranty_info)
+            if obj.warranty_expires != expires:
+                obj.warranty_expires = expires
+
+
+def backfill_warranty_expiry():
+    rows = db.session.query(Device.id, Device.purchase_date, Device.warranty_info).all()
+    updates = [
+        {"device_id": row.id, "expires": parse_warranty_expiry(row.purchase_date, row.warranty_info)}
+        for row in rows
+    ]
+    if updates:
+        table = Device.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.id == db.bindparam("device_id"))
+            # Parsing is not an edit, so leave updated_at alone
+            .values(warranty_expires=db.bindparam("expires"), updated_at=table.c.updated_at),
+            updates,
+        )
+
+
+def window_of(days_left, windows):
+    for window in windows:
+        if days_left <= window:
+            return window
+    return None
+
+
+def summarize(devices, key_date, today, windows):
+    # Counts per window and per (manufacturer, model), plus the device list
+    groups = {}
+    items = []
+    totals = {str(w): 0 for w in windows}
+    for device in devices:
+        when = as_date(key_date(device))
+        window = window_of((when - today).days, windows)
+        if window is None:
+            continue
+        totals[str(window)] += 1
+        group = groups.setdefault(
+            (device.manufacturer, device.model_name),
+            {
+                "manufacturer": device.manufacturer,
+                "model": device.model_name,
+                **{str(w): 0 for w in windows},
+            },
+        )
+        group[str(window)] += 1
+        items.append(
+            {
+                "id": device.id,
+                "asset_number": device.asset_number,
+                "manufacturer": device.manufacturer,
+                "model": device.model_name,
+                "assigned_user": device.assigned_user,
+                "date": when.isoformat(),
+                "window": window,
+            }
+        )
+    items.sort(key=lambda item: item["date"])
+    return {
+        "totals": totals,
+        "groups": sorted(groups.values(), key=lambda g: (g["manufacturer"], g["model"])),
+        "devices": items,
+    }
+
+
+def build_lifecycle_report(app, today=None):
+    today = today or datetime.date.today()
+    windows = sorted(app.config["LIFECYCLE_WINDOWS"])
+    horizon = today + datetime.timedelta(days=windows[-1])
+    years = app.config["DEVICE_REPLACEMENT_YEARS"]
+
+    # Both are range scans on indexed columns
+    expiring = Device.query.filter(
+        Device.warranty_expires >= today, Device.warranty_expires <= horizon
+    ).all()
+    first_purchase = add_months(today, -12 * years)
+    last_purchase = add_months(horizon, -12 * years)
+    aging = Device.query.filter(
+        Device.purchase_date >= first_purchase, Device.purchase_date <= last_purchase
+    ).all()
+
+    report = {
+        "today": today.isoformat(),
+        "windows": windows,
+        "replacement_years": years,
+        "warranty": summarize(expiring, lambda d: d.warranty_expires, today, windows),
+        "replacement": summarize(
+            aging, lambda d: add_months(as_date(d.purchase_date), 12 * years), today, windows
+        ),
+        "unparsed_warranties": Device.query.filter(
+            Device.warranty_expires.is_(None),
+            Device.warranty_info.isnot(None),
+            Device.warranty_info != "",
+        ).count(),
+    }
+    stored = db.session.get(StoredReport, REPORT_NAME) or StoredReport(name=REPORT_NAME)
+    stored.generated_at = datetime.datetime.now()
+    stored.data = json.dumps(report)
+    db.session.add(stored)
+    db.session.commit()
+    return report
+
+
+def load_lifecycle_report():
+    # (report, generated_at), or (None, None) before the first run
+    stored = db.session.get(StoredReport, REPORT_NAME)
+    if stored is None:
+        return None, None
+    return json.loads(stored.data), stored.generated_at
+
+
+def init_lifecycle(app):
+    # Existing databases get the column and table from a migration
+    if not event.contains(Session, "before_flush", before_flush):
+        event.listen(Session, "before_flush", before_flush)
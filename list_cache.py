@@ -0,0 +1,120 @@
+# Dev Dominic Minnich 2024
+# list_cache.py
+
+# LRU cache for the rendered table rows of the big list pages. Entries are
+# keyed by the list, its query arguments, the user's role flags and
+# the table's current TableVersion, so any committed write to the table makes
+# older entries unreachable and they simply age out. Only the rows are cached,
+# never the full page, because the page carries the per-session CSRF token.
+
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from markupsafe import Markup
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from __init__ import db
+from metrics import LIST_CACHE
+from tenancy import current_tenant
+from models import TableVersion, Device, Personnel, Staff, Repair
+
+
+TRACKED = {
+    Device: "device",
+    Personnel: "personnel",
+    Staff: "staff",
+    Repair: "repair",
+}
+
+
+class FragmentCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        cost = len(value) * 2  # rough, but bounded
+        if cost > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old) * 2
+            self.entries[key] = value
+            self.size += cost
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted) * 2
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+cache = FragmentCache(64 * 1024 * 1024)
+
+
+def bump_versions(connection, tables):
+    if tables:
+        connection.execute(
+            TableVersion.__table__.update()
+            .where(TableVersion.name.in_(list(tables)))
+            .values(version=TableVersion.version + 1)
+        )
+
+
+def after_flush(session, flush_context):
+    tables = {
+        TRACKED[type(obj)]
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if type(obj) in TRACKED
+    }
+    if tables:
+        bump_versions(session.connection(), tables)
+
+
+def table_version(table):
+    row = db.session.get(TableVersion, table)
+    return row.version if row else 0
+
+
+def cached_rows(table, args, render):
+    if not current_app.config["LIST_CACHE_ENABLED"]:
+        return Markup(render())
+    key = (
+        current_tenant(),
+        table,
+        table_version(table),
+        bool(current_user.is_admin),
+        bool(current_user.is_theresa),
+        # The raw values: the routes query with them as given, so "a " and
+        # "a" are different searches
+        tuple(sorted((k, v) for k, v in args.items() if v)),
+    )
+    html = cache.get(key)
+    if html is None:
+        LIST_CACHE.inc("miss")
+        html = render()
+        cache.set(key, html)
+    else:
+        LIST_CACHE.inc("hit")
+    return Markup(html)
+
+
+def init_list_cache(app):
+    cache.max_bytes = app.config["LIST_CACHE_MAX_BYTES"]
+    if not event.contains(Session, "after_flush", after_flush):
+        event.listen(Session, "after_flush", after_flush)
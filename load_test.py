@@ -0,0 +1,358 @@
+# Dev Dominic Minnich 2024
+# load_test.py
+
+# Start-of-year rush simulator. Each virtual technician logs in, searches
+# /devices, edits a device, logs a repair with a photo and browses the file
+# explorer, over and over. The number of technicians is stepped up and the
+# throughput, p50/p95/p99 latency and error rate of every step are reported.
+#   python load_test.py --serve --scale 10k --levels 1,5,10,25 --duration 30
+#   python load_test.py --url http://127.0.0.1:5000 --username me --password pw
+
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from html.parser import HTMLParser
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SEARCH_TERMS = ["Chromebook", "Dell", "Lenovo", "Smith", "1000", "In Repair", "Latitude"]
+
+
+class FormParser(HTMLParser):
+    # Collects the current field values of the first form on a page
+    def __init__(self):
+        super().__init__()
+        self.fields = {}
+        self.select = None
+        self.textarea = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        name = attrs.get("name")
+        if tag == "input" and name and attrs.get("type") not in ("submit", "file", "checkbox"):
+            self.fields.setdefault(name, attrs.get("value") or "")
+        elif tag == "select" and name:
+            self.select = name
+        elif tag == "option" and self.select:
+            if "selected" in attrs or self.select not in self.fields:
+                self.fields[self.select] = attrs.get("value", "")
+        elif tag == "textarea" and name:
+            self.textarea = name
+            self.fields.setdefault(name, "")
+
+    def handle_endtag(self, tag):
+        if tag == "select":
+            self.select = None
+        elif tag == "textarea":
+            self.textarea = None
+
+    def handle_data(self, data):
+        if self.textarea:
+            self.fields[self.textarea] += data
+
+
+def form_fields(html):
+    parser = FormParser()
+    parser.feed(html)
+    return parser.fields
+
+
+def tiny_png():
+    # 1x1 PNG, enough for PIL to open and re-save like a real photo
+    return bytes.fromhex(
+        "89504e470d0a1a0a0000000d4948445200000001000000010802000000907753"
+        "de0000000c4944415408d763f8ffff3f0005fe02fea7d6a4e10000000049454e44ae426082"
+    )
+
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n".encode())
+        body.write(f"{value}\r\n".encode())
+    for name, (filename, content, mimetype) in files.items():
+        body.write(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; "
+            f"filename=\"{filename}\"\r\nContent-Type: {mimetype}\r\n\r\n".encode()
+        )
+        body.write(content + b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, step, seconds, ok):
+        with self.lock:
+            self.samples.setdefault(step, []).append(seconds)
+            if not ok:
+                self.errors[step] = self.errors.get(step, 0) + 1
+
+    def report(self, elapsed):
+        out = {}
+        for step, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+
+            def pct(p):
+                return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 2)
+
+            out[step] = {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "p50_ms": pct(50),
+                "p95_ms": pct(95),
+                "p99_ms": pct(99),
+                "error_rate": round(self.errors.get(step, 0) / len(samples), 4),
+            }
+        return out
+
+
+class Technician:
+    def __init__(self, base_url, username, password, stats, rng, device_count):
+        self.base_url = base_url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.stats = stats
+        self.rng = rng
+        self.device_count = device_count
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+        self.csrf_token = None
+
+    def request(self, step, path, data=None, content_type=None, expect=(200,)):
+        headers = {}
+        if content_type:
+            headers["Content-Type"] = content_type
+        if self.csrf_token:
+            headers["X-CSRFToken"] = self.csrf_token
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                body = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            body = b""
+            status = 0
+        self.stats.record(step, time.perf_counter() - started, status in expect)
+        return status, body.decode("utf-8", errors="ignore")
+
+    def post_form(self, step, path, fields):
+        fields = dict(fields, csrf_token=self.csrf_token or "")
+        data = urllib.parse.urlencode(fields).encode()
+        return self.request(step, path, data, "application/x-www-form-urlencoded")
+
+    def login(self):
+        _, html = self.request("login_page", "/login")
+        self.csrf_token = form_fields(html).get("csrf_token")
+        status, html = self.post_form(
+            "login", "/login", {"username": self.username, "password": self.password}
+        )
+        match = re.search(r'name="csrf-token" content="([^"]+)"', html)
+        if match:
+            self.csrf_token = match.group(1)
+        return "Logout" in html or "logout" in html
+
+    def search_devices(self):
+        for _ in range(self.rng.randint(2, 5)):
+            term = urllib.parse.quote(self.rng.choice(SEARCH_TERMS))
+            self.request("devices_search", f"/devices?search={term}")
+
+    def edit_device(self):
+        device_id = self.rng.randint(1, self.device_count)
+        status, html = self.request("device_form", f"/edit_device/{device_id}")
+        if status != 200:
+            return
+        fields = form_fields(html)
+        fields["status"] = self.rng.choice(["Available", "In Use", "In Repair"])
+        fields["assigned_user"] = f"Load Test {self.rng.randint(1, 999)}"
+        fields.pop("submit", None)
+        self.post_form("device_edit", f"/devices/{device_id}", fields)
+
+    def create_repair(self):
+        _, html = self.request("repair_form", "/repair/add")
+        fields = form_fields(html)
+        fields.update(
+            {
+                "first_name": "Load",
+                "last_name": f"Test{self.rng.randint(1, 9999)}",
+                "original_damage": "Cracked screen",
+                "asset_id": str(100000 + self.rng.randint(1, self.device_count)),
+                "status": "repair_pending",
+            }
+        )
+        fields.pop("submit", None)
+        body, content_type = multipart(
+            fields, {"slip_picture": ("slip.png", tiny_png(), "image/png")}
+        )
+        self.request("repair_create", "/repair/add", body, content_type, expect=(200, 302))
+
+    def list_items(self, name, folder):
+        # Every /list item in a folder, following next_offset like the
+        # explorer does while scrolling; None if a page failed
+        items = []
+        offset = 0
+        while offset is not None:
+            status, body = self.request(
+                name, f"/list?dir={urllib.parse.quote(folder)}&offset={offset}"
+            )
+            if status != 200:
+                return None
+            page = json.loads(body)
+            items.extend(page["items"])
+            offset = page["next_offset"]
+        return items
+
+    def browse_files(self):
+        items = self.list_items("list_root", "/")
+        if not items:
+            return
+        folders = [item["name"] for item in items if item["type"] == "folder"]
+        if not folders:
+            return
+        folder = f"/{self.rng.choice(folders)}/Scans"
+        items = self.list_items("list_folder", folder)
+        if not items:
+            return
+        texts = [
+            item["name"]
+            for item in items
+            if item["type"] == "file" and item["name"].endswith(".txt")
+        ]
+        if texts:
+            path = urllib.parse.quote(f"{folder}/{self.rng.choice(texts)}")
+            self.request("view_file", f"/view_file?file_path={path}")
+
+    def run(self, stop_at):
+        if not self.login():
+            return
+        while time.time() < stop_at:
+            self.search_devices()
+            self.edit_device()
+            if self.rng.random() < 0.3:
+                self.create_repair()
+            self.browse_files()
+
+
+def run_level(args, concurrency):
+    stats = Stats()
+    stop_at = time.time() + args.duration
+    threads = []
+    for n in range(concurrency):
+        tech = Technician(
+            args.url, args.username, args.password, stats,
+            random.Random(n * 7919 + concurrency), args.devices,
+        )
+        thread = threading.Thread(target=tech.run, args=(stop_at,), daemon=True)
+        threads.append(thread)
+        thread.start()
+    started = time.time()
+    for thread in threads:
+        thread.join()
+    return stats.report(time.time() - started)
+
+
+def serve_seeded(scale_name, workdir):
+    # Seeds a throwaway database and serves it from a background thread
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    from config import Config
+    import seed_data
+
+    class LoadConfig(Config):
+        AUTO_MIGRATE = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'load.db')}"
+
+    from __init__ import create_app
+
+    scale = seed_data.SCALES[scale_name]
+    app = create_app(LoadConfig)
+    with app.app_context():
+        seed_data.seed_database(scale["devices"], scale["logs_per_device"])
+    seed_data.seed_explorer(
+        os.path.join(workdir, "miniRoot"), scale["folders"], scale["files_per_folder"]
+    )
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, scale["devices"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a running Vault instance.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--username", default=None)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--devices", type=int, default=1000,
+                        help="how many device ids exist in the target database")
+    parser.add_argument("--levels", default="1,5,10,25,50")
+    parser.add_argument("--duration", type=int, default=30, help="seconds per level")
+    parser.add_argument("--serve", action="store_true",
+                        help="seed a temporary database and serve it locally")
+    parser.add_argument("--scale", default="1k", choices=["1k", "10k", "100k"])
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    import seed_data
+    args.username = args.username or seed_data.BENCH_USERNAME
+    args.password = args.password or seed_data.BENCH_PASSWORD
+
+    server = None
+    workdir = None
+    if args.serve:
+        workdir = tempfile.TemporaryDirectory(prefix="vault-load-")
+        server, args.devices = serve_seeded(args.scale, workdir.name)
+        args.url = f"http://127.0.0.1:{server.server_port}"
+        print(f"Serving seeded {args.scale} database at {args.url}")
+
+    report = {"url": args.url, "duration": args.duration, "levels": {}}
+    try:
+        for level in [int(n) for n in args.levels.split(",")]:
+            print(f"\n== {level} concurrent technicians for {args.duration}s ==")
+            results = run_level(args, level)
+            report["levels"][level] = results
+            for step, r in results.items():
+                print(
+                    f"{step:16s} {r['throughput_rps']:8.1f} req/s  p50 {r['p50_ms']:8.1f}  "
+                    f"p95 {r['p95_ms']:8.1f}  p99 {r['p99_ms']:8.1f} ms  "
+                    f"errors {r['error_rate'] * 100:5.1f}%"
+                )
+    finally:
+        if server:
+            server.shutdown()
+            os.chdir(REPO_DIR)
+            workdir.cleanup()
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
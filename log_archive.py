@@ -0,0 +1,134 @@
+# Dev Dominic Minnich 2024
+# log_archive.py
+
+# Moves old device, personnel, staff and repair log rows out of the database
+# into gzip-compressed JSONL files under instance/log_archive, so the live log
+# tables, their indexes and the database file stay small. Rows are bucketed by
+# the id of the record they belong to, so one record's archived history is a
+# single file read. Each archive run appends a new gzip member to the bucket
+# files it touches (gzip readers treat them as one stream) and only then
+# deletes the rows, so a crash can at worst archive a row twice, and readers
+# drop duplicates by log id.
+
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from __init__ import db
+from models import DeviceLog, PersonnelLog, StaffLog, RepairLog, User
+from tenancy import current_tenant, tenant_dir
+
+
+ARCHIVES = {
+    "device": (DeviceLog, "device_id"),
+    "personnel": (PersonnelLog, "personnel_id"),
+    "staff": (StaffLog, "staff_id"),
+    "repair": (RepairLog, "repair_id"),
+}
+
+BUCKETS = 256
+BATCH_SIZE = 5000
+
+
+def archive_dir(app):
+    if app.config["LOG_ARCHIVE_DIR"]:
+        return os.path.join(app.config["LOG_ARCHIVE_DIR"], current_tenant() or "")
+    return os.path.join(tenant_dir(app) or app.instance_path, "log_archive")
+
+
+def bucket_path(app, kind, parent_id):
+    return os.path.join(archive_dir(app), kind, f"{parent_id % BUCKETS:03d}.jsonl.gz")
+
+
+def append_bucket(path, lines):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as fh:
+            fh.write("".join(lines).encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_batch(app, kind, cutoff):
+    model, parent_column = ARCHIVES[kind]
+    parent = getattr(model, parent_column)
+    rows = (
+        db.session.query(
+            model.id,
+            parent,
+            model.change_description,
+            model.timestamp,
+            model.user_id,
+            User.username,
+        )
+        .outerjoin(User, User.id == model.user_id)
+        .filter(model.timestamp < cutoff)
+        .order_by(model.id)
+        .limit(BATCH_SIZE)
+        .all()
+    )
+    if not rows:
+        return 0
+
+    buckets = {}
+    for row in rows:
+        entry = {
+            "id": row.id,
+            "parent_id": row[1],
+            "change_description": row.change_description,
+            "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+            "user_id": row.user_id,
+            "username": row.username,  # kept in case the user is removed later
+        }
+        path = bucket_path(app, kind, row[1])
+        buckets.setdefault(path, []).append(json.dumps(entry) + "\n")
+    for path, lines in buckets.items():
+        append_bucket(path, lines)
+
+    model.query.filter(model.id.in_([row.id for row in rows])).delete(
+        synchronize_session=False
+    )
+    db.session.commit()
+    return len(rows)
+
+
+def archive_logs(app):
+    # Returns {kind: rows archived}; run inside an app context
+    cutoff = datetime.utcnow() - timedelta(days=app.config["LOG_ARCHIVE_AFTER_DAYS"])
+    archived = {}
+    for kind in ARCHIVES:
+        total = 0
+        while True:
+            count = archive_batch(app, kind, cutoff)
+            total += count
+            if count < BATCH_SIZE:
+                break
+        archived[kind] = total
+    if any(archived.values()) and app.config["LOG_ARCHIVE_VACUUM"]:
+        # Deleted pages are only handed back to the filesystem by VACUUM, but
+        # it rewrites the whole file and blocks every writer while it runs.
+        # Freed pages are reused by new rows anyway, so only VACUUM once a
+        # good share of the file is free.
+        with db.session.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            free = conn.execute(text("PRAGMA freelist_count")).scalar()
+            pages = conn.execute(text("PRAGMA page_count")).scalar()
+            if pages and free / pages >= app.config["LOG_ARCHIVE_VACUUM_FREE_RATIO"]:
+                conn.execute(text("VACUUM"))
+    return archived
+
+
+def archived_history(app, kind, parent_id):
+    # Newest first, like the live log tables on the detail pages
+    path = bucket_path(app, kind, parent_id)
+    if not os.path.exists(path):
+        return []
+    entries = {}
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            entry = json.loads(line)
+            if entry["parent_id"] == parent_id:
+                entries[entry["id"]] = entry
+    return sorted(entries.values(), key=lambda e: (e["timestamp"] or "", e["id"]), reverse=True)
@@ -0,0 +1,209 @@
+# Dev Dominic Minnich 2024
+# metrics.py
+
+# Small in-process metrics registry rendered in the Prometheus text format at
+# /metrics. The numbers live in the process that counted them and are not
+# shared: with several gunicorn workers behind one port, each scrape is
+# answered by whichever worker accepts it and shows only that worker's
+# counters, so successive scrapes jump between workers. Run a single worker
+# (with threads, see wsgi.py) when the numbers matter, or treat them as a
+# per-worker sample.
+
+import bisect
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        for label_values, value in items:
+            yield f"{self.name}{format_labels(self.labels, label_values)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def samples(self):
+        with self.lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self.values.items()]
+        label_names = self.labels + ("le",)
+        for label_values, (bucket_counts, count, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                labels = format_labels(label_names, label_values + (bound,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(label_names, label_values + ("+Inf",))
+            yield f"{self.name}_bucket{labels} {count}"
+            labels = format_labels(self.labels, label_values)
+            yield f"{self.name}_count{labels} {count}"
+            yield f"{self.name}_sum{labels} {total}"
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+REQUEST_LATENCY = register(Histogram(
+    "vault_request_duration_seconds", "Request latency by endpoint.",
+    ("endpoint", "method"),
+))
+REQUESTS_IN_FLIGHT = register(Gauge(
+    "vault_requests_in_flight", "Requests currently being handled.",
+))
+RESPONSE_SIZE = register(Histogram(
+    "vault_response_size_bytes", "Response body size by endpoint.",
+    ("endpoint",), SIZE_BUCKETS,
+))
+RESPONSES = register(Counter(
+    "vault_responses_total", "Responses by endpoint and status code.",
+    ("endpoint", "status"),
+))
+DB_TIME = register(Histogram(
+    "vault_request_db_seconds", "Time spent in SQL per request by endpoint.",
+    ("endpoint",),
+))
+BACKUP_DURATION = register(Histogram(
+    "vault_backup_duration_seconds", "Database backup job duration.",
+    ("result",), JOB_BUCKETS,
+))
+BACKUP_VERIFICATIONS = register(Counter(
+    "vault_backup_verifications_total", "Backups verified, by result.", ("result",),
+))
+IMPORT_ROWS = register(Counter(
+    "vault_import_rows_total", "Rows written by CSV imports.", ("kind",),
+))
+IMPORT_DURATION = register(Histogram(
+    "vault_import_duration_seconds", "CSV import duration.", ("kind",), JOB_BUCKETS,
+))
+
+LIST_CACHE = register(Counter(
+    "vault_list_cache_total", "Rendered list row cache lookups.", ("result",),
+))
+SCANS = register(Counter(
+    "vault_scans_total", "Barcode scans by action and hot cache result.", ("action", "cache"),
+))
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def record_import(kind, rows, seconds):
+    IMPORT_ROWS.inc(kind, amount=rows)
+    IMPORT_DURATION.observe(seconds, kind)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["metrics_query_start"] = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("metrics_query_start", None)
+    if started is not None and has_request_context() and "metrics_db_time" in g:
+        g.metrics_db_time += time.perf_counter() - started
+
+
+def start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_db_time = 0.0
+    REQUESTS_IN_FLIGHT.inc()
+
+
+def finish_request(response):
+    started = g.get("metrics_start")
+    if started is None:
+        return response
+    endpoint = request.endpoint or "unknown"
+    REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint, request.method)
+    DB_TIME.observe(g.metrics_db_time, endpoint)
+    RESPONSES.inc(endpoint, response.status_code)
+    # Streamed and file responses have no length up front, skip them
+    if response.content_length is not None:
+        RESPONSE_SIZE.observe(response.content_length, endpoint)
+    return response
+
+
+def end_request(exc):
+    if g.pop("metrics_start", None) is not None:
+        REQUESTS_IN_FLIGHT.dec()
+
+
+def init_metrics(app):
+    if not app.config["METRICS_ENABLED"]:
+        return
+    if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(end_request)
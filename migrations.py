@@ -0,0 +1,182 @@
+# Dev Dominic Minnich 2024
+# migrations.py
+
+# Versioned schema migrations. The schema version lives in SQLite's
+# PRAGMA user_version. create_app only checks it, so workers start fast; run
+#   python migrations.py
+# once after deploying new code (or set AUTO_MIGRATE=1 in development).
+# Add new steps to the end of MIGRATIONS and never reorder them. Steps must
+# be safe to run against a database that create_all just built from the
+# current models.
+
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from __init__ import db
+
+
+def current_version():
+    return db.session.execute(text("PRAGMA user_version")).scalar()
+
+
+def set_version(version):
+    # PRAGMA does not take bound parameters
+    db.session.execute(text(f"PRAGMA user_version = {int(version)}"))
+
+
+def add_column_if_missing(table, column, ddl):
+    columns = {c["name"] for c in inspect(db.session.connection()).get_columns(table)}
+    if column not in columns:
+        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def create_index_if_missing(name, table, columns):
+    db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def m001_baseline():
+    import models  # registers every table
+
+    # Through the session so a tenant database gets its own tables
+    db.metadata.create_all(db.session.get_bind())
+
+
+def m002_backfill_asset_index():
+    from asset_index import rebuild_asset_index
+
+    rebuild_asset_index()
+
+
+def m003_sort_indexes():
+    # Adding a sort to sorting.SORTS needs a new step that calls this again
+    from sorting import create_sort_indexes
+
+    create_sort_indexes()
+
+
+def m004_table_versions():
+    from models import TableVersion
+    from list_cache import TRACKED
+
+    TableVersion.__table__.create(db.session.get_bind(), checkfirst=True)
+    for name in TRACKED.values():
+        if db.session.get(TableVersion, name) is None:
+            db.session.add(TableVersion(name=name, version=0))
+
+
+def m005_change_tracking():
+    from models import Tombstone
+    from change_tracking import TRACKED
+
+    Tombstone.__table__.create(db.session.get_bind(), checkfirst=True)
+    now = datetime.utcnow()
+    for model, table in TRACKED.items():
+        add_column_if_missing(table, "created_at", "DATETIME")
+        add_column_if_missing(table, "updated_at", "DATETIME")
+        create_index_if_missing(f"ix_{table}_updated_at", table, "updated_at")
+        # Existing rows count as changed now, so the first delta pull sends them all
+        db.session.execute(
+            model.__table__.update()
+            .where(model.updated_at.is_(None))
+            .values(created_at=now, updated_at=now)
+        )
+
+
+def m006_change_events():
+    from models import ChangeEvent
+
+    ChangeEvent.__table__.create(db.session.get_bind(), checkfirst=True)
+
+
+def m007_repair_status_index():
+    create_index_if_missing("ix_repair_status_id", "repair", "status, id")
+
+
+def m008_warranty_expiry():
+    from models import StoredReport
+    from lifecycle import backfill_warranty_expiry
+
+    StoredReport.__table__.create(db.session.get_bind(), checkfirst=True)
+    add_column_if_missing("device", "warranty_expires", "DATE")
+    create_index_if_missing("ix_device_warranty_expires", "device", "warranty_expires")
+    backfill_warranty_expiry()
+
+
+def m009_folder_usage():
+    # Filled in by the first folder_usage_reconcile_job run
+    from models import FolderUsage
+
+    FolderUsage.__table__.create(db.session.get_bind(), checkfirst=True)
+
+
+def m010_drop_redundant_sort_indexes():
+    # They only added write cost next to the UNIQUE indexes, see sorting.py
+    from sorting import redundant_sort_indexes
+
+    for name in redundant_sort_indexes():
+        db.session.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+MIGRATIONS = [
+    m001_baseline,
+    m002_backfill_asset_index,
+    m003_sort_indexes,
+    m004_table_versions,
+    m005_change_tracking,
+    m006_change_events,
+    m007_repair_status_index,
+    m008_warranty_expiry,
+    m009_folder_usage,
+    m010_drop_redundant_sort_indexes,
+]
+LATEST_VERSION = len(MIGRATIONS)
+
+# Tables an older database only has from a later step on, with the version
+# that creates them. Every other table is there from m001_baseline.
+TABLES_SINCE = {
+    "table_version": 4,
+    "tombstone": 5,
+    "change_event": 6,
+    "stored_report": 8,
+    "folder_usage": 9,
+}
+
+
+def upgrade(app):
+    with app.app_context():
+        version = current_version()
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            app.logger.info(f"Applying migration {number}: {step.__name__}")
+            step()
+            set_version(number)
+            db.session.commit()
+        return current_version()
+
+
+def check_schema(app):
+    with app.app_context():
+        version = current_version()
+    if version == LATEST_VERSION:
+        return
+    if app.config["AUTO_MIGRATE"]:
+        upgrade(app)
+        return
+    raise RuntimeError(
+        f"Database schema is at version {version} but this code expects "
+        f"{LATEST_VERSION}. Run `python migrations.py` to upgrade it."
+    )
+
+
+if __name__ == "__main__":
+    from __init__ import create_app
+    from config import Config
+    from tenancy import tenant_names, using_tenant
+
+    class MigrateConfig(Config):
+        AUTO_MIGRATE = True
+
+    app = create_app(MigrateConfig)
+    for tenant in tenant_names(app):
+        with using_tenant(tenant), app.app_context():
+            print(f"{tenant or 'Database'} schema is at version {current_version()}")
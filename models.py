@@ -33,6 +33,12 @@ class Device(db.Model):
     warranty_info = db.Column(db.String(300), nullable=True)
     assigned_user = db.Column(db.String(150), nullable=True)
     status = db.Column(db.String(50), nullable=False, default="Available")
+    # Parsed from warranty_info on every write, see lifecycle.py
+    warranty_expires = db.Column(db.Date, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    updated_at = db.Column(
+        db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )  # UTC, drives the "changed since" exports
 
     logs = db.relationship("DeviceLog", cascade="all, delete-orphan", backref="device")
 
@@ -53,6 +59,10 @@ class Personnel(db.Model):
     powerschool_password = db.Column(db.String(150), nullable=False)
     device_id = db.Column(db.Integer, db.ForeignKey("device.id"), nullable=True)
     powercord_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    updated_at = db.Column(
+        db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
 
     logs = db.relationship(
         "PersonnelLog", cascade="all, delete-orphan", backref="logged_personnel"
@@ -75,6 +85,10 @@ class Staff(db.Model):
     device_id = db.Column(db.String(150), nullable=False)
     powercord_id = db.Column(db.String(150), nullable=False)
     notes = db.Column(db.String(150), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    updated_at = db.Column(
+        db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
 
     logs = db.relationship(
         "StaffLog", cascade="all, delete-orphan", backref="logged_staff"
@@ -100,6 +114,9 @@ class Repair(db.Model):
         "RepairLog", cascade="all, delete-orphan", backref="logged_repair"
     )
 
+    # Repair board columns: count and page through one status at a time
+    __table_args__ = (db.Index("ix_repair_status_id", "status", "id"),)
+
 
 class DeviceLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -147,3 +164,95 @@ class RepairLog(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
 
     user = db.relationship("User")
+
+
+class AssetIndex(db.Model):
+    # One row per place an asset tag is referenced, kept in sync by asset_index.py
+    id = db.Column(db.Integer, primary_key=True)
+    asset = db.Column(db.String(150), nullable=False, index=True)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    field = db.Column(db.String(50), nullable=False)
+
+    __table_args__ = (db.Index("ix_asset_index_entity", "entity", "entity_id"),)
+
+
+class JobRun(db.Model):
+    # History of scheduled job runs, used to catch up on runs missed while down
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(100), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default="running")
+    message = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(100), nullable=True)
+
+    __table_args__ = (db.Index("ix_job_run_job_started", "job_id", "started_at"),)
+
+
+class Task(db.Model):
+    # Background work queued by routes and the scheduler, run by task_queue.py
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    args = db.Column(db.Text, nullable=False, default="{}")
+    priority = db.Column(db.Integer, nullable=False, default=0)  # higher runs first
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(100), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_task_claim", "status", "priority", "run_after"),
+    )
+
+
+class TableVersion(db.Model):
+    # Bumped in the same transaction as every write to a listed table, so
+    # cached list pages in every worker can tell they are stale
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Tombstone(db.Model):
+    # Left behind when a device, personnel or staff row is deleted, so delta
+    # exports can tell downstream systems to drop it
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.Index("ix_tombstone_entity_deleted", "entity", "deleted_at"),)
+
+
+class ChangeEvent(db.Model):
+    # Feed behind /events, written in the same transaction as the change
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # created, updated, deleted
+    fields = db.Column(db.Text, nullable=True)  # JSON list of changed columns
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class StoredReport(db.Model):
+    # Output of a scheduled report job, read by the report pages
+    name = db.Column(db.String(50), primary_key=True)
+    generated_at = db.Column(db.DateTime, nullable=False)
+    data = db.Column(db.Text, nullable=False)  # JSON
+
+
+class FolderUsage(db.Model):
+    # Size of a miniRoot folder including its subfolders, see folder_usage.py
+    path = db.Column(db.String(1024), primary_key=True)  # relative, "" is miniRoot
+    parent = db.Column(db.String(1024), index=True)
+    total_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    total_files = db.Column(db.Integer, nullable=False, default=0)
+    quota_bytes = db.Column(db.BigInteger)
+    reconciled_at = db.Column(db.DateTime)
@@ -0,0 +1,81 @@
+# Dev Dominic Minnich 2024
+# query_profiler.py
+
+# Per-request SQL statement counter. Turned on with SQL_PROFILING in config.py,
+# it reports the statement count and total SQL time for every request in the
+# X-SQL-Queries / X-SQL-Time headers and the app log, and flags statements that
+# run over and over in one request (the usual sign of an N+1 lazy load).
+
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "sql_stats" in g:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "sql_stats" in g:
+        started = conn.info["query_start"].pop()
+        g.sql_stats["count"] += 1
+        g.sql_stats["time"] += time.perf_counter() - started
+        g.sql_stats["statements"][statement] += 1
+
+
+def start_request_stats():
+    g.sql_stats = {"count": 0, "time": 0.0, "statements": Counter()}
+
+
+def finish_request_stats(response):
+    stats = g.pop("sql_stats", None)
+    if stats is None:
+        return response
+
+    response.headers["X-SQL-Queries"] = str(stats["count"])
+    response.headers["X-SQL-Time"] = f"{stats['time'] * 1000:.2f}ms"
+
+    threshold = current_app.config["SQL_N_PLUS_ONE_THRESHOLD"]
+    suspects = [
+        (statement, count)
+        for statement, count in stats["statements"].items()
+        if count >= threshold
+    ]
+    current_app.logger.info(
+        f"{request.method} {request.path} ({request.endpoint}): "
+        f"{stats['count']} queries in {stats['time'] * 1000:.2f}ms"
+    )
+    for statement, count in suspects:
+        current_app.logger.warning(
+            f"Possible N+1 on {request.endpoint}: ran {count} times: {statement}"
+        )
+    if suspects:
+        response.headers["X-SQL-N-Plus-One"] = str(len(suspects))
+
+    budget = current_app.config["SQL_QUERY_BUDGETS"].get(request.endpoint)
+    if budget is not None and stats["count"] > budget:
+        message = (
+            f"{request.endpoint} ran {stats['count']} queries, budget is {budget}"
+        )
+        if current_app.config["SQL_QUERY_BUDGET_STRICT"]:
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+    return response
+
+
+def init_query_profiler(app):
+    if not app.config["SQL_PROFILING"]:
+        return
+    if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+    app.before_request(start_request_stats)
+    app.after_request(finish_request_stats)
@@ -0,0 +1,176 @@
+# Dev Dominic Minnich 2024
+# restore_db.py
+
+# Point-in-time restore. Picks the newest backup taken before the target time
+# that passes PRAGMA integrity_check, copies it next to the live database,
+# replays the change journal (journal.py) up to the target, checks the result
+# again and swaps it in with one atomic rename. The old database is kept as
+# <db>.pre-restore-<time>. Stop the web workers first: the swap refuses to run
+# while an app process holds the scheduler lock, and holds an exclusive lock
+# on the live database while it renames. The replay can also be done while
+# the app runs with --build-only, then swapped in with --swap-only so the app
+# is only down for the rename.
+#
+#   python restore_db.py --to "2024-10-18 14:30"
+#   python restore_db.py                 # latest state, e.g. after corruption
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+from backup_db import backup_database, snapshot_info_path
+from journal import decode_params, fence_journal, read_entries
+from scheduler import LeaderLock
+
+
+class RestoreError(Exception):
+    pass
+
+
+def integrity_ok(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    except sqlite3.DatabaseError:
+        return False
+    finally:
+        conn.close()
+
+
+def snapshots(backup_folder, until_ns):
+    # Newest first
+    found = []
+    for path in glob.glob(os.path.join(backup_folder, "backup_*.db")):
+        info = snapshot_info_path(path)
+        if not os.path.exists(info):
+            continue  # plain file copy from before the journal existed
+        with open(info) as fh:
+            manifest = json.load(fh)
+        taken_ns = manifest.get("taken_ns")
+        if taken_ns is None:
+            continue
+        if manifest.get("verification", {}).get("integrity", "ok") != "ok":
+            continue  # backup_verify.py already found it corrupt
+        if taken_ns <= until_ns:
+            found.append((taken_ns, path))
+    return sorted(found, reverse=True)
+
+
+def replay(path, entries):
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        for entry in entries:
+            conn.execute("BEGIN")
+            for statement, params, many in entry["statements"]:
+                if many:
+                    conn.executemany(statement, decode_params(params, True))
+                else:
+                    conn.execute(statement, decode_params(params, False)).fetchall()
+            conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def build(db_path, backup_folder, until_ns):
+    work = db_path + ".restored"
+    for taken_ns, snapshot in snapshots(backup_folder, until_ns):
+        if integrity_ok(snapshot):
+            break
+        print(f"Skipping {snapshot}: integrity_check failed")
+    else:
+        raise RestoreError(f"No usable backup in {backup_folder} from before the target time")
+
+    entries = read_entries(db_path, taken_ns, until_ns)
+    print(f"Starting from {snapshot}, replaying {len(entries)} transactions")
+    shutil.copyfile(snapshot, work)
+    try:
+        replay(work, entries)
+    except sqlite3.Error as e:
+        os.remove(work)
+        raise RestoreError(f"Replay failed: {e}")
+    if not integrity_ok(work):
+        os.remove(work)
+        raise RestoreError("The restored database failed integrity_check")
+    # swap() needs the target to fence off the journal, maybe in a later run
+    with open(work + ".json", "w") as fh:
+        json.dump({"until_ns": until_ns}, fh)
+    return work
+
+
+def swap(db_path, backup_folder, lock_path):
+    work = db_path + ".restored"
+    if not os.path.exists(work) or not os.path.exists(work + ".json"):
+        raise RestoreError(f"{work} does not exist, run without --swap-only first")
+    with open(work + ".json") as fh:
+        until_ns = json.load(fh)["until_ns"]
+
+    # Every app process runs the scheduler and one of them always holds its
+    # lock, so getting it means the app is stopped (with SCHEDULER_MODE off
+    # nothing holds it, and stopping the app is up to you). The exclusive transaction
+    # also keeps out anything else still using the file, e.g. a shell script.
+    lock = LeaderLock(lock_path)
+    if not lock.acquire():
+        raise RestoreError(f"{lock_path} is held, so the app is still running. Stop it first.")
+    try:
+        live = None
+        if os.path.exists(db_path):
+            live = sqlite3.connect(db_path, timeout=5, isolation_level=None)
+            try:
+                live.execute("BEGIN EXCLUSIVE")
+            except sqlite3.OperationalError as e:
+                live.close()
+                raise RestoreError(f"Could not lock {db_path} ({e}), is it still in use?")
+            kept = f"{db_path}.pre-restore-{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+            os.link(db_path, kept)
+            print(f"Previous database kept as {kept}")
+        try:
+            os.replace(work, db_path)
+        finally:
+            if live is not None:
+                live.close()
+        os.remove(work + ".json")
+        # Journal lines between the target and now belong to the discarded
+        # history: fence them off, and make this state the new baseline
+        fence_journal(db_path, until_ns, time.time_ns())
+        backup_database(db_path, backup_folder)
+    finally:
+        lock.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Restore the database to a point in time")
+    parser.add_argument("--to", help="local time, e.g. '2024-10-18 14:30' (default: now)")
+    parser.add_argument("--db", default=os.path.join(os.getcwd(), "instance", "inventory.db"))
+    parser.add_argument("--backups", default=os.path.join(os.getcwd(), "backups"))
+    parser.add_argument(
+        "--lock",
+        default=os.path.join(os.getcwd(), "instance", "scheduler.lock"),
+        help="the app's scheduler lock file",
+    )
+    parser.add_argument("--build-only", action="store_true", help="build <db>.restored, don't swap")
+    parser.add_argument("--swap-only", action="store_true", help="swap in a built <db>.restored")
+    args = parser.parse_args()
+
+    until_ns = time.time_ns()
+    if args.to:
+        until_ns = int(datetime.fromisoformat(args.to).timestamp() * 1e9)
+    db_path = os.path.abspath(args.db)
+
+    started = time.perf_counter()
+    try:
+        if not args.swap_only:
+            build(db_path, args.backups, until_ns)
+        if not args.build_only:
+            swap(db_path, args.backups, args.lock)
+    except RestoreError as e:
+        raise SystemExit(f"Restore failed: {e}")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
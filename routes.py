@@ -15,11 +15,12 @@
 # Imports 
 
 import datetime
+import json
 import secrets
 import shutil
+import time
 import traceback
-from PIL import Image
-from docx import Document
+from concurrent.futures import ThreadPoolExecutor
 from flask import (
     Blueprint,
     Response,
@@ -35,9 +36,61 @@ from flask import (
     send_from_directory,
     make_response,
     send_file,
+    stream_with_context,
 )
 from __init__ import db, login_manager
+from metrics import record_import, render_metrics
+from exports import (
+    DEVICE_HEADER,
+    PERSONNEL_HEADER,
+    STAFF_HEADER,
+    device_row,
+    personnel_row,
+    staff_row,
+    export_spec,
+    write_changes_csv,
+    write_csv,
+)
+from change_tracking import (
+    changes_since,
+    format_watermark,
+    parse_watermark,
+    record_tombstones,
+)
+from task_queue import enqueue, result_path
+from sorting import InvalidSort, apply_sort
+from list_cache import bump_versions, cached_rows
+from change_feed import TRACKED as LIVE_ENTITIES, event_stream, record_events
+from import_validation import validate_rows
+from backup_verify import backup_statuses
+from log_archive import archived_history
+from lifecycle import load_lifecycle_report
+from scanning import SCAN_ACTIONS, ScanError, apply_scan
+from tenancy import tenant_dir
+from folder_usage import (
+    child_usage,
+    rel_path,
+    file_added,
+    file_removed,
+    folder_copied,
+    folder_created,
+    folder_removed,
+    path_moved,
+    quota_exceeded,
+    set_quota,
+    totals,
+    walk_sizes,
+)
+from spreadsheets import (
+    IMPORT_EXTENSIONS,
+    XLSX_MIMETYPE,
+    UploadFileError,
+    read_upload_rows,
+    write_xlsx,
+)
 from models import (
+    AssetIndex,
+    Task,
     DeviceLog,
     Repair,
     RepairLog,
@@ -63,12 +116,16 @@ from forms import (
     ImportStaffForm,
     PasswordResetForm,
     AdminPasswordResetForm,
+    DEVICE_STATUS_CHOICES,
+    OPEN_REPAIR_STATUSES,
+    REPAIR_STATUS_CHOICES,
 )
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from sqlalchemy import func, or_
+from sqlalchemy.orm import joinedload
 import os
-import csv
 from io import BytesIO, StringIO
 
 # Blueprint 
@@ -184,34 +241,150 @@ def manage_devices():
     sort_by = request.args.get("sort_by", "model_name")
     status_filter = request.args.get("status", "")
 
-    devices = Device.query
+    def render_rows():
+        devices = Device.query
 
-    if search_query:
-        devices = devices.filter(
-            (Device.model_name.ilike(f"%{search_query}%"))
-            | (Device.asset_number.ilike(f"%{search_query}%"))
-            | (Device.manufacturer.ilike(f"%{search_query}%"))
-            | (Device.assigned_user.ilike(f"%{search_query}%"))
-        )
+        if search_query:
+            devices = devices.filter(
+                (Device.model_name.ilike(f"%{search_query}%"))
+                | (Device.asset_number.ilike(f"%{search_query}%"))
+                | (Device.manufacturer.ilike(f"%{search_query}%"))
+                | (Device.assigned_user.ilike(f"%{search_query}%"))
+            )
 
-    if status_filter:
-        devices = devices.filter_by(status=status_filter)
+        if status_filter:
+            devices = devices.filter_by(status=status_filter)
 
-    if sort_by:
-        devices = devices.order_by(getattr(Device, sort_by))
+        if sort_by:
+            try:
+                devices = apply_sort(devices, Device, sort_by)
+            except InvalidSort as e:
+                abort(400, description=str(e))
 
-    devices = devices.all()
+        devices = devices.all()
+        return render_template("_device_rows.html", devices=devices)
+
+    rows_html = cached_rows(
+        "device",
+        {"search": search_query, "sort_by": sort_by, "status": status_filter},
+        render_rows,
+    )
     return render_template(
         "devices.html",
-        devices=devices,
+        rows_html=rows_html,
         search_query=search_query,
         sort_by=sort_by,
         status_filter=status_filter,
+        status_choices=DEVICE_STATUS_CHOICES,
+    )
+
+@main.route("/devices/bulk", methods=["POST"])
+@login_required
+def bulk_devices():
+    action = request.form.get("action", "")
+    device_ids = [int(i) for i in request.form.getlist("device_ids") if i.isdigit()]
+
+    if not device_ids:
+        flash("No devices selected.", "warning")
+        return redirect(url_for("main.manage_devices"))
+
+    if action == "export":
+        devices = Device.query.filter(Device.id.in_(device_ids)).all()
+        return send_devices_csv(devices, "devices_selected.csv")
+
+    if action in ("set_status", "delete") and not current_user.is_admin:
+        return redirect(url_for("main.homepage"))
+
+    # Old values are read in one query so every log row can say what changed
+    current = db.session.query(
+        Device.id, Device.status, Device.assigned_user
+    ).filter(Device.id.in_(device_ids)).all()
+    found_ids = [row.id for row in current]
+
+    if action == "set_status":
+        new_status = request.form.get("status", "")
+        if new_status not in dict(DEVICE_STATUS_CHOICES):
+            flash("Invalid status.", "danger")
+            return redirect(url_for("main.manage_devices"))
+        changed = [row for row in current if row.status != new_status]
+        log_rows = [
+            {
+                "device_id": row.id,
+                "change_description": f"Status changed from {row.status} to {new_status}",
+                "user_id": current_user.id,
+            }
+            for row in changed
+        ]
+        if changed:
+            Device.query.filter(Device.id.in_([row.id for row in changed])).update(
+                {Device.status: new_status}, synchronize_session=False
+            )
+            record_events(
+                db.session.connection(),
+                "device",
+                "updated",
+                [row.id for row in changed],
+                ["status"],
+            )
+        summary = f"Status set to {new_status} on {len(changed)} of {len(found_ids)} devices"
+    elif action == "clear_assignment":
+        changed = [row for row in current if row.assigned_user]
+        log_rows = [
+            {
+                "device_id": row.id,
+                "change_description": f"Assigned User changed from {row.assigned_user} to ",
+                "user_id": current_user.id,
+            }
+            for row in changed
+        ]
+        if changed:
+            Device.query.filter(Device.id.in_([row.id for row in changed])).update(
+                {Device.assigned_user: ""}, synchronize_session=False
+            )
+            record_events(
+                db.session.connection(),
+                "device",
+                "updated",
+                [row.id for row in changed],
+                ["assigned_user"],
+            )
+        summary = f"Assignment cleared on {len(changed)} of {len(found_ids)} devices"
+    elif action == "delete":
+        # Logs go with their devices, so there is nothing left to attach them to
+        log_rows = []
+        DeviceLog.query.filter(DeviceLog.device_id.in_(found_ids)).delete(
+            synchronize_session=False
+        )
+        Device.query.filter(Device.id.in_(found_ids)).delete(synchronize_session=False)
+        # Set-based deletes skip the flush hooks that maintain the asset index,
+        # leave tombstones for delta exports and publish change events
+        AssetIndex.query.filter(
+            AssetIndex.entity == "device", AssetIndex.entity_id.in_(found_ids)
+        ).delete(synchronize_session=False)
+        record_tombstones(db.session.connection(), "device", found_ids)
+        record_events(db.session.connection(), "device", "deleted", found_ids)
+        summary = f"Deleted {len(found_ids)} devices"
+    else:
+        flash("Unknown bulk action.", "danger")
+        return redirect(url_for("main.manage_devices"))
+
+    if log_rows:
+        db.session.execute(DeviceLog.__table__.insert(), log_rows)
+    # Set-based writes skip the flush hooks, so invalidate cached lists here
+    bump_versions(db.session.connection(), ["device"])
+    db.session.commit()
+
+    current_app.logger.info(
+        f"Bulk device action '{action}' by {current_user.username}: {summary} (ids: {found_ids})"
     )
+    flash(f"{summary}.", "success")
+    return redirect(url_for("main.manage_devices"))
 
 @main.route("/delete_device/<int:device_id>", methods=["POST"])
 @login_required
 def delete_device(device_id):
+    if not current_user.is_admin:
+        return redirect(url_for("main.homepage"))
     device = Device.query.get_or_404(device_id)
     db.session.delete(device)
     db.session.commit()
@@ -251,6 +424,9 @@ def delete_staff(staff_id):
 @main.route("/devices/<int:device_id>", methods=["GET", "POST"])
 @login_required
 def device_detail(device_id):
+    # Anyone can look, only admins can change it (same as edit_device)
+    if request.method == "POST" and not current_user.is_admin:
+        return redirect(url_for("main.homepage"))
     device = Device.query.get_or_404(device_id)
     form = DeviceForm(obj=device)
 
@@ -308,7 +484,11 @@ def device_detail(device_id):
         flash("Device updated successfully!", "success")
         return redirect(url_for("main.device_detail", device_id=device.id))
 
-    logs = DeviceLog.query.filter_by(device_id=device.id).all()
+    logs = (
+        DeviceLog.query.options(joinedload(DeviceLog.user))
+        .filter_by(device_id=device.id)
+        .all()
+    )
     return render_template(
         "device_detail.html",
         device=device,
@@ -319,6 +499,8 @@ def device_detail(device_id):
 @main.route("/edit_device/<int:device_id>", methods=["GET", "POST"])
 @login_required
 def edit_device(device_id):
+    if not current_user.is_admin:
+        return redirect(url_for("main.homepage"))
     device = Device.query.get_or_404(device_id)
     form = DeviceForm(obj=device)  # Ensure the form is populated with the device data
 
@@ -375,7 +557,11 @@ def edit_device(device_id):
         flash("Device updated successfully!", "success")
         return redirect(url_for("main.device_detail", device_id=device.id))
 
-    logs = DeviceLog.query.filter_by(device_id=device.id).all()  # Fetch device logs
+    logs = (
+        DeviceLog.query.options(joinedload(DeviceLog.user))
+        .filter_by(device_id=device.id)
+        .all()
+    )  # Fetch device logs
     return render_template("edit_device.html", form=form, device=device, logs=logs)
 
 @main.route("/edit_personnel/<int:personnel_id>", methods=["GET", "POST"])
@@ -471,9 +657,11 @@ def edit_personnel(personnel_id):
         flash("Personnel updated successfully!", "success")
         return redirect(url_for("main.personnel_detail", personnel_id=personnel.id))
 
-    logs = PersonnelLog.query.filter_by(
-        personnel_id=personnel.id
-    ).all()  # Fetch personnel logs
+    logs = (
+        PersonnelLog.query.options(joinedload(PersonnelLog.user))
+        .filter_by(personnel_id=personnel.id)
+        .all()
+    )  # Fetch personnel logs
     return render_template(
         "edit_personnel.html", form=form, personnel=personnel, logs=logs
     )
@@ -564,163 +752,187 @@ def edit_staff(staff_id):
         flash("Staff updated successfully!", "success")
         return redirect(url_for("main.staff_detail", staff_id=staff.id))
 
-    logs = StaffLog.query.filter_by(staff_id=staff.id).all()  # Fetch staff logs
+    logs = (
+        StaffLog.query.options(joinedload(StaffLog.user))
+        .filter_by(staff_id=staff.id)
+        .all()
+    )  # Fetch staff logs
     return render_template("edit_staff.html", form=form, staff=staff, logs=logs)
 
+@main.route("/events")
+@login_required
+def events():
+    # Server-sent change events for the list pages, see change_feed.py
+    allowed = set(LIVE_ENTITIES.values())
+    if not current_user.is_admin:
+        allowed.discard("staff")
+    requested = request.args.get("entities", "")
+    entities = [e for e in requested.split(",") if e in allowed] or sorted(allowed)
+    last_id = request.headers.get("Last-Event-ID", request.args.get("after", ""))
+    last_id = int(last_id) if last_id.isdigit() else None
+    # A long stream would pin a single-threaded worker (gunicorn's default
+    # sync workers), so those get short polls instead
+    max_stream = current_app.config["CHANGE_FEED_MAX_STREAM"] if request.environ.get("wsgi.multithread") else 0
+    response = Response(
+        stream_with_context(event_stream(current_app._get_current_object(), last_id, entities, max_stream)),
+        mimetype="text/event-stream",
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # don't let nginx hold events back
+    return response
+
+@main.route("/rows/<entity>/<int:entity_id>")
+@login_required
+def live_row(entity, entity_id):
+    # One freshly rendered list row, fetched by static/live_rows.js
+    if entity == "device":
+        item = db.session.get(Device, entity_id)
+        template, name = "_device_rows.html", "devices"
+    elif entity == "personnel":
+        item = db.session.get(Personnel, entity_id)
+        template, name = "_personnel_rows.html", "personnels"
+    elif entity == "staff" and current_user.is_admin:
+        item = db.session.get(Staff, entity_id)
+        template, name = "_staff_rows.html", "staffs"
+    elif entity == "repair":
+        item = db.session.get(Repair, entity_id)
+        template, name = "_repair_rows.html", "repairs"
+    else:
+        abort(404)
+    if item is None:
+        abort(404)
+    return render_template(template, **{name: [item]})
+
 @main.route("/export_devices", methods=["GET"])
 @login_required
 def export_devices():
-    si = StringIO()
-    cw = csv.writer(si)
+    if request.args.get("since"):
+        return send_changes_csv("devices")
+    if request.args.get("async"):
+        return enqueue_export("devices")
+    if request.args.get("format") == "xlsx":
+        return send_xlsx_export("devices")
+    watermark = datetime.datetime.utcnow()
     devices = Device.query.all()
-    cw.writerow(
-        [
-            "ID",
-            "Type",
-            "Asset Number",
-            "Serial Number",
-            "Manufacturer",
-            "Purchase Date",
-            "Warranty Information",
-            "Assigned User",
-            "Status",
-        ]
-    )
-    for device in devices:
-        cw.writerow(
-            [
-                device.id,
-                device.model_name,
-                device.asset_number,
-                device.serial_number,
-                device.manufacturer,
-                device.purchase_date,
-                device.warranty_info,
-                device.assigned_user,
-                device.status,
-            ]
-        )
+    response = send_devices_csv(devices, "devices.csv")
+    response.headers["X-Export-Watermark"] = format_watermark(watermark)
+    return response
+
+def send_devices_csv(devices, download_name):
+    si = StringIO()
+    write_csv(si, DEVICE_HEADER, device_row, devices)
     output = si.getvalue().encode("utf-8")
     return send_file(
         BytesIO(output),
         as_attachment=True,
-        download_name="devices.csv",
+        download_name=download_name,
         mimetype="text/csv",
     )
 
+def send_changes_csv(kind):
+    # Only rows changed or deleted since the caller's last watermark
+    try:
+        since = parse_watermark(request.args["since"])
+    except ValueError:
+        abort(400)
+    model, header, row_fn = export_spec(kind)
+    items, deleted_ids, watermark = changes_since(model, since)
+    si = StringIO()
+    write_changes_csv(si, header, row_fn, items, deleted_ids)
+    output = si.getvalue().encode("utf-8")
+    response = send_file(
+        BytesIO(output),
+        as_attachment=True,
+        download_name=f"{kind}_changes.csv",
+        mimetype="text/csv",
+    )
+    response.headers["X-Export-Watermark"] = format_watermark(watermark)
+    return response
+
+def send_xlsx_export(kind):
+    watermark = datetime.datetime.utcnow()
+    model, header, row_fn = export_spec(kind)
+    fh = write_xlsx(header, row_fn, model.query.yield_per(1000), kind.capitalize())
+    response = send_file(
+        fh,
+        as_attachment=True,
+        download_name=f"{kind}.xlsx",
+        mimetype=XLSX_MIMETYPE,
+    )
+    response.headers["X-Export-Watermark"] = format_watermark(watermark)
+    return response
+
+def enqueue_export(kind):
+    task_id = enqueue(
+        "export_csv", priority=5, user_id=current_user.id, kind=kind
+    )
+    return jsonify(
+        {"task_id": task_id, "status_url": url_for("main.task_status", task_id=task_id)}
+    ), 202
+
 @main.route("/export_personnel", methods=["GET"])
 @login_required
 def export_personnel():
+    if request.args.get("since"):
+        return send_changes_csv("personnel")
+    if request.args.get("async"):
+        return enqueue_export("personnel")
+    if request.args.get("format") == "xlsx":
+        return send_xlsx_export("personnel")
+    watermark = datetime.datetime.utcnow()
     si = StringIO()
-    cw = csv.writer(si)
     personnel = Personnel.query.all()
-    cw.writerow(
-        [
-            "ID",
-            "First Name",
-            "Last Name",
-            "Laptop Username",
-            "Laptop Password",
-            "Microsoft Email",
-            "Microsoft Password",
-            "Google Email",
-            "Google Password",
-            "Clever Email",
-            "Clever Password",
-            "Powerschool Email",
-            "Powerschool Password",
-            "Device ID",
-            "Powercord ID",
-        ]
-    )
-    for p in personnel:
-        cw.writerow(
-            [
-                p.id,
-                p.first_name,
-                p.last_name,
-                p.laptop_username,
-                p.laptop_password,
-                p.microsoft_email,
-                p.microsoft_password,
-                p.google_email,
-                p.google_password,
-                p.clever_email,
-                p.clever_password,
-                p.powerschool_email,
-                p.powerschool_password,
-                p.device_id,
-                p.powercord_id,
-            ]
-        )
+    write_csv(si, PERSONNEL_HEADER, personnel_row, personnel)
     output = si.getvalue().encode("utf-8")
-    return send_file(
+    response = send_file(
         BytesIO(output),
         as_attachment=True,
         download_name="personnel.csv",
         mimetype="text/csv",
     )
+    response.headers["X-Export-Watermark"] = format_watermark(watermark)
+    return response
 
 @main.route("/export_staff", methods=["GET"])
 @login_required
 def export_staff():
     if not current_user.is_admin:
         return redirect(url_for("main.homepage"))
+    if request.args.get("since"):
+        return send_changes_csv("staff")
+    if request.args.get("async"):
+        return enqueue_export("staff")
+    if request.args.get("format") == "xlsx":
+        return send_xlsx_export("staff")
+    watermark = datetime.datetime.utcnow()
     si = StringIO()
-    cw = csv.writer(si)
     staff = Staff.query.all()
-    cw.writerow(
-        [
-            "ID",
-            "First Name",
-            "Last Name",
-            "Title",
-            "Laptop Username",
-            "Laptop Password",
-            "Microsoft Password",
-            "Google Password",
-            "XMedius Password",
-            "Pin Code Number",
-            "Keri Card Number",
-            "Apple",
-            "PC Asset Number",
-            "Powercord Asset Number",
-            "Notes",
-        ]
-    )
-    for s in staff:
-        cw.writerow(
-            [
-                s.id,
-                s.first_name,
-                s.last_name,
-                s.title,
-                s.laptop_username,
-                s.laptop_password,
-                s.microsoft_password,
-                s.google_password,
-                s.xmedius_password,
-                s.pin_code_number,
-                s.keri_card_number,
-                s.apple,
-                s.device_id,
-                s.powercord_id,
-                s.notes,
-            ]
-        )
+    write_csv(si, STAFF_HEADER, staff_row, staff)
     output = si.getvalue().encode("utf-8")
-    return send_file(
+    response = send_file(
         BytesIO(output),
         as_attachment=True,
         download_name="staff.csv",
         mimetype="text/csv",
     )
+    response.headers["X-Export-Watermark"] = format_watermark(watermark)
+    return response
 
 @main.route("/files/<filename>")
 @login_required
 def uploaded_file(filename):
     return send_from_directory(current_app.config["UPLOAD_FOLDER"], filename)
 
+@main.route("/history/<kind>/<int:entity_id>")
+@login_required
+def archived_logs(kind, entity_id):
+    # Log rows moved out of the database by the archive job, fetched on demand
+    if kind not in ("device", "personnel", "staff", "repair"):
+        abort(404)
+    if kind == "staff" and not current_user.is_admin:
+        abort(403)
+    return jsonify(archived_history(current_app, kind, entity_id))
+
 @main.route("/homepage")
 @login_required
 def homepage():
@@ -731,50 +943,25 @@ def homepage():
 def import_devices():
     form = ImportDevicesForm()  # Create an instance of the form
     traceback_info = None  # Initialize traceback_info
+    import_errors = []
 
     try:
         if form.validate_on_submit():
             file = form.file.data  # Access the file field from the form
-            if file and file.filename.endswith(".csv"):
-                stream = StringIO(file.stream.read().decode("UTF-8", errors="ignore"))
-                csv_input = csv.reader(stream)
-                header = next(csv_input)  # Skip header row
-
-                device_ids = set()
-                asset_numbers = set()
-                error_messages = []
-
-                for line_number, row in enumerate(csv_input, start=2):  # Start from 2 because of the header
-                    if len(row) != 9:
-                        error_messages.append(f"Line {line_number}: Each row must have 9 fields.")
-                        break
-
-                    try:
-                        device_id = int(row[0])
-                        if device_id in device_ids:
-                            error_messages.append(f"Line {line_number}: Duplicate ID found: {device_id}")
-                        device_ids.add(device_id)
-                    except ValueError:
-                        error_messages.append(f"Line {line_number}: Invalid ID: {row[0]}")
-                        continue
-
-                    if row[2] in asset_numbers:
-                        error_messages.append(f"Line {line_number}: Duplicate Asset Number found: {row[2]}")
-                    asset_numbers.add(row[2])
-
-                    try:
-                        purchase_date = datetime.datetime.strptime(row[5], "%m/%d/%Y")
-                    except ValueError:
-                        error_messages.append(f"Line {line_number}: Invalid date format for purchase date: {row[5]}, should be Month/Day/Year")
-                        continue
-
-                if error_messages:
-                    for error in error_messages:
-                        flash(error, "danger")
+            if file and file.filename.lower().endswith(IMPORT_EXTENSIONS):
+                started = time.perf_counter()
+                header, rows = read_upload_rows(file)
+                import_errors = validate_rows("devices", rows)
+
+                if import_errors:
+                    flash(
+                        f"Found {len(import_errors)} problems in the file, nothing was imported.",
+                        "danger",
+                    )
                 else:
-                    stream.seek(0)
-                    next(csv_input)  # Skip header row again
-                    for row in csv_input:
+                    imported = 0
+                    for row in rows:
+                        imported += 1
                         device_id = int(row[0])
                         device = Device.query.get(device_id)
                         if device:
@@ -806,68 +993,46 @@ def import_devices():
                             )
                             db.session.add(new_device)
                     db.session.commit()
+                    record_import("devices", imported, time.perf_counter() - started)
                     flash("Devices imported successfully!", "success")
             else:
-                flash("Invalid file format. Please upload a CSV file.", "danger")
+                flash("Invalid file format. Please upload a CSV or Excel (.xlsx) file.", "danger")
+    except UploadFileError as e:
+        flash(str(e), "danger")
     except Exception as e:
         flash("Something went wrong while uploading your file. For more information, view the DON'T PANIC error log.", "danger")
         # Capture and log the actual error for debugging purposes
         traceback_info = traceback.format_exc()
         current_app.logger.error(f"Error during device import: {traceback_info}")
 
-    return render_template("import_devices.html", form=form, traceback=traceback_info)
+    return render_template(
+        "import_devices.html", form=form, traceback=traceback_info, import_errors=import_errors
+    )
 
 @main.route("/import_personnel", methods=["GET", "POST"])
 @login_required
 def import_personnel():
     form = ImportPersonnelForm()  # Create an instance of the form
     traceback_info = None  # Initialize traceback_info
+    import_errors = []
 
     try:
         if form.validate_on_submit():
             file = form.file.data  # Access the file field from the form
-            if file and file.filename.endswith(".csv"):
-                stream = StringIO(file.stream.read().decode("UTF-8", errors="ignore"))
-                csv_input = csv.reader(stream)
-                header = next(csv_input)  # Skip header row
-
-                personnel_ids = set()
-                error_messages = []
-
-                for line_number, row in enumerate(csv_input, start=2):  # Start from 2 because of the header
-                    if len(row) != 16:
-                        error_messages.append(f"Line {line_number}: Each row must have 15 fields.")
-                        break
-
-                    try:
-                        personnel_id = int(row[0])
-                        if personnel_id in personnel_ids:
-                            error_messages.append(f"Line {line_number}: Duplicate ID found: {personnel_id}")
-                        personnel_ids.add(personnel_id)
-                    except ValueError:
-                        error_messages.append(f"Line {line_number}: Invalid ID: {row[0]}")
-                        continue
-
-                    # Check for non-integer values in device_id and powercord_id
-                    try:
-                        if row[13]:  # Check if device_id is provided
-                            device_id = int(row[13])
-                    except ValueError:
-                        error_messages.append(f"Line {line_number}: Non-integer value for device_id: {row[13]}")
-
-                    try:
-                        if row[14]:  # Check if powercord_id is provided
-                            powercord_id = int(row[14])
-                    except ValueError:
-                        error_messages.append(f"Line {line_number}: Non-integer value for powercord_id: {row[14]}")
-
-                if error_messages:
-                    for error in error_messages:
-                        flash(error, "danger")
+            if file and file.filename.lower().endswith(IMPORT_EXTENSIONS):
+                started = time.perf_counter()
+                header, rows = read_upload_rows(file)
+                import_errors = validate_rows("personnel", rows)
+
+                if import_errors:
+                    flash(
+                        f"Found {len(import_errors)} problems in the file, nothing was imported.",
+                        "danger",
+                    )
                 else:
-                    stream.seek(0)
-                    next(csv_input)  # Skip header row again
-                    for row in csv_input:
+                    imported = 0
+                    for row in rows:
+                        imported += 1
                         personnel_id = int(row[0])
                         personnel = Personnel.query.get(personnel_id)
                         if personnel:
@@ -909,16 +1074,21 @@ def import_personnel():
                             )
                             db.session.add(new_personnel)
                     db.session.commit()
+                    record_import("personnel", imported, time.perf_counter() - started)
                     flash("Students imported successfully!", "success")
             else:
-                flash("Invalid file format. Please upload a CSV file.", "danger")
+                flash("Invalid file format. Please upload a CSV or Excel (.xlsx) file.", "danger")
+    except UploadFileError as e:
+        flash(str(e), "danger")
     except Exception as e:
         flash("Something went wrong while uploading your file. For more information, view the DON'T PANIC error log.", "danger")
         # Capture and log the actual error for debugging purposes
         traceback_info = traceback.format_exc()
         current_app.logger.error(f"Error during personnel import: {traceback_info}")
 
-    return render_template("import_personnel.html", form=form, traceback=traceback_info)
+    return render_template(
+        "import_personnel.html", form=form, traceback=traceback_info, import_errors=import_errors
+    )
 
 @main.route("/import_staff", methods=["GET", "POST"])
 @login_required
@@ -928,52 +1098,25 @@ def import_staff():
     
     form = ImportStaffForm()  # Create an instance of the form
     traceback_info = None  # Initialize traceback_info
+    import_errors = []
 
     try:
         if form.validate_on_submit():
             file = form.file.data  # Access the file field from the form
-            if file and file.filename.endswith(".csv"):
-                stream = StringIO(file.stream.read().decode("UTF-8", errors="ignore"))
-                csv_input = csv.reader(stream)
-                header = next(csv_input)  # Skip header row
-
-                staff_ids = set()
-                error_messages = []
-
-                for line_number, row in enumerate(csv_input, start=2):  # Start from 2 because of the header
-                    if len(row) != 15:
-                        error_messages.append(f"Line {line_number}: Each row must have 15 fields.")
-                        break
-
-                    try:
-                        staff_id = int(row[0])
-                        if staff_id in staff_ids:
-                            error_messages.append(f"Line {line_number}: Duplicate ID found: {staff_id}")
-                        staff_ids.add(staff_id)
-                    except ValueError:
-                        error_messages.append(f"Line {line_number}: Invalid ID: {row[0]}")
-                        continue
-
-                    # Check for non-integer values in device_id and powercord_id
-                    try:
-                        if row[12]:  # Check if device_id is provided
-                            device_id = int(row[12])
-                    except ValueError:
-                        error_messages.append(f"Line {line_number}: Non-integer value for device_id: {row[12]}")
-
-                    try:
-                        if row[13]:  # Check if powercord_id is provided
-                            powercord_id = int(row[13])
-                    except ValueError:
-                        error_messages.append(f"Line {line_number}: Non-integer value for powercord_id: {row[13]}")
-
-                if error_messages:
-                    for error in error_messages:
-                        flash(error, "danger")
+            if file and file.filename.lower().endswith(IMPORT_EXTENSIONS):
+                started = time.perf_counter()
+                header, rows = read_upload_rows(file)
+                import_errors = validate_rows("staff", rows)
+
+                if import_errors:
+                    flash(
+                        f"Found {len(import_errors)} problems in the file, nothing was imported.",
+                        "danger",
+                    )
                 else:
-                    stream.seek(0)
-                    next(csv_input)  # Skip header row again
-                    for row in csv_input:
+                    imported = 0
+                    for row in rows:
+                        imported += 1
                         staff_id = int(row[0])
                         staff = Staff.query.get(staff_id)
                         if staff:
@@ -1013,16 +1156,21 @@ def import_staff():
                             )
                             db.session.add(new_staff)
                     db.session.commit()
+                    record_import("staff", imported, time.perf_counter() - started)
                     flash("Staff imported successfully!", "success")
             else:
-                flash("Invalid file format. Please upload a CSV file.", "danger")
+                flash("Invalid file format. Please upload a CSV or Excel (.xlsx) file.", "danger")
+    except UploadFileError as e:
+        flash(str(e), "danger")
     except Exception as e:
         flash("Something went wrong while uploading your file. For more information, view the DON'T PANIC error log.", "danger")
         # Capture and log the actual error for debugging purposes
         traceback_info = traceback.format_exc()
         current_app.logger.error(f"Error during staff import: {traceback_info}")
 
-    return render_template("import_staff.html", form=form, traceback=traceback_info)
+    return render_template(
+        "import_staff.html", form=form, traceback=traceback_info, import_errors=import_errors
+    )
 
 
 @main.route("/login", methods=["GET", "POST"])
@@ -1045,29 +1193,118 @@ def logout():
     logout_user()
     return redirect(url_for("main.login"))
 
+@main.route("/lookup/<asset>", methods=["GET"])
+@login_required
+def lookup_asset(asset):
+    asset = asset.strip()
+    refs = AssetIndex.query.filter_by(asset=asset).all()
+
+    ids = {"device": set(), "personnel": set(), "staff": set(), "repair": set()}
+    fields = {}
+    for ref in refs:
+        ids[ref.entity].add(ref.entity_id)
+        fields.setdefault((ref.entity, ref.entity_id), []).append(ref.field)
+
+    result = {"asset": asset, "devices": [], "holders": [], "repairs": []}
+
+    if ids["device"]:
+        for device in Device.query.filter(Device.id.in_(ids["device"])):
+            result["devices"].append(
+                {
+                    "id": device.id,
+                    "type": device.model_name,
+                    "manufacturer": device.manufacturer,
+                    "serial_number": device.serial_number,
+                    "assigned_user": device.assigned_user,
+                    "status": device.status,
+                    "url": url_for("main.device_detail", device_id=device.id),
+                }
+            )
+    if ids["personnel"]:
+        for p in Personnel.query.filter(Personnel.id.in_(ids["personnel"])):
+            result["holders"].append(
+                {
+                    "type": "student",
+                    "id": p.id,
+                    "name": f"{p.first_name} {p.last_name}",
+                    "fields": fields[("personnel", p.id)],
+                    "url": url_for("main.personnel_detail", personnel_id=p.id),
+                }
+            )
+    if ids["staff"] and current_user.is_admin:
+        for s in Staff.query.filter(Staff.id.in_(ids["staff"])):
+            result["holders"].append(
+                {
+                    "type": "staff",
+                    "id": s.id,
+                    "name": f"{s.first_name} {s.last_name}",
+                    "fields": fields[("staff", s.id)],
+                    "url": url_for("main.staff_detail", staff_id=s.id),
+                }
+            )
+    if ids["repair"]:
+        open_repairs = Repair.query.filter(
+            Repair.id.in_(ids["repair"]),
+            Repair.status.in_(OPEN_REPAIR_STATUSES),
+        )
+        for repair in open_repairs:
+            result["repairs"].append(
+                {
+                    "id": repair.id,
+                    "name": f"{repair.first_name} {repair.last_name}",
+                    "status": repair.status,
+                    "asset_id": repair.asset_id,
+                    "loaner_id": repair.loaner_id,
+                    "fields": fields[("repair", repair.id)],
+                    "url": url_for("main.repair_detail", repair_id=repair.id),
+                }
+            )
+
+    if not (result["devices"] or result["holders"] or result["repairs"]):
+        return jsonify(result), 404
+    return jsonify(result)
+
+@main.route("/metrics", methods=["GET"])
+@login_required
+def metrics():
+    if not current_user.is_admin:
+        abort(403)
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 @main.route("/personnels", methods=["GET"])
 @login_required
 def manage_personnels():
     search_query = request.args.get("search", "")
     sort_by = request.args.get("sort_by", "first_name")
     status_filter = request.args.get("status", "")
-    personnels = Personnel.query
-    if search_query:
-        personnels = personnels.filter(
-            (Personnel.first_name.ilike(f"%{search_query}%"))
-            | (Personnel.last_name.ilike(f"%{search_query}%"))
-            | (Personnel.laptop_username.ilike(f"%{search_query}%"))
-            | (Personnel.laptop_password.ilike(f"%{search_query}%"))
-            | (Personnel.microsoft_email.ilike(f"%{search_query}%"))
-        )
-    if status_filter:
-        personnels = personnels.filter_by(status=status_filter)
-    if sort_by:
-        personnels = personnels.order_by(getattr(Personnel, sort_by))
-    personnels = personnels.all()
+    def render_rows():
+        personnels = Personnel.query
+        if search_query:
+            personnels = personnels.filter(
+                (Personnel.first_name.ilike(f"%{search_query}%"))
+                | (Personnel.last_name.ilike(f"%{search_query}%"))
+                | (Personnel.laptop_username.ilike(f"%{search_query}%"))
+                | (Personnel.laptop_password.ilike(f"%{search_query}%"))
+                | (Personnel.microsoft_email.ilike(f"%{search_query}%"))
+            )
+        if status_filter:
+            personnels = personnels.filter_by(status=status_filter)
+        if sort_by:
+            try:
+                personnels = apply_sort(personnels, Personnel, sort_by)
+            except InvalidSort as e:
+                abort(400, description=str(e))
+        personnels = personnels.all()
+        return render_template("_personnel_rows.html", personnels=personnels)
+
+    rows_html = cached_rows(
+        "personnel",
+        {"search": search_query, "sort_by": sort_by, "status": status_filter},
+        render_rows,
+    )
     return render_template(
         "personnels.html",
-        personnels=personnels,
+        rows_html=rows_html,
         search_query=search_query,
         sort_by=sort_by,
         status_filter=status_filter,
@@ -1172,7 +1409,11 @@ def personnel_detail(personnel_id):
             personnel_form=form,
         )
 
-    logs = PersonnelLog.query.filter_by(personnel_id=personnel.id).all()
+    logs = (
+        PersonnelLog.query.options(joinedload(PersonnelLog.user))
+        .filter_by(personnel_id=personnel.id)
+        .all()
+    )
     return render_template(
         "personnel_detail.html",
         personnel=personnel,
@@ -1219,11 +1460,79 @@ def register():
         return redirect(url_for("main.login"))
     return render_template("register.html", title="Register", form=form)
 
+REPAIRS_PER_COLUMN = 25
+
 @main.route("/repairs")
 @login_required
 def manage_repairs():
-    repairs = Repair.query.all()
-    return render_template("repairs.html", repairs=repairs)
+    # Board with one column per status. Counts come from one grouped query and
+    # each column is one page of an (status, id) index range, so closed repairs
+    # are never read unless ?closed=1 asks for their columns.
+    show_closed = request.args.get("closed") == "1"
+    search_query = request.args.get("search", "").strip()
+    statuses = [
+        (code, label)
+        for code, label in REPAIR_STATUS_CHOICES
+        if show_closed or code in OPEN_REPAIR_STATUSES
+    ]
+
+    def filtered(query):
+        if search_query:
+            like = f"%{search_query}%"
+            query = query.filter(
+                or_(
+                    Repair.first_name.ilike(like),
+                    Repair.last_name.ilike(like),
+                    Repair.asset_id.ilike(like),
+                )
+            )
+        return query
+
+    counts = dict(
+        filtered(
+            db.session.query(Repair.status, func.count(Repair.id)).filter(
+                Repair.status.in_([code for code, _ in statuses])
+            )
+        )
+        .group_by(Repair.status)
+        .all()
+    )
+
+    columns = []
+    for code, label in statuses:
+        count = counts.get(code, 0)
+        pages = max(1, -(-count // REPAIRS_PER_COLUMN))
+        page = min(max(request.args.get(f"page_{code}", 1, type=int), 1), pages)
+        repairs = []
+        if count:
+            repairs = (
+                filtered(Repair.query.filter(Repair.status == code))
+                .order_by(Repair.id.desc())
+                .limit(REPAIRS_PER_COLUMN)
+                .offset((page - 1) * REPAIRS_PER_COLUMN)
+                .all()
+            )
+        args = request.args.to_dict()
+        columns.append(
+            {
+                "status": code,
+                "label": label,
+                "count": count,
+                "page": page,
+                "pages": pages,
+                "repairs": repairs,
+                "prev_url": url_for("main.manage_repairs", **{**args, f"page_{code}": page - 1})
+                if page > 1 else None,
+                "next_url": url_for("main.manage_repairs", **{**args, f"page_{code}": page + 1})
+                if page < pages else None,
+            }
+        )
+    return render_template(
+        "repairs.html",
+        columns=columns,
+        show_closed=show_closed,
+        search_query=search_query,
+    )
 
 @main.route("/repair/add", methods=["GET", "POST"])
 @login_required
@@ -1358,7 +1667,11 @@ def edit_repair(repair_id):
         #/repair/<int:repair_id>/detail"
         return redirect(url_for("main.repair_detail", repair_id=repair.id))
 
-    logs = RepairLog.query.filter_by(repair_id=repair.id).all()
+    logs = (
+        RepairLog.query.options(joinedload(RepairLog.user))
+        .filter_by(repair_id=repair.id)
+        .all()
+    )
     return render_template("edit_repair.html", form=form, repair=repair, logs=logs)
 
 def save_picture(form_picture, folder):
@@ -1368,7 +1681,11 @@ def save_picture(form_picture, folder):
     random_hex = secrets.token_hex(8)
     _, f_ext = os.path.splitext(form_picture.filename)
     picture_fn = random_hex + f_ext
-    picture_path = os.path.join(current_app.root_path, "static", folder, picture_fn)
+    picture_dir = os.path.join(current_app.root_path, "static", folder)
+    os.makedirs(picture_dir, exist_ok=True)
+    picture_path = os.path.join(picture_dir, picture_fn)
+
+    from PIL import Image  # only needed here, keeps worker boot fast
 
     with Image.open(form_picture) as img:
         img.save(picture_path)
@@ -1441,7 +1758,11 @@ def repair_detail(repair_id):
         return render_template("repair_details.html", repair=repair, repair_form=form)
     
 
-    logs = RepairLog.query.filter_by(repair_id=repair.id).all()
+    logs = (
+        RepairLog.query.options(joinedload(RepairLog.user))
+        .filter_by(repair_id=repair.id)
+        .all()
+    )
     return render_template("repair_details.html", repair_form=form, repair=repair, logs=logs)
     
 @main.route("/repair/<int:repair_id>/delete", methods=["POST"])
@@ -1463,26 +1784,37 @@ def manage_staffs():
     search_query = request.args.get("search", "")
     sort_by = request.args.get("sort_by", "first_name")
     status_filter = request.args.get("status", "")
-    staffs = Staff.query
-    if search_query:
-        staffs = staffs.filter(
-            (Staff.first_name.ilike(f"%{search_query}%"))
-            | (Staff.last_name.ilike(f"%{search_query}%"))
-            | (Staff.laptop_username.ilike(f"%{search_query}%"))
-            | (Staff.laptop_password.ilike(f"%{search_query}%"))
-            | (Staff.microsoft_password.ilike(f"%{search_query}%"))
-            | (Staff.pin_code_number.ilike(f"%{search_query}%"))
-            | (Staff.device_id.ilike(f"%{search_query}%"))
-            | (Staff.powercord_id.ilike(f"%{search_query}%"))
-        )
-    if status_filter:
-        staffs = staffs.filter_by(status=status_filter)
-    if sort_by:
-        staffs = staffs.order_by(getattr(Staff, sort_by))
-    staffs = staffs.all()
+    def render_rows():
+        staffs = Staff.query
+        if search_query:
+            staffs = staffs.filter(
+                (Staff.first_name.ilike(f"%{search_query}%"))
+                | (Staff.last_name.ilike(f"%{search_query}%"))
+                | (Staff.laptop_username.ilike(f"%{search_query}%"))
+                | (Staff.laptop_password.ilike(f"%{search_query}%"))
+                | (Staff.microsoft_password.ilike(f"%{search_query}%"))
+                | (Staff.pin_code_number.ilike(f"%{search_query}%"))
+                | (Staff.device_id.ilike(f"%{search_query}%"))
+                | (Staff.powercord_id.ilike(f"%{search_query}%"))
+            )
+        if status_filter:
+            staffs = staffs.filter_by(status=status_filter)
+        if sort_by:
+            try:
+                staffs = apply_sort(staffs, Staff, sort_by)
+            except InvalidSort as e:
+                abort(400, description=str(e))
+        staffs = staffs.all()
+        return render_template("_staff_rows.html", staffs=staffs)
+
+    rows_html = cached_rows(
+        "staff",
+        {"search": search_query, "sort_by": sort_by, "status": status_filter},
+        render_rows,
+    )
     return render_template(
         "staffs.html",
-        staffs=staffs,
+        rows_html=rows_html,
         search_query=search_query,
         sort_by=sort_by,
         status_filter=status_filter,
@@ -1576,7 +1908,11 @@ def staff_detail(staff_id):
             staff_form=form,
         )
 
-    logs = StaffLog.query.filter_by(staff_id=staff.id).all()
+    logs = (
+        StaffLog.query.options(joinedload(StaffLog.user))
+        .filter_by(staff_id=staff.id)
+        .all()
+    )
     return render_template(
         "staff_details.html",
         staff=staff,
@@ -1584,6 +1920,40 @@ def staff_detail(staff_id):
         staff_form=form,
     )
 
+@main.route("/reports/lifecycle", methods=["GET", "POST"])
+@login_required
+def lifecycle_report():
+    # Built nightly by the scheduler; this page only reads the stored copy
+    if request.method == "POST":
+        if not current_user.is_admin:
+            abort(403)
+        from scheduler import enqueue_job
+
+        enqueue_job(current_app._get_current_object(), "lifecycle_report_job")
+        flash("The lifecycle report is being rebuilt. Refresh in a minute.", "info")
+        return redirect(url_for("main.lifecycle_report"))
+    report, generated_at = load_lifecycle_report()
+    return render_template(
+        "lifecycle_report.html", report=report, generated_at=generated_at
+    )
+
+@main.route("/scan", methods=["GET", "POST"])
+@login_required
+def scan_device():
+    # Barcode scanner station: the page posts each scan here as JSON
+    if request.method == "GET":
+        return render_template("scan.html", actions=SCAN_ACTIONS)
+    started = time.perf_counter()
+    data = request.get_json(silent=True) or request.form
+    try:
+        result = apply_scan(
+            data.get("code"), data.get("action", "toggle"), data.get("assign_to"), current_user
+        )
+    except ScanError as e:
+        return jsonify({"error": str(e)}), 400
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return jsonify(result)
+
 @main.route("/settings", methods=["GET", "POST"])
 @login_required
 def settings():
@@ -1634,12 +2004,57 @@ def settings():
         else:
             flash("User not found.", "danger")
 
+    backups = backup_statuses() if current_user.is_admin else []
     return render_template(
         "settings.html",
         update_form=update_form,
         password_form=password_form,
         admin_password_form=admin_password_form,
         delete_form=delete_form,
+        backups=backups,
+        failed_backups=[b for b in backups if b["verification"] and not b["verification"]["ok"]],
+    )
+
+@main.route("/tasks/<int:task_id>", methods=["GET"])
+@login_required
+def task_status(task_id):
+    task = Task.query.get_or_404(task_id)
+    if task.user_id != current_user.id and not current_user.is_admin:
+        abort(403)
+    result = json.loads(task.result) if task.result else None
+    download_url = None
+    if task.status == "done" and result and result.get("file") and os.path.isfile(
+        result_path(current_app, task.id, result["file"])
+    ):
+        download_url = url_for("main.task_download", task_id=task.id)
+    return jsonify(
+        {
+            "id": task.id,
+            "name": task.name,
+            "status": task.status,
+            "attempts": task.attempts,
+            "created_at": task.created_at.isoformat(),
+            "finished_at": task.finished_at.isoformat() if task.finished_at else None,
+            "result": result,
+            "download_url": download_url,
+        }
+    )
+
+@main.route("/tasks/<int:task_id>/download", methods=["GET"])
+@login_required
+def task_download(task_id):
+    task = Task.query.get_or_404(task_id)
+    if task.user_id != current_user.id and not current_user.is_admin:
+        abort(403)
+    if task.status != "done" or not task.result:
+        return "Error: Task has not finished", 409
+    filename = json.loads(task.result).get("file")
+    if not filename:
+        abort(404)
+    if not os.path.isfile(result_path(current_app, task.id, filename)):
+        return "Error: Task result has expired", 410
+    return send_from_directory(
+        result_path(current_app, task.id), filename, as_attachment=True
     )
 
 
@@ -1647,43 +2062,180 @@ def settings():
 #
 #        WEB FILE EXPLORER          
 # 
-#   ROOT_DIR
+#   root_dir()
 #   Def     A -> Z
 #   Routes  A -> Z
 #_____________________________________________________________
 
 
 #
-#   ROOT_DIR
+#   root_dir()
 #
-ROOT_DIR = os.path.join(os.getcwd(), 'miniRoot')
+def root_dir():
+    # Each tenant has its own miniRoot, see tenancy.py
+    return os.path.join(tenant_dir() or os.getcwd(), 'miniRoot')
+
+# /list pages; big scan folders hold tens of thousands of files
+LIST_SORTS = ('name', 'size', 'mtime', 'type')
+LIST_PAGE_SIZE = 200
+LIST_MAX_PAGE_SIZE = 1000
+BATCH_OPS = ('copy', 'delete', 'move', 'rename')
 
 #
 #   DEFINITIONS A -> Z
 #
+def batch_target(root, item):
+    # (op, source, destination) of one /batch_files operation, absolute paths.
+    # Copies and moves go into target_dir under the same name, renames stay in
+    # their folder; raises ValueError for a malformed operation.
+    if not isinstance(item, dict):
+        raise ValueError('Expected an object')
+    op = item.get('op')
+    if op not in BATCH_OPS:
+        raise ValueError(f'Unknown operation: {op}')
+    if not item.get('path') or not isinstance(item['path'], str):
+        raise ValueError('Missing path')
+    source = os.path.normpath(os.path.join(root, item['path'].lstrip('/')))
+    if source == root:
+        raise ValueError('miniRoot itself cannot be changed')
+    if op == 'delete':
+        return op, source, None
+    if op == 'rename':
+        new_name = item.get('new_name') or ''
+        if not isinstance(new_name, str) or new_name in ('', '.', '..') or '/' in new_name or os.sep in new_name:
+            raise ValueError('Invalid new_name')
+        return op, source, os.path.join(os.path.dirname(source), new_name)
+    if not isinstance(item.get('target_dir'), str):
+        raise ValueError('Missing target_dir')
+    target_dir = os.path.normpath(os.path.join(root, item['target_dir'].lstrip('/')))
+    if target_dir == source or target_dir.startswith(source + os.sep):
+        raise ValueError('Cannot put a folder inside itself')
+    return op, source, os.path.join(target_dir, os.path.basename(source))
+
+def directory_listing(directory, query, sort_key, sort_order, offset, limit):
+    # One /list page, also sent back by /batch_files
+    rel = rel_path(root_dir(), directory)
+    path = f'/{rel}' if rel else ''
+    if not os.path.isdir(directory):
+        return {'items': [], 'total': 0, 'offset': 0, 'next_offset': None, 'path': path}
+
+    usage = {} if query else child_usage(root_dir(), directory)
+    # Name and type sorts only need the names, so only the returned page is
+    # stat()ed; size and date sorts have to stat everything first
+    stat_all = sort_key in ('size', 'mtime')
+    scanned = [
+        (entry_info(name, entry, usage, stat_all), entry)
+        for name, entry in scan_entries(directory, query)
+    ]
+    key = list_sort_key(sort_key)
+    reverse = sort_order == 'desc'
+    folders = sorted((s for s in scanned if s[0]['type'] == 'folder'), key=lambda s: key(s[0]), reverse=reverse)
+    files = sorted((s for s in scanned if s[0]['type'] == 'file'), key=lambda s: key(s[0]), reverse=reverse)
+    ordered = folders + files  # folders first, like the explorer always showed them
+
+    page = ordered[offset:offset + limit]
+    if stat_all:
+        page = [item for item, _ in page]
+    else:
+        page = [entry_info(item['name'], entry, usage) for item, entry in page]
+    next_offset = offset + limit if offset + limit < len(ordered) else None
+    return {
+        'items': page,
+        'total': len(ordered),
+        'offset': offset,
+        'next_offset': next_offset,
+        'path': path,
+    }
+
+def entry_info(name, entry, usage, with_stat=True):
+    # One /list item. DirEntry caches the file type from the directory read
+    # and its stat() result, so nothing here is looked up twice.
+    is_dir = entry.is_dir()
+    item = {'name': name, 'type': 'folder' if is_dir else 'file', 'size': None, 'mtime': None}
+    if with_stat:
+        try:
+            stat = entry.stat()
+            item['mtime'] = stat.st_mtime
+            if not is_dir:
+                item['size'] = stat.st_size
+        except OSError:
+            pass  # broken link, or deleted since the directory was read
+    if is_dir and name in usage:
+        # Folder sizes come from the usage index, see folder_usage.py
+        row = usage[name]
+        item['size'] = row.total_bytes
+        item['files'] = row.total_files
+        item['quota'] = row.quota_bytes
+    return item
+
 def is_safe_path(base_path, user_path, follow_symlinks=True):
     if follow_symlinks:
         base_path = os.path.realpath(base_path)
         user_path = os.path.realpath(user_path)
     return os.path.commonprefix([base_path, user_path]) == base_path
 
-def search_files_and_folders(directory, query):
-    result = {'folders': [], 'files': []}
-    for root, dirs, files in os.walk(directory):
-        for folder in dirs:
-            folder_path = os.path.join(root, folder)
-            if query in folder.lower():
-                relative_path = os.path.relpath(folder_path, directory)
-                result['folders'].append(relative_path)
-        for file in files:
-            file_path = os.path.join(root, file)
-            if query in file.lower():
-                relative_path = os.path.relpath(file_path, directory)
-                result['files'].append(relative_path)
-    return result
-
-def sort_items(items, sort_key, reverse=False):
-    return sorted(items, key=lambda x: x[sort_key], reverse=reverse)
+def list_sort_key(sort_key):
+    if sort_key == 'size':
+        return lambda item: item['size'] or 0
+    if sort_key == 'mtime':
+        return lambda item: item['mtime'] or 0
+    if sort_key == 'type':
+        return lambda item: (os.path.splitext(item['name'])[1].lower(), item['name'].lower())
+    return lambda item: item['name'].lower()
+
+def path_and_parents(root, path):
+    # path and every folder above it, up to root
+    paths = [path]
+    while path != root and path != os.path.dirname(path):
+        path = os.path.dirname(path)
+        paths.append(path)
+    return paths
+
+def run_batch_operation(op, source, destination):
+    # The disk half of one /batch_files operation. Runs on a pool thread, so
+    # it must not touch db.session; returns what the usage index needs.
+    if not os.path.lexists(source):
+        raise FileNotFoundError('File or directory not found')
+    if destination is not None and os.path.lexists(destination):
+        raise FileExistsError(f'{os.path.basename(destination)} already exists')
+    is_dir = os.path.isdir(source)
+    size = 0 if is_dir else os.path.getsize(source)
+    sizes = None
+    if op == 'delete':
+        if is_dir:
+            shutil.rmtree(source)
+        else:
+            os.remove(source)
+    elif op == 'copy':
+        if is_dir:
+            shutil.copytree(source, destination)
+            sizes = walk_sizes(destination)
+        else:
+            shutil.copy2(source, destination)
+    else:
+        os.rename(source, destination)
+    return is_dir, size, sizes
+
+def scan_entries(directory, query):
+    # (name, DirEntry) for a folder, or for every match below it when searching
+    if not query:
+        with os.scandir(directory) as entries:
+            return [(entry.name, entry) for entry in entries]
+    matches = []
+    pending = [directory]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                if query in entry.name.lower():
+                    name = os.path.relpath(entry.path, directory).replace(os.sep, '/')
+                    matches.append((name, entry))
+    return matches
 
 
 
@@ -1692,19 +2244,121 @@ def sort_items(items, sort_key, reverse=False):
 #   ROUTES A -> Z
 #
 
+@main.route('/batch_files', methods=['POST'])
+@login_required
+def batch_files():
+    # Many explorer operations in one request, e.g. deleting 200 selected
+    # files. Every path is checked before anything runs, the disk work runs on
+    # FILE_BATCH_WORKERS threads, the usage index is committed once and the
+    # reply carries the refreshed listing, so the explorer needs no /list call.
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    operations = data.get('operations')
+    max_items = current_app.config['FILE_BATCH_MAX_ITEMS']
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'No operations given'}), 400
+    if len(operations) > max_items:
+        return jsonify({'error': f'At most {max_items} operations per batch'}), 400
+    sort, folder = data.get('sort', 'name-asc'), data.get('dir', '')
+    if not isinstance(sort, str) or not isinstance(folder, str):
+        return jsonify({'error': 'sort and dir must be strings'}), 400
+    sort_key, _, sort_order = sort.partition('-')
+    if sort_key not in LIST_SORTS:
+        return jsonify({'error': f'Unknown sort: {sort_key}'}), 400
+
+    root = os.path.realpath(root_dir())
+    directory = os.path.join(root, folder.lstrip('/'))
+    planned = []
+    for index, item in enumerate(operations):
+        try:
+            planned.append(batch_target(root, item))
+        except ValueError as e:
+            return jsonify({'error': f'Operation {index}: {e}'}), 400
+    checked = [directory] + [path for _, source, destination in planned for path in (source, destination) if path]
+    if not all(is_safe_path(root, path) for path in checked):
+        abort(403)
+
+    results = [
+        {'index': index, 'op': op, 'path': operations[index]['path'], 'ok': False}
+        for index, (op, _, _) in enumerate(planned)
+    ]
+    claimed = set()
+    claimed_parents = set()
+    incoming = {}
+    runnable = []
+    for index, (op, source, destination) in enumerate(planned):
+        touched = [path for path in (source, destination) if path]
+        # Two operations on one path, or on a folder and something inside it,
+        # would race each other on the pool
+        if any(
+            path in claimed_parents or claimed.intersection(path_and_parents(root, path))
+            for path in touched
+        ):
+            results[index]['error'] = 'Overlaps another operation in this batch'
+            continue
+        if op == 'copy' or (op == 'move' and os.path.dirname(source) != os.path.dirname(destination)):
+            target_dir = os.path.dirname(destination)
+            if os.path.isdir(source):
+                size = totals(rel_path(root, source))[0]
+            else:
+                size = os.path.getsize(source) if os.path.isfile(source) else 0
+            incoming[target_dir] = incoming.get(target_dir, 0) + size
+            over = quota_exceeded(root, target_dir, incoming[target_dir])
+            if over is not None:
+                results[index]['error'] = f"Folder '{over.path or 'miniRoot'}' is over its quota"
+                continue
+        for path in touched:
+            claimed.add(path)
+            claimed_parents.update(path_and_parents(root, path)[1:])
+        runnable.append(index)
+
+    with ThreadPoolExecutor(max_workers=current_app.config['FILE_BATCH_WORKERS']) as pool:
+        futures = {index: pool.submit(run_batch_operation, *planned[index]) for index in runnable}
+
+    for index, future in futures.items():
+        op, source, destination = planned[index]
+        try:
+            is_dir, size, sizes = future.result()
+        except OSError as e:
+            results[index]['error'] = e.strerror or str(e)
+            continue
+        if op == 'delete' and is_dir:
+            folder_removed(root, source)
+        elif op == 'delete':
+            file_removed(root, source, size)
+        elif op == 'copy' and is_dir:
+            folder_copied(root, destination, sizes)
+        elif op == 'copy':
+            file_added(root, destination, size)
+        else:
+            path_moved(root, source, destination, is_dir, size)
+        results[index]['ok'] = True
+    db.session.commit()
+
+    succeeded = sum(result['ok'] for result in results)
+    return jsonify({
+        'results': results,
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'listing': directory_listing(directory, '', sort_key, sort_order, 0, LIST_PAGE_SIZE),
+    })
+
 @main.route('/create_folder', methods=['POST'])
 @login_required
 def create_folder():
     data = request.get_json()
-    parent_dir = os.path.join(ROOT_DIR, data.get('parent_dir').lstrip('/'))
+    parent_dir = os.path.join(root_dir(), data.get('parent_dir').lstrip('/'))
     new_folder_name = data.get('new_folder_name')
     new_folder_path = os.path.join(parent_dir, new_folder_name)
 
-    if not is_safe_path(ROOT_DIR, new_folder_path):
+    if not is_safe_path(root_dir(), new_folder_path):
         abort(403)
 
     if not os.path.exists(new_folder_path):
         os.makedirs(new_folder_path)
+        folder_created(root_dir(), new_folder_path)
+        db.session.commit()
         return 'Folder created successfully'
     else:
         return 'Error: Folder already exists', 400
@@ -1713,16 +2367,21 @@ def create_folder():
 @login_required
 def delete():
     data = request.get_json()
-    path_to_delete = os.path.join(ROOT_DIR, data.get('path').lstrip('/'))
+    path_to_delete = os.path.join(root_dir(), data.get('path').lstrip('/'))
 
-    if not is_safe_path(ROOT_DIR, path_to_delete):
+    if not is_safe_path(root_dir(), path_to_delete):
         abort(403)
 
     if os.path.isdir(path_to_delete):
         shutil.rmtree(path_to_delete)
+        folder_removed(root_dir(), path_to_delete)
+        db.session.commit()
         return 'Folder deleted successfully'
     elif os.path.isfile(path_to_delete):
+        size = os.path.getsize(path_to_delete)
         os.remove(path_to_delete)
+        file_removed(root_dir(), path_to_delete, size)
+        db.session.commit()
         return 'File deleted successfully'
     else:
         return 'Error: File or directory not found', 404
@@ -1731,9 +2390,9 @@ def delete():
 @login_required
 def download_file():
     file_path = request.args.get('file_path', '')
-    abs_file_path = os.path.join(ROOT_DIR, file_path.lstrip('/'))
+    abs_file_path = os.path.join(root_dir(), file_path.lstrip('/'))
 
-    if not is_safe_path(ROOT_DIR, abs_file_path):
+    if not is_safe_path(root_dir(), abs_file_path):
         abort(403)
 
     if os.path.exists(abs_file_path) and os.path.isfile(abs_file_path):
@@ -1745,62 +2404,80 @@ def download_file():
 @login_required
 def download_folder():
     folder_path = request.args.get('folder_path', '')
-    abs_folder_path = os.path.join(ROOT_DIR, folder_path.lstrip('/'))
+    abs_folder_path = os.path.join(root_dir(), folder_path.lstrip('/'))
 
-    if not is_safe_path(ROOT_DIR, abs_folder_path):
+    if not is_safe_path(root_dir(), abs_folder_path):
         abort(403)
 
+    if request.args.get('async') and os.path.isdir(abs_folder_path):
+        task_id = enqueue('zip_folder', priority=5, user_id=current_user.id, folder_path=folder_path)
+        return jsonify({'task_id': task_id, 'status_url': url_for('main.task_status', task_id=task_id)}), 202
+
     if os.path.exists(abs_folder_path) and os.path.isdir(abs_folder_path):
+        # The zip lands next to the folder, so it counts towards usage too
+        zip_file = abs_folder_path.rstrip(os.sep) + '.zip'
+        replaced = os.path.getsize(zip_file) if os.path.isfile(zip_file) else None
         zip_path = shutil.make_archive(abs_folder_path, 'zip', abs_folder_path)
+        if replaced is not None:
+            file_removed(root_dir(), zip_path, replaced)
+        file_added(root_dir(), zip_path, os.path.getsize(zip_path))
+        db.session.commit()
         return send_from_directory(directory=os.path.dirname(zip_path), path=os.path.basename(zip_path), as_attachment=True)
     else:
         return 'Error: Folder not found', 404
 
-@main.route('/list', methods=['GET'])
+@main.route('/folder_quota', methods=['POST'])
 @login_required
-def list_files():
-    directory = request.args.get('dir', ROOT_DIR)
-    directory = os.path.join(ROOT_DIR, directory.lstrip('/'))
-    query = request.args.get('query', '').lower()
-    sort = request.args.get('sort', 'name-asc')
+def folder_quota():
+    if not current_user.is_admin:
+        abort(403)
+    data = request.get_json()
+    folder_path = os.path.join(root_dir(), data.get('path', '').lstrip('/'))
 
-    if not is_safe_path(ROOT_DIR, directory):
+    if not is_safe_path(root_dir(), folder_path):
         abort(403)
+    if not os.path.isdir(folder_path):
+        return 'Error: Folder not found', 404
 
-    if not os.path.exists(directory):
-        return jsonify({'folders': [], 'files': [], 'path': directory})
+    quota_mb = data.get('quota_mb')
+    quota_bytes = int(float(quota_mb) * 1024 * 1024) if quota_mb not in (None, '') else None
+    set_quota(root_dir(), folder_path, quota_bytes)
+    db.session.commit()
+    return 'Quota updated successfully'
 
-    if query:
-        result = search_files_and_folders(directory, query)
-    else:
-        result = {'folders': [], 'files': []}
-        for item in os.listdir(directory):
-            item_path = os.path.join(directory, item)
-            if os.path.isdir(item_path):
-                result['folders'].append(item)
-            else:
-                result['files'].append(item)
+@main.route('/list', methods=['GET'])
+@login_required
+def list_files():
+    directory = os.path.join(root_dir(), request.args.get('dir', '').lstrip('/'))
+    query = request.args.get('query', '').lower()
+    sort_key, _, sort_order = request.args.get('sort', 'name-asc').partition('-')
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', LIST_PAGE_SIZE, type=int), 1), LIST_MAX_PAGE_SIZE)
 
-    sort_key, sort_order = sort.split('-')
-    reverse = sort_order == 'desc'
-    result['folders'] = sort_items([{'name': f, 'path': os.path.join(directory, f)} for f in result['folders']], 'name', reverse)
-    result['files'] = sort_items([{'name': f, 'path': os.path.join(directory, f)} for f in result['files']], 'name', reverse)
+    if not is_safe_path(root_dir(), directory):
+        abort(403)
+    if sort_key not in LIST_SORTS:
+        return jsonify({'error': f'Unknown sort: {sort_key}'}), 400
 
-    return jsonify({'folders': [f['name'] for f in result['folders']], 'files': [f['name'] for f in result['files']], 'path': directory})
+    return jsonify(directory_listing(directory, query, sort_key, sort_order, offset, limit))
 
 @main.route('/move_to_parent', methods=['POST'])
 @login_required
 def move_to_parent():
     data = request.get_json()
-    path = os.path.join(ROOT_DIR, data.get('path').lstrip('/'))
+    path = os.path.join(root_dir(), data.get('path').lstrip('/'))
     parent_path = os.path.dirname(os.path.dirname(path))
     new_path = os.path.join(parent_path, os.path.basename(path))
 
-    if not (is_safe_path(ROOT_DIR, path) and is_safe_path(ROOT_DIR, new_path)):
+    if not (is_safe_path(root_dir(), path) and is_safe_path(root_dir(), new_path)):
         abort(403)
 
     if os.path.exists(path):
+        is_dir = os.path.isdir(path)
+        size = 0 if is_dir else os.path.getsize(path)
         os.rename(path, new_path)
+        path_moved(root_dir(), path, new_path, is_dir, size)
+        db.session.commit()
         return 'Moved to parent directory successfully'
     else:
         return 'Error: File or directory not found', 404
@@ -1809,16 +2486,22 @@ def move_to_parent():
 @login_required
 def rename():
     data = request.get_json()
-    old_name = os.path.join(ROOT_DIR, data.get('old_name').lstrip('/'))
-    new_name = os.path.join(ROOT_DIR, data.get('new_name').lstrip('/'))
+    old_name = os.path.join(root_dir(), data.get('old_name').lstrip('/'))
+    new_name = os.path.join(root_dir(), data.get('new_name').lstrip('/'))
 
-    if not (is_safe_path(ROOT_DIR, old_name) and is_safe_path(ROOT_DIR, new_name)):
+    if not (is_safe_path(root_dir(), old_name) and is_safe_path(root_dir(), new_name)):
         return jsonify({'error': 'Unsafe path'}), 403
 
     if os.path.exists(old_name):
         try:
+            is_dir = os.path.isdir(old_name)
+            size = 0 if is_dir else os.path.getsize(old_name)
             os.rename(old_name, new_name)
-            return jsonify({'message': 'Folder renamed successfully', 'path': os.path.dirname(new_name)})
+            path_moved(root_dir(), old_name, new_name, is_dir, size)
+            db.session.commit()
+            # Same form as /list paths, so the explorer can reload it
+            parent = rel_path(root_dir(), os.path.dirname(new_name))
+            return jsonify({'message': 'Folder renamed successfully', 'path': f'/{parent}' if parent else ''})
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     else:
@@ -1828,22 +2511,36 @@ def rename():
 @login_required
 def upload():
     target_dir = request.form['target_dir']
-    target_dir = os.path.join(ROOT_DIR, target_dir.lstrip('/'))
+    target_dir = os.path.join(root_dir(), target_dir.lstrip('/'))
 
-    if not is_safe_path(ROOT_DIR, target_dir):
+    if not is_safe_path(root_dir(), target_dir):
         abort(403)
 
     file = request.files['file']
-    file.save(os.path.join(target_dir, file.filename))
+    file_path = os.path.join(target_dir, file.filename)
+    file.stream.seek(0, os.SEEK_END)
+    size = file.stream.tell()
+    file.stream.seek(0)
+    replaced = os.path.getsize(file_path) if os.path.isfile(file_path) else None
+
+    over = quota_exceeded(root_dir(), target_dir, size - (replaced or 0))
+    if over is not None:
+        return f"Error: Folder '{over.path or 'miniRoot'}' is over its quota", 413
+
+    file.save(file_path)
+    if replaced is not None:
+        file_removed(root_dir(), file_path, replaced)
+    file_added(root_dir(), file_path, size)
+    db.session.commit()
     return 'File uploaded successfully'
 
 @main.route('/view_file', methods=['GET'])
 @login_required
 def view_file():
     file_path = request.args.get('file_path', '')
-    abs_file_path = os.path.join(ROOT_DIR, file_path.lstrip('/'))
+    abs_file_path = os.path.join(root_dir(), file_path.lstrip('/'))
 
-    if not is_safe_path(ROOT_DIR, abs_file_path):
+    if not is_safe_path(root_dir(), abs_file_path):
         abort(403)
 
     if os.path.exists(abs_file_path) and os.path.isfile(abs_file_path):
@@ -1856,6 +2553,7 @@ def view_file():
         elif file_ext == '.pdf':
             return send_from_directory(directory=os.path.dirname(abs_file_path), path=os.path.basename(abs_file_path))
         elif file_ext == '.docx':
+            from docx import Document  # only needed here, keeps worker boot fast
             doc = Document(abs_file_path)
             doc_text = '\n'.join([para.text for para in doc.paragraphs])
             return Response(doc_text, mimetype='text/plain')
@@ -1867,6 +2565,6 @@ def view_file():
 @main.route('/web_files')
 @login_required
 def web_files():
-    if not os.path.exists(ROOT_DIR):
-        os.makedirs(ROOT_DIR)
-    return render_template('web_files.html', root_dir=ROOT_DIR)
\ No newline at end of file
+    if not os.path.exists(root_dir()):
+        os.makedirs(root_dir())
+    return render_template('web_files.html', root_dir=root_dir())
\ No newline at end of file
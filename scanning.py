@@ -0,0 +1,126 @@
+# Dev Dominic Minnich 2024
+# scanning.py
+
+# Barcode scanner check-in/check-out. A scan is an asset or serial number;
+# both columns are unique, so a miss is at most two exact-match index lookups.
+# Scanned codes are remembered per process as code -> device id, so a repeat
+# scan is a primary key get. The cache only ever holds ids and every hit is
+# checked against the row it loads, so a renumbered asset tag can't return the
+# wrong device; it just falls back to the index lookups.
+
+import threading
+from collections import OrderedDict
+
+from __init__ import db
+from metrics import SCANS
+from models import Device, DeviceLog
+from tenancy import current_tenant
+
+
+SCAN_ACTIONS = ("toggle", "check_out", "check_in")
+CHECKED_OUT_STATUS = "In Use"
+CHECKED_IN_STATUS = "Available"
+
+
+class ScanError(ValueError):
+    pass
+
+
+class HotDevices:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    # Keys are (tenant, code), ids are only meaningful within one database
+    def get(self, key):
+        with self.lock:
+            device_id = self.entries.get(key)
+            if device_id is not None:
+                self.entries.move_to_end(key)
+            return device_id
+
+    def set(self, key, device_id):
+        with self.lock:
+            self.entries[key] = device_id
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+hot_devices = HotDevices(4096)
+
+
+def find_device(code):
+    # Returns (device or None, "hit" or "miss")
+    key = (current_tenant(), code)
+    device_id = hot_devices.get(key)
+    if device_id is not None:
+        device = db.session.get(Device, device_id)
+        if device is not None and code in (device.asset_number, device.serial_number):
+            return device, "hit"
+        hot_devices.discard(key)
+
+    device = Device.query.filter_by(asset_number=code).first()
+    if device is None:
+        device = Device.query.filter_by(serial_number=code).first()
+    if device is not None:
+        hot_devices.set(key, device.id)
+    return device, "miss"
+
+
+def apply_scan(code, action, assign_to, user):
+    code = (code or "").strip()
+    assign_to = (assign_to or "").strip()
+    if not code:
+        raise ScanError("Nothing was scanned.")
+    if action not in SCAN_ACTIONS:
+        raise ScanError(f"Unknown scan action: {action}")
+
+    device, cache = find_device(code)
+    if device is None:
+        SCANS.inc(action, cache)
+        raise ScanError(f"No device with asset or serial number {code}.")
+
+    if action == "toggle":
+        action = "check_in" if device.assigned_user else "check_out"
+    if action == "check_out":
+        if not assign_to:
+            raise ScanError("Scan or enter who the device is going to first.")
+        new_user, new_status = assign_to, CHECKED_OUT_STATUS
+    else:
+        new_user, new_status = "", CHECKED_IN_STATUS
+
+    # Same wording as the edit page logs
+    changes = []
+    if (device.assigned_user or "") != new_user:
+        changes.append(f"Assigned User changed from {device.assigned_user} to {new_user}")
+        device.assigned_user = new_user
+    if device.status != new_status:
+        changes.append(f"Status changed from {device.status} to {new_status}")
+        device.status = new_status
+    for change in changes:
+        db.session.add(
+            DeviceLog(device_id=device.id, change_description=change, user_id=user.id)
+        )
+    # Read before the commit expires the row, which would cost another query
+    result = {
+        "id": device.id,
+        "asset_number": device.asset_number,
+        "model_name": device.model_name,
+        "assigned_user": device.assigned_user,
+        "status": device.status,
+        "action": action,
+        "changes": changes,
+    }
+    db.session.commit()
+    SCANS.inc(action, cache)
+    return result
+
+
+def init_scanning(app):
+    hot_devices.max_entries = app.config["SCAN_CACHE_SIZE"]
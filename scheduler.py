@@ -1,28 +1,304 @@
 # Dev Dominic Minnich 2024
 # scheduler.py
 
+# Every worker process starts a scheduler, but only the one holding the lock
+# file in the instance folder runs the real jobs. The others keep retrying the
+# lock, so if the leader dies one of them takes over. Each run is recorded in
+# JobRun, and a new leader catches up on any job that came due while no one
+# was running it. The jobs themselves are handed to the task queue, so they
+# run on the same worker pool as the rest of the background work.
+
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime, timedelta
 import atexit
-import subprocess
+import json
+import os
+import socket
+import sqlite3
+import time
+from backup_db import backup_database as copy_database_file
+from metrics import BACKUP_DURATION
+from tenancy import current_tenant, tenant_names, using_tenant
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 
 def backup_database():
+    from flask import current_app
+    from __init__ import db
+    from backup_verify import backup_folder, prune_backups
+    from journal import prune_journal
+
+    db_path = db.session.get_bind().url.database
+    started = time.perf_counter()
     try:
-        # Call the backup script
-        subprocess.run(['python', 'backup_db.py'], check=True)
+        copy_database_file(db_path, backup_folder())
+        BACKUP_DURATION.observe(time.perf_counter() - started, 'success')
         print('Database backup completed successfully!')
-    except subprocess.CalledProcessError as e:
+    except (OSError, sqlite3.Error) as e:
+        BACKUP_DURATION.observe(time.perf_counter() - started, 'failure')
         print(f'An error occurred during the backup: {e}')
+        raise
+    # Journal days from before the oldest backup kept can never be replayed
+    needed_from = prune_backups(current_app.config['BACKUP_KEEP'])
+    if needed_from is not None:
+        removed = prune_journal(db_path, needed_from)
+        print(f'Pruned {len(removed)} days of the change journal')
+    # Check the new file now rather than at the next verify run
+    enqueue_job(current_app._get_current_object(), 'backup_verify_job', current_tenant())
+
+
+def prune_change_events():
+    from flask import current_app
+    from change_feed import prune_events
+
+    hours = current_app.config['CHANGE_FEED_RETENTION_HOURS']
+    removed = prune_events(timedelta(hours=hours))
+    print(f'Pruned {removed} change events older than {hours} hours')
+
+
+def archive_old_logs():
+    from flask import current_app
+    from log_archive import archive_logs
+
+    archived = archive_logs(current_app)
+    print(f'Archived log rows: {archived}')
+
+
+def build_lifecycle_report():
+    from flask import current_app
+    from lifecycle import build_lifecycle_report as build
+
+    report = build(current_app)
+    print(f"Lifecycle report built: {report['warranty']['totals']} warranties expiring")
+
+
+def verify_backups():
+    from flask import current_app
+    from __init__ import db
+    from backup_verify import verify_backups as verify
+
+    results = verify(current_app, db.session.get_bind().url.database)
+    failed = [name for name, result in results if not result['ok']]
+    print(f'Verified {len(results)} backups, failed: {failed or "none"}')
+
+
+def purge_task_results():
+    from flask import current_app
+    from task_queue import purge_old_task_results
+
+    days = current_app.config['TASK_RESULT_RETENTION_DAYS']
+    purged = purge_old_task_results(current_app, timedelta(days=days))
+    print(f'Purged results of {purged} tasks older than {days} days')
+
+
+def reconcile_folder_usage():
+    from folder_usage import reconcile_usage
+    from routes import root_dir
+
+    folders = reconcile_usage(root_dir())
+    print(f'Reconciled sizes of {folders} folders')
+
+
+JOBS = {
+    'database_backup_job': {
+        'name': 'Database Backup Job',
+        'func': backup_database,
+        'interval': timedelta(days=3),
+    },
+    'backup_verify_job': {
+        'name': 'Backup Verify Job',
+        'func': verify_backups,
+        'interval': timedelta(hours=6),
+    },
+    'change_event_prune_job': {
+        'name': 'Change Event Prune Job',
+        'func': prune_change_events,
+        'interval': timedelta(hours=1),
+    },
+    'log_archive_job': {
+        'name': 'Log Archive Job',
+        'func': archive_old_logs,
+        'interval': timedelta(days=1),
+    },
+    'lifecycle_report_job': {
+        'name': 'Lifecycle Report Job',
+        'func': build_lifecycle_report,
+        'interval': timedelta(days=1),
+    },
+    'folder_usage_reconcile_job': {
+        'name': 'Folder Usage Reconcile Job',
+        'func': reconcile_folder_usage,
+        'interval': timedelta(days=1),
+    },
+    'task_result_purge_job': {
+        'name': 'Task Result Purge Job',
+        'func': purge_task_results,
+        'interval': timedelta(days=1),
+    },
+}
+
+
+class LeaderLock:
+    # Advisory lock on a file, released by the OS if the holder dies
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def acquire(self):
+        if self.handle is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        handle = open(self.path, 'a+')
+        try:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(f'{worker_name()}\n')
+        handle.flush()
+        self.handle = handle
+        return True
+
+    def release(self):
+        if self.handle is None:
+            return
+        if fcntl:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+        else:
+            self.handle.seek(0)
+            msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+        self.handle.close()
+        self.handle = None
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_job(app, job_id):
+    from __init__ import db
+    from models import JobRun
+
+    with app.app_context():
+        run = JobRun(job_id=job_id, started_at=datetime.now(), worker=worker_name())
+        db.session.add(run)
+        db.session.commit()
+        try:
+            JOBS[job_id]['func']()
+            run.status = 'success'
+        except Exception as e:
+            # The job may have failed on the database; the session has to be
+            # rolled back before the failure can be written
+            db.session.rollback()
+            run.status = 'failed'
+            run.message = str(e)
+            run.finished_at = datetime.now()
+            db.session.commit()
+            # Let the task queue retry it
+            raise
+        run.finished_at = datetime.now()
+        db.session.commit()
+
+
+def enqueue_job(app, job_id, tenant=None):
+    from models import Task
+    from task_queue import enqueue
+
+    args = json.dumps({'job_id': job_id})
+    with using_tenant(tenant), app.app_context():
+        pending = Task.query.filter(
+            Task.name == 'scheduled_job',
+            Task.args == args,
+            Task.status.in_(['queued', 'running']),
+        ).first()
+        if pending is None:
+            # Low priority so user-facing work goes first
+            enqueue('scheduled_job', priority=-10, job_id=job_id)
+
+
+def next_run_time(app, job_id, tenant=None):
+    # When the job should next run, based on its last successful run
+    from models import JobRun
+
+    with using_tenant(tenant), app.app_context():
+        last = (
+            JobRun.query.filter_by(job_id=job_id, status='success')
+            .order_by(JobRun.started_at.desc())
+            .first()
+        )
+    now = datetime.now()
+    if last is None:
+        return now
+    return max(now, last.started_at + JOBS[job_id]['interval'])
+
+
+def become_leader(app, scheduler):
+    from __init__ import db
+    from models import JobRun
+
+    # Every tenant has its own JobRun history and task queue
+    for tenant in tenant_names(app):
+        with using_tenant(tenant), app.app_context():
+            # Runs left 'running' by a leader that died never finished
+            JobRun.query.filter_by(status='running').update(
+                {'status': 'abandoned', 'finished_at': datetime.now()}
+            )
+            db.session.commit()
+
+        for job_id, job in JOBS.items():
+            scheduler.add_job(
+                func=enqueue_job,
+                args=(app, job_id, tenant),
+                trigger=IntervalTrigger(seconds=job['interval'].total_seconds()),
+                next_run_time=next_run_time(app, job_id, tenant),
+                id=f'{tenant}:{job_id}' if tenant else job_id,
+                name=f"{job['name']} ({tenant})" if tenant else job['name'],
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1,
+            )
+    app.logger.info(f'Scheduler leader is {worker_name()}')
+
+
+def start_scheduler(app):
+    if app.config['SCHEDULER_MODE'] == 'off':
+        return None
 
-def start_scheduler():
     scheduler = BackgroundScheduler()
+    lock = LeaderLock(os.path.join(app.instance_path, 'scheduler.lock'))
+
+    def try_lead():
+        if lock.handle is None and lock.acquire():
+            scheduler.remove_job('leader_election')
+            become_leader(app, scheduler)
+
     scheduler.start()
     scheduler.add_job(
-        func=backup_database,
-        trigger=IntervalTrigger(days=3),
-        id='database_backup_job',
-        name='Database Backup Job',
-        replace_existing=True
+        func=try_lead,
+        trigger=IntervalTrigger(seconds=app.config['SCHEDULER_LEADER_RETRY']),
+        next_run_time=datetime.now(),
+        id='leader_election',
+        name='Scheduler Leader Election',
+        replace_existing=True,
+        max_instances=1,
     )
+
+    def shutdown():
+        scheduler.shutdown(wait=False)
+        lock.release()
+
     # Shut down the scheduler when exiting the app
-    atexit.register(lambda: scheduler.shutdown())
+    atexit.register(shutdown)
+    return scheduler
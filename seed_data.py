@@ -0,0 +1,275 @@
+# Dev Dominic Minnich 2024
+# seed_data.py
+
+# Fills a database and a miniRoot tree with realistic fake data so routes can be
+# timed at school-district scale. Used by benchmark.py and load_test.py, or on
+# its own:
+#   python seed_data.py --scale 10k --db instance/bench.db --root miniRoot
+
+import argparse
+import datetime
+import os
+import random
+
+from werkzeug.security import generate_password_hash
+
+
+SCALES = {
+    "1k": {"devices": 1000, "logs_per_device": 10, "folders": 20, "files_per_folder": 50},
+    "10k": {"devices": 10000, "logs_per_device": 20, "folders": 50, "files_per_folder": 200},
+    "100k": {"devices": 100000, "logs_per_device": 20, "folders": 100, "files_per_folder": 1000},
+}
+
+MANUFACTURERS = {
+    "Dell": ["Chromebook 3100", "Latitude 3120", "Latitude 5420"],
+    "Lenovo": ["100e Chromebook", "300e Chromebook", "ThinkPad L13"],
+    "HP": ["Chromebook 11 G9", "ProBook 440", "EliteBook 840"],
+    "Apple": ["iPad 9th Gen", "MacBook Air"],
+}
+FIRST_NAMES = [
+    "Olivia", "Liam", "Emma", "Noah", "Ava", "Elijah", "Sophia", "James", "Mia",
+    "Lucas", "Amelia", "Mason", "Harper", "Ethan", "Evelyn", "Logan", "Abigail",
+    "Jacob", "Ella", "Michael", "Scarlett", "Daniel", "Grace", "Henry", "Chloe",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson",
+    "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson",
+]
+TITLES = ["Teacher", "Aide", "Counselor", "Principal", "Secretary", "Nurse", "Coach"]
+DEVICE_STATUSES = ["Available", "In Use", "In Use", "In Use", "In Repair"]
+REPAIR_STATUSES = [
+    "repair_completed", "repair_completed", "repair_completed",
+    "repair_pending", "repair_inprogress", "repair_impossible",
+]
+BENCH_USERNAME = "benchadmin"
+BENCH_PASSWORD = "benchpass"
+
+CHUNK = 5000
+
+
+def insert_chunked(table, rows):
+    from __init__ import db
+
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[start:start + CHUNK])
+
+
+def person(rng):
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+
+def seed_database(devices, logs_per_device=10, seed=1):
+    # Must be called inside an app context with an empty database
+    from __init__ import db
+    from models import (
+        User, Device, DeviceLog, Personnel, PersonnelLog, Staff, StaffLog,
+        Repair, RepairLog,
+    )
+    from asset_index import rebuild_asset_index
+    from lifecycle import backfill_warranty_expiry
+
+    rng = random.Random(seed)
+    start_date = datetime.date(2018, 1, 1)
+    base_time = datetime.datetime(2023, 8, 1)
+
+    users = [
+        {
+            "id": 1,
+            "username": BENCH_USERNAME,
+            "password": generate_password_hash(BENCH_PASSWORD, method="pbkdf2:sha256"),
+            "is_admin": True,
+            "is_theresa": True,
+        }
+    ]
+    for i in range(2, 11):
+        users.append(
+            {
+                "id": i,
+                "username": f"tech{i:02d}",
+                "password": users[0]["password"],
+                "is_admin": False,
+                "is_theresa": i % 2 == 0,
+            }
+        )
+    insert_chunked(User.__table__, users)
+
+    device_rows = []
+    for i in range(1, devices + 1):
+        manufacturer = rng.choice(list(MANUFACTURERS))
+        first, last = person(rng)
+        status = rng.choice(DEVICE_STATUSES)
+        device_rows.append(
+            {
+                "id": i,
+                "model_name": rng.choice(MANUFACTURERS[manufacturer]),
+                "asset_number": str(100000 + i),
+                "serial_number": f"SN{rng.getrandbits(40):010X}{i}",
+                "manufacturer": manufacturer,
+                "purchase_date": start_date + datetime.timedelta(days=rng.randrange(2200)),
+                "warranty_info": f"{rng.choice([1, 2, 3, 4])} year warranty",
+                "assigned_user": f"{first} {last}" if status == "In Use" else "",
+                "status": status,
+            }
+        )
+    insert_chunked(Device.__table__, device_rows)
+
+    personnel_rows = []
+    for i in range(1, devices + 1):
+        first, last = person(rng)
+        handle = f"{first[0].lower()}{last.lower()}{i}"
+        personnel_rows.append(
+            {
+                "id": i,
+                "first_name": first,
+                "last_name": last,
+                "laptop_username": handle,
+                "laptop_password": f"pw{rng.getrandbits(24):06x}",
+                "microsoft_email": f"{handle}@school.org",
+                "microsoft_password": f"ms{rng.getrandbits(24):06x}",
+                "google_email": f"{handle}@students.school.org",
+                "google_password": f"gg{rng.getrandbits(24):06x}",
+                "clever_email": f"{handle}@clever.school.org",
+                "clever_password": f"cl{rng.getrandbits(24):06x}",
+                "powerschool_email": f"{handle}@ps.school.org",
+                "powerschool_password": f"ps{rng.getrandbits(24):06x}",
+                "device_id": 100000 + i,
+                "powercord_id": 500000 + i,
+            }
+        )
+    insert_chunked(Personnel.__table__, personnel_rows)
+
+    staff_count = max(devices // 10, 1)
+    staff_rows = []
+    for i in range(1, staff_count + 1):
+        first, last = person(rng)
+        staff_rows.append(
+            {
+                "id": i,
+                "first_name": first,
+                "last_name": last,
+                "title": rng.choice(TITLES),
+                "laptop_username": f"{first[0].lower()}{last.lower()}{i}",
+                "laptop_password": f"pw{rng.getrandbits(24):06x}",
+                "microsoft_password": f"ms{rng.getrandbits(24):06x}",
+                "google_password": f"gg{rng.getrandbits(24):06x}",
+                "xmedius_password": f"xm{rng.getrandbits(24):06x}",
+                "pin_code_number": str(rng.randrange(1000, 9999)),
+                "keri_card_number": str(rng.randrange(10000, 99999)),
+                "apple": f"{first.lower()}.{last.lower()}@icloud.com",
+                "device_id": str(100000 + rng.randrange(1, devices + 1)),
+                "powercord_id": str(500000 + i),
+                "notes": "",
+            }
+        )
+    insert_chunked(Staff.__table__, staff_rows)
+
+    repair_count = max(devices // 5, 1)
+    repair_rows = []
+    for i in range(1, repair_count + 1):
+        first, last = person(rng)
+        repair_rows.append(
+            {
+                "id": i,
+                "first_name": first,
+                "last_name": last,
+                "original_damage": "Cracked screen",
+                "asset_id": str(100000 + rng.randrange(1, devices + 1)),
+                "loaner_id": str(100000 + rng.randrange(1, devices + 1)),
+                "loaner_damage": "",
+                "status": rng.choice(REPAIR_STATUSES),
+                "new_computer_asset_id": "",
+                "new_computer_damages": "",
+                "notes": "",
+            }
+        )
+    insert_chunked(Repair.__table__, repair_rows)
+
+    def logs_for(model, fk, parent_count, per_parent):
+        rows = []
+        for parent_id in range(1, parent_count + 1):
+            for n in range(per_parent):
+                rows.append(
+                    {
+                        fk: parent_id,
+                        "change_description": f"Status changed from Available to In Use ({n})",
+                        "timestamp": base_time + datetime.timedelta(minutes=rng.randrange(1_000_000)),
+                        "user_id": rng.randrange(1, 11),
+                    }
+                )
+            if len(rows) >= CHUNK * 4:
+                insert_chunked(model.__table__, rows)
+                rows = []
+        insert_chunked(model.__table__, rows)
+
+    logs_for(DeviceLog, "device_id", devices, logs_per_device)
+    logs_for(PersonnelLog, "personnel_id", devices, max(logs_per_device // 4, 1))
+    logs_for(StaffLog, "staff_id", staff_count, max(logs_per_device // 4, 1))
+    logs_for(RepairLog, "repair_id", repair_count, max(logs_per_device // 4, 1))
+    db.session.commit()
+
+    rebuild_asset_index()
+    # The Core inserts above skip the flush hooks that fill warranty_expires
+    backfill_warranty_expiry()
+    db.session.commit()
+    return {
+        "devices": devices,
+        "personnel": devices,
+        "staff": staff_count,
+        "repairs": repair_count,
+        "device_logs": devices * logs_per_device,
+    }
+
+
+def seed_explorer(root, folders=20, files_per_folder=50, seed=1):
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    total = 0
+    for f in range(folders):
+        folder = os.path.join(root, f"Folder {f:03d}", "Scans")
+        os.makedirs(folder, exist_ok=True)
+        for n in range(files_per_folder):
+            ext = rng.choice([".txt", ".pdf", ".png", ".docx"])
+            path = os.path.join(folder, f"document_{n:05d}{ext}")
+            with open(path, "wb") as fh:
+                if ext == ".txt":
+                    fh.write(b"Scanned page text. " * rng.randrange(16, 400))
+                else:
+                    fh.write(os.urandom(rng.randrange(256, 8192)))
+            total += 1
+    return {"folders": folders, "files": total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Vault dataset.")
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--db", default=os.path.join("instance", "bench.db"))
+    parser.add_argument("--root", default="miniRoot")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    from config import Config
+    from __init__ import create_app
+
+    db_path = os.path.abspath(args.db)
+    if os.path.exists(db_path):
+        parser.error(f"{db_path} already exists, pick a new path")
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+    class SeedConfig(Config):
+        AUTO_MIGRATE = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+
+    scale = SCALES[args.scale]
+    app = create_app(SeedConfig)
+    with app.app_context():
+        counts = seed_database(scale["devices"], scale["logs_per_device"], args.seed)
+    counts.update(
+        seed_explorer(args.root, scale["folders"], scale["files_per_folder"], args.seed)
+    )
+    print(f"Seeded {db_path}: {counts}")
+    print(f"Log in as {BENCH_USERNAME} / {BENCH_PASSWORD}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Dev Dominic Minnich 2024
+# sorting.py
+
+# Sort orders the list pages accept. A sort_by value is a comma separated list
+# of columns, each optionally followed by asc or desc, e.g.
+#   /personnels?sort_by=last_name,first_name desc
+# Only the orders declared below are accepted, along with any leading prefix of
+# one or the exact reverse of one. Each declared order has a matching index
+# (built by migrations.py), so SQLite can walk the index instead of sorting.
+# Sorts on a single unique column use the column's own UNIQUE index.
+
+from models import Device, Personnel, Staff
+
+
+SORTS = {
+    Device: [
+        "model_name,asset_number",
+        "asset_number",
+        "serial_number",
+        "manufacturer,model_name",
+        "assigned_user",
+        "status,model_name",
+        "purchase_date",
+    ],
+    Personnel: [
+        "first_name,last_name",
+        "last_name,first_name",
+        "last_name,first_name desc",
+        "laptop_username",
+        "microsoft_email",
+    ],
+    Staff: [
+        "first_name,last_name",
+        "last_name,first_name",
+        "title,last_name",
+        "device_id",
+    ],
+}
+
+
+class InvalidSort(ValueError):
+    pass
+
+
+def parse_sort(value):
+    keys = []
+    for part in value.split(","):
+        words = part.split()
+        if not words or len(words) > 2:
+            raise InvalidSort(f"Invalid sort: {value}")
+        direction = words[1].lower() if len(words) == 2 else "asc"
+        if direction not in ("asc", "desc"):
+            raise InvalidSort(f"Invalid sort direction: {words[1]}")
+        keys.append((words[0], direction))
+    return tuple(keys)
+
+
+def reverse(keys):
+    return tuple((column, "asc" if d == "desc" else "desc") for column, d in keys)
+
+
+def allowed_sorts(model):
+    allowed = set()
+    for declared in SORTS[model]:
+        keys = parse_sort(declared)
+        for length in range(1, len(keys) + 1):
+            allowed.add(keys[:length])
+            allowed.add(reverse(keys[:length]))
+    return allowed
+
+
+ALLOWED = {model: allowed_sorts(model) for model in SORTS}
+
+
+def apply_sort(query, model, value):
+    keys = parse_sort(value)
+    if keys not in ALLOWED[model]:
+        raise InvalidSort(f"Sorting {model.__tablename__} by '{value}' is not supported")
+    for column, direction in keys:
+        attr = getattr(model, column)
+        query = query.order_by(attr.desc() if direction == "desc" else attr.asc())
+    return query
+
+
+def index_name(model, keys):
+    parts = [f"{column}_{direction}" for column, direction in keys]
+    return f"ix_sort_{model.__tablename__}_" + "_".join(parts)
+
+
+def has_unique_index(model, keys):
+    return len(keys) == 1 and bool(model.__table__.c[keys[0][0]].unique)
+
+
+def redundant_sort_indexes():
+    # Sort indexes older databases have that duplicate a UNIQUE index
+    return [
+        index_name(model, parse_sort(spec))
+        for model, declared in SORTS.items()
+        for spec in declared
+        if has_unique_index(model, parse_sort(spec))
+    ]
+
+
+def create_sort_indexes():
+    from migrations import create_index_if_missing
+
+    for model, declared in SORTS.items():
+        for spec in declared:
+            keys = parse_sort(spec)
+            if has_unique_index(model, keys):
+                continue
+            columns = ", ".join(f"{column} {direction.upper()}" for column, direction in keys)
+            create_index_if_missing(index_name(model, keys), model.__tablename__, columns)
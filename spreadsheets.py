@@ -0,0 +1,82 @@
+# Dev Dominic Minnich 2024
+# spreadsheets.py
+
+# Excel (.xlsx) versions of the exports and imports. Exports use openpyxl's
+# write-only mode, which streams rows out to a temp file instead of building
+# the sheet in memory. Imports use read-only mode and come back as lists of
+# strings, the same shape csv.reader gives, so import validation and the
+# commit loops do not care which format was uploaded.
+
+import csv
+import datetime
+import tempfile
+from io import StringIO
+
+
+class UploadFileError(ValueError):
+    pass
+
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+IMPORT_EXTENSIONS = (".csv", ".xlsx")
+
+
+def write_xlsx(header, row_fn, items, title):
+    # Returns an open temp file holding the workbook, ready for send_file
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    ws.append(header)
+    for item in items:
+        ws.append(row_fn(item))
+    fh = tempfile.TemporaryFile()
+    wb.save(fh)
+    fh.seek(0)
+    return fh
+
+
+def cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.strftime("%m/%d/%Y")  # what the imports expect
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def read_xlsx_rows(fh):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(fh, read_only=True, data_only=True)
+    try:
+        width = None
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            values = [cell_text(value) for value in row]
+            if width is None:
+                # Formatted but empty cells past the header are not columns
+                while values and not values[-1]:
+                    values.pop()
+                width = len(values)
+            elif not any(values):
+                continue
+            elif len(values) > width and not any(values[width:]):
+                values = values[:width]
+            elif len(values) < width:
+                values += [""] * (width - len(values))
+            yield values
+    finally:
+        wb.close()
+
+
+def read_upload_rows(file):
+    # Header and data rows of an uploaded .csv or .xlsx file
+    if file.filename.lower().endswith(".xlsx"):
+        rows = read_xlsx_rows(file.stream)
+    else:
+        rows = csv.reader(StringIO(file.stream.read().decode("UTF-8", errors="ignore")))
+    header = next(rows, None)
+    if not header or not any(cell.strip() for cell in header):
+        raise UploadFileError("The file is empty or has no header row.")
+    return header, list(rows)
@@ -0,0 +1,91 @@
+# Dev Dominic Minnich 2024
+# startup_profile.py
+
+# Opt-in boot profiler. With VAULT_STARTUP_PROFILE=1 it times every module
+# import (total and self time) and the create_app phases, then logs the
+# slowest ones once the app is built. install() has to run before the other
+# imports, which is why app.py and wsgi.py call it first.
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+
+ENABLED = os.environ.get("VAULT_STARTUP_PROFILE", "0") == "1"
+
+started = time.perf_counter()
+imports = {}  # module name -> [total seconds, self seconds]
+phases = []  # (name, seconds)
+stack = []
+
+
+class TimedLoader:
+    def __init__(self, loader):
+        self.loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack.append(0.0)
+        begin = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - begin
+            children = stack.pop()
+            if stack:
+                stack[-1] += total
+            imports[module.__name__] = [total, total - children]
+
+
+class TimingFinder(MetaPathFinder):
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+finder = TimingFinder()
+
+
+def install():
+    if ENABLED and finder not in sys.meta_path:
+        sys.meta_path.insert(0, finder)
+
+
+@contextmanager
+def phase(name):
+    if not ENABLED:
+        yield
+        return
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases.append((name, time.perf_counter() - begin))
+
+
+def report(logger, limit=25):
+    if not ENABLED:
+        return
+    sys.meta_path[:] = [f for f in sys.meta_path if f is not finder]
+    lines = [f"Startup took {(time.perf_counter() - started) * 1000:.1f}ms"]
+    lines.append("create_app phases:")
+    for name, seconds in phases:
+        lines.append(f"  {seconds * 1000:9.1f}ms  {name}")
+    lines.append(f"Slowest imports by self time (of {len(imports)}):")
+    slowest = sorted(imports.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (total, own) in slowest[:limit]:
+        lines.append(f"  {own * 1000:9.1f}ms self {total * 1000:9.1f}ms total  {name}")
+    logger.warning("\n".join(lines))
@@ -0,0 +1,32 @@
+// Dev Dominic Minnich 2024
+// archived_logs.js
+
+// Detail pages only show live log rows. Older rows are moved to the log
+// archive (see log_archive.py); this button fetches them on demand and
+// appends them under the live ones.
+
+document.addEventListener("DOMContentLoaded", () => {
+  document.querySelectorAll("[data-archived-logs]").forEach((button) => {
+    button.addEventListener("click", () => {
+      const tbody = document.getElementById(button.dataset.target);
+      button.disabled = true;
+      fetch(button.dataset.archivedLogs, { credentials: "same-origin" })
+        .then((response) => response.json())
+        .then((entries) => {
+          entries.forEach((entry) => {
+            const row = tbody.insertRow();
+            const when = entry.timestamp ? entry.timestamp.slice(0, 19).replace("T", " ") : "";
+            [when, entry.change_description, entry.username || ""].forEach((text) => {
+              row.insertCell().textContent = text;
+            });
+          });
+          button.textContent = entries.length
+            ? `${entries.length} archived entries shown`
+            : "No archived history";
+        })
+        .catch(() => {
+          button.disabled = false;
+        });
+    });
+  });
+});
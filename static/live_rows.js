@@ -0,0 +1,93 @@
+// Dev Dominic Minnich 2024
+// live_rows.js
+
+// Keeps list tables current from the /events feed instead of reloading the
+// page. Any <tbody data-live-entity="..."> with <tr data-id="..."> rows is
+// patched in place: an updated row is re-rendered from /rows/<entity>/<id>,
+// a deleted row is removed, and new rows only show a notice, because where
+// they belong depends on the page's search, filter and sort. On the repair
+// board each status column is its own tbody (data-live-status), and a row
+// whose status changed moves to the top of its new column. The script tag
+// carries data-script-root, "/<tenant>" when campuses are told apart by path.
+
+const liveRowsRoot = document.currentScript.dataset.scriptRoot || "";
+
+document.addEventListener("DOMContentLoaded", () => {
+  const bodies = {};
+  document.querySelectorAll("tbody[data-live-entity]").forEach((tbody) => {
+    (bodies[tbody.dataset.liveEntity] ||= []).push(tbody);
+  });
+  const entities = Object.keys(bodies);
+  if (!entities.length || !window.EventSource) {
+    return;
+  }
+
+  function showNewRowsNotice(tbody) {
+    const table = tbody.closest("table");
+    if (!table || table.previousElementSibling?.classList.contains("live-notice")) {
+      return;
+    }
+    const notice = document.createElement("div");
+    notice.className = "alert alert-info live-notice";
+    notice.innerHTML = 'New rows were added. <a href="">Reload</a> to see them.';
+    table.before(notice);
+  }
+
+  function placeRow(row, fresh) {
+    const tbody = row.parentElement;
+    const status = fresh.dataset.status;
+    if (!status || !tbody.dataset.liveStatus || tbody.dataset.liveStatus === status) {
+      row.replaceWith(fresh);
+      return;
+    }
+    const target = bodies[tbody.dataset.liveEntity].find(
+      (body) => body.dataset.liveStatus === status
+    );
+    row.remove();
+    if (target) {
+      target.prepend(fresh);
+    }
+  }
+
+  function refreshRow(entity, id, row) {
+    fetch(`${liveRowsRoot}/rows/${entity}/${id}`, { credentials: "same-origin" })
+      .then((response) => (response.ok ? response.text() : ""))
+      .then((html) => {
+        const template = document.createElement("template");
+        template.innerHTML = html.trim();
+        const fresh = template.content.querySelector("tr");
+        if (fresh) {
+          // Keep bulk selection checkboxes as the user left them
+          const box = row.querySelector("input[type=checkbox]");
+          const freshBox = fresh.querySelector("input[type=checkbox]");
+          if (box && freshBox) {
+            freshBox.checked = box.checked;
+          }
+          placeRow(row, fresh);
+        } else {
+          row.remove();
+        }
+      });
+  }
+
+  const source = new EventSource(`${liveRowsRoot}/events?entities=${entities.join(",")}`);
+  source.addEventListener("change", (e) => {
+    const change = JSON.parse(e.data);
+    const tbodies = bodies[change.entity];
+    if (!tbodies) {
+      return;
+    }
+    const row = tbodies
+      .map((tbody) => tbody.querySelector(`tr[data-id="${change.id}"]`))
+      .find((found) => found);
+    if (change.action === "deleted") {
+      if (row) {
+        row.remove();
+      }
+    } else if (row) {
+      refreshRow(change.entity, change.id, row);
+    } else if (change.action === "created") {
+      showNewRowsNotice(tbodies[0]);
+    }
+  });
+});
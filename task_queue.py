@@ -0,0 +1,225 @@
+# Dev Dominic Minnich 2024
+# task_queue.py
+
+# Small persistent task queue kept in the Task table. Routes and the scheduler
+# call enqueue(), and a pool of worker threads in each process claims queued
+# tasks highest priority first. Failed tasks are retried with backoff up to
+# max_attempts, and each task's status and JSON result stay in the table.
+# The claim is a conditional UPDATE, so a task is never picked up by two
+# workers even when several gunicorn processes share the database.
+
+import json
+import os
+import shutil
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+TASKS = {}
+wake_up = threading.Event()
+
+
+def task(name):
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, priority=0, max_attempts=3, user_id=None, run_after=None, **kwargs):
+    from __init__ import db
+    from models import Task
+
+    new_task = Task(
+        name=name,
+        args=json.dumps(kwargs),
+        priority=priority,
+        max_attempts=max_attempts,
+        user_id=user_id,
+        run_after=run_after or datetime.now(),
+    )
+    db.session.add(new_task)
+    db.session.commit()
+    wake_up.set()
+    return new_task.id
+
+
+def result_path(app, task_id, filename=None):
+    # Folder a task writes its output files to
+    from tenancy import tenant_dir
+
+    folder = os.path.join(tenant_dir(app) or app.instance_path, "task_results", str(task_id))
+    if filename is None:
+        return folder
+    return os.path.join(folder, filename)
+
+
+def claim_next(worker):
+    from __init__ import db
+    from models import Task
+
+    now = datetime.now()
+    candidates = (
+        db.session.query(Task.id)
+        .filter(Task.status == "queued", Task.run_after <= now)
+        .order_by(Task.priority.desc(), Task.id)
+        .limit(5)
+        .all()
+    )
+    for (task_id,) in candidates:
+        claimed = Task.query.filter_by(id=task_id, status="queued").update(
+            {
+                "status": "running",
+                "worker": worker,
+                "started_at": now,
+                "attempts": Task.attempts + 1,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        if claimed:
+            return db.session.get(Task, task_id)
+    return None
+
+
+def run_task(app, current):
+    from __init__ import db
+
+    try:
+        func = TASKS[current.name]
+        result = func(app, current.id, **json.loads(current.args))
+        current.status = "done"
+        current.result = json.dumps(result)
+        current.error = None
+    except Exception:
+        error = traceback.format_exc()
+        # A database error leaves the session unusable until rolled back, and
+        # the failure could then never be recorded
+        db.session.rollback()
+        current.error = error
+        if current.attempts < current.max_attempts:
+            # Back off 30s, 2m, 8m... before trying again
+            current.status = "queued"
+            current.run_after = datetime.now() + timedelta(
+                seconds=30 * 4 ** (current.attempts - 1)
+            )
+        else:
+            current.status = "failed"
+        app.logger.error(f"Task {current.id} ({current.name}) failed: {current.error}")
+    current.finished_at = datetime.now()
+    db.session.commit()
+
+
+def worker_loop(app, worker, stop):
+    from __init__ import db
+    from tenancy import tenant_names, using_tenant
+
+    while not stop.is_set():
+        # One task per tenant per round, so a busy campus can't starve the rest
+        busy = False
+        for tenant in tenant_names(app):
+            with using_tenant(tenant), app.app_context():
+                try:
+                    current = claim_next(worker)
+                    if current is not None:
+                        run_task(app, current)
+                        busy = True
+                except Exception:
+                    app.logger.error(f"Task worker {worker} error: {traceback.format_exc()}")
+                    db.session.rollback()
+        if busy:
+            continue
+        wake_up.wait(app.config["TASK_POLL_INTERVAL"])
+        wake_up.clear()
+
+
+def recover_stale_tasks(app):
+    # Tasks a dead worker left 'running' are queued again, or failed if that
+    # was their last attempt (the claim already counted it)
+    from __init__ import db
+    from models import Task
+    from tenancy import tenant_names, using_tenant
+
+    now = datetime.now()
+    cutoff = now - timedelta(seconds=app.config["TASK_STALE_AFTER"])
+    for tenant in tenant_names(app):
+        with using_tenant(tenant), app.app_context():
+            stale = Task.query.filter(Task.status == "running", Task.started_at < cutoff)
+            stale.filter(Task.attempts >= Task.max_attempts).update(
+                {
+                    "status": "failed",
+                    "error": "Worker stopped while running the last attempt",
+                    "finished_at": now,
+                },
+                synchronize_session=False,
+            )
+            stale.update({"status": "queued", "run_after": now}, synchronize_session=False)
+            db.session.commit()
+
+
+def recovery_loop(app, stop):
+    # Workers can die without the process restarting, so stale tasks are
+    # looked for all along, not only at startup
+    while not stop.wait(app.config["TASK_RECOVER_INTERVAL"]):
+        try:
+            recover_stale_tasks(app)
+        except Exception:
+            app.logger.error(f"Stale task recovery failed: {traceback.format_exc()}")
+
+
+def purge_task_results(app, task_id):
+    shutil.rmtree(result_path(app, task_id), ignore_errors=True)
+
+
+def purge_old_task_results(app, max_age):
+    # Result files of tasks that finished more than max_age ago, and of tasks
+    # whose row is gone. Works from the folders on disk, so each result is
+    # looked at once. The Task rows stay.
+    from __init__ import db
+    from models import Task
+
+    folder = os.path.dirname(result_path(app, 0))
+    if not os.path.isdir(folder):
+        return 0
+    task_ids = [int(name) for name in os.listdir(folder) if name.isdigit()]
+    cutoff = datetime.now() - max_age
+    # Queued tasks may be retries with a finished_at from the failed attempt
+    recent = {
+        task_id
+        for (task_id,) in db.session.query(Task.id).filter(
+            Task.id.in_(task_ids),
+            db.or_(
+                Task.status.in_(["queued", "running"]),
+                Task.finished_at.is_(None),
+                Task.finished_at >= cutoff,
+            ),
+        )
+    }
+    purged = [task_id for task_id in task_ids if task_id not in recent]
+    for task_id in purged:
+        purge_task_results(app, task_id)
+    return len(purged)
+
+
+def start_task_workers(app):
+    count = app.config["TASK_WORKERS"]
+    if count <= 0:
+        return None
+
+    import tasks  # registers the task functions
+    from scheduler import worker_name
+
+    recover_stale_tasks(app)
+    stop = threading.Event()
+    for n in range(count):
+        thread = threading.Thread(
+            target=worker_loop,
+            args=(app, f"{worker_name()}#{n}", stop),
+            name=f"task-worker-{n}",
+            daemon=True,
+        )
+        thread.start()
+    threading.Thread(
+        target=recovery_loop, args=(app, stop), name="task-recovery", daemon=True
+    ).start()
+    return stop
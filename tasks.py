@@ -0,0 +1,46 @@
+# Dev Dominic Minnich 2024
+# tasks.py
+
+# Task functions run by the task_queue worker pool. Each gets the app, its
+# task id and the keyword arguments it was enqueued with, and returns a
+# JSON-able result stored on the Task row.
+
+import os
+import shutil
+
+from task_queue import task, result_path
+
+
+@task("export_csv")
+def export_csv(app, task_id, kind):
+    from exports import export_spec, write_csv
+
+    model, header, row_fn = export_spec(kind)
+    folder = result_path(app, task_id)
+    os.makedirs(folder, exist_ok=True)
+    filename = f"{kind}.csv"
+    with open(os.path.join(folder, filename), "w", newline="", encoding="utf-8") as fh:
+        write_csv(fh, header, row_fn, model.query.yield_per(1000))
+    return {"file": filename}
+
+
+@task("zip_folder")
+def zip_folder(app, task_id, folder_path):
+    from routes import is_safe_path, root_dir
+
+    abs_folder_path = os.path.join(root_dir(), folder_path.lstrip("/"))
+    if not is_safe_path(root_dir(), abs_folder_path) or not os.path.isdir(abs_folder_path):
+        raise ValueError(f"Folder not found: {folder_path}")
+    folder = result_path(app, task_id)
+    os.makedirs(folder, exist_ok=True)
+    name = os.path.basename(abs_folder_path.rstrip(os.sep)) or "miniRoot"
+    zip_path = shutil.make_archive(os.path.join(folder, name), "zip", abs_folder_path)
+    return {"file": os.path.basename(zip_path)}
+
+
+@task("scheduled_job")
+def scheduled_job(app, task_id, job_id):
+    from scheduler import run_job
+
+    run_job(app, job_id)
+    return {"job_id": job_id}
@@ -0,0 +1,150 @@
+# Dev Dominic Minnich 2024
+# tenancy.py
+
+# One process pool serving several campuses. TENANTS in config.py names them
+# and each gets its own folder under TENANT_DIR holding its inventory.db,
+# miniRoot, backups, task results and log archive. A request's tenant comes
+# from the Host header or the first path segment (TENANT_ROUTING) and is kept
+# in the WSGI environ; TenantSession hands db.session that tenant's engine.
+# Engines are made on first use and kept in a small LRU, so a campus nobody is
+# using doesn't hold connections open. Background work picks its tenant with
+# using_tenant(). With TENANTS empty nothing changes: the configured database
+# and the old cwd layout are used.
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import sqlalchemy as sa
+from flask import current_app, has_request_context, request
+from flask.sessions import SecureCookieSessionInterface
+from flask_sqlalchemy.session import Session
+from werkzeug.exceptions import NotFound
+
+
+tenant_var = ContextVar("vault_tenant", default=None)
+
+
+def current_tenant():
+    tenant = tenant_var.get()
+    if tenant is None and has_request_context():
+        # Also covers streamed responses that outlive the view function
+        tenant = request.environ.get("vault.tenant")
+    return tenant
+
+
+@contextmanager
+def using_tenant(name):
+    token = tenant_var.set(name)
+    try:
+        yield
+    finally:
+        tenant_var.reset(token)
+
+
+def tenant_names(app):
+    # [None] on a single-tenant install, so callers can always loop
+    return list(app.config["TENANTS"]) or [None]
+
+
+def tenant_dir(app=None):
+    # The current tenant's folder, or None on a single-tenant install
+    tenant = current_tenant()
+    if tenant is None:
+        return None
+    return os.path.join((app or current_app).config["TENANT_DIR"], tenant)
+
+
+def tenant_database(app, name):
+    return os.path.join(app.config["TENANT_DIR"], name, "inventory.db")
+
+
+def create_tenant_engine(app, name):
+    from journal import init_journal
+
+    path = tenant_database(app, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    engine = sa.create_engine(f"sqlite:///{path}", **app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+    init_journal(app, engine)
+    return engine
+
+
+class TenantEngines:
+    def __init__(self, max_engines):
+        self.max_engines = max_engines
+        self.engines = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, app, name):
+        with self.lock:
+            engine = self.engines.get(name)
+            if engine is not None:
+                self.engines.move_to_end(name)
+                return engine
+            engine = self.engines[name] = create_tenant_engine(app, name)
+            while len(self.engines) > self.max_engines:
+                # Connections checked out right now are closed when returned
+                _, evicted = self.engines.popitem(last=False)
+                evicted.dispose()
+            return engine
+
+
+engines = TenantEngines(8)
+
+
+class TenantSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        tenant = current_tenant()
+        if bind is None and tenant is not None:
+            return engines.get(current_app._get_current_object(), tenant)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class TenantSessionInterface(SecureCookieSessionInterface):
+    # A login on one campus must not be a login on the others
+    def get_cookie_name(self, app):
+        name = super().get_cookie_name(app)
+        tenant = request.environ.get("vault.tenant")
+        return f"{name}_{tenant}" if tenant else name
+
+
+class TenantMiddleware:
+    def __init__(self, app, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.routing = app.config["TENANT_ROUTING"]
+        self.tenants = set(app.config["TENANTS"])
+        self.hosts = {
+            host.lower(): name
+            for name, tenant in app.config["TENANTS"].items()
+            for host in tenant.get("hosts", ())
+        }
+
+    def resolve(self, environ):
+        if self.routing == "path":
+            # /north/devices is /devices for north, and url_for keeps the prefix
+            path = environ.get("PATH_INFO", "")
+            name, _, rest = path.lstrip("/").partition("/")
+            if name not in self.tenants:
+                return None
+            environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + "/" + name
+            environ["PATH_INFO"] = "/" + rest
+            return name
+        host = environ.get("HTTP_HOST", "").rsplit(":", 1)[0].lower()
+        return self.hosts.get(host)
+
+    def __call__(self, environ, start_response):
+        tenant = self.resolve(environ)
+        if tenant is None:
+            return NotFound()(environ, start_response)
+        environ["vault.tenant"] = tenant
+        return self.wsgi_app(environ, start_response)
+
+
+def init_tenancy(app):
+    engines.max_engines = app.config["TENANT_ENGINE_CACHE_SIZE"]
+    if not app.config["TENANTS"]:
+        return
+    app.wsgi_app = TenantMiddleware(app, app.wsgi_app)
+    app.session_interface = TenantSessionInterface()
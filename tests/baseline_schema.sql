@@ -0,0 +1,130 @@
+-- Dev Dominic Minnich 2024
+-- tests/baseline_schema.sql
+
+-- Schema of a database made by the original create_all, before migrations.py
+-- existed (PRAGMA user_version 0). Kept frozen so upgrades can be tested from it.
+
+CREATE TABLE user (
+	id INTEGER NOT NULL, 
+	username VARCHAR(20) NOT NULL, 
+	password VARCHAR(60) NOT NULL, 
+	is_admin BOOLEAN NOT NULL, 
+	is_theresa BOOLEAN NOT NULL, 
+	PRIMARY KEY (id), 
+	UNIQUE (username)
+);
+
+CREATE TABLE device (
+	id INTEGER NOT NULL, 
+	model_name VARCHAR(150) NOT NULL, 
+	asset_number VARCHAR(150) NOT NULL, 
+	serial_number VARCHAR(150) NOT NULL, 
+	manufacturer VARCHAR(150) NOT NULL, 
+	purchase_date DATE NOT NULL, 
+	warranty_info VARCHAR(300), 
+	assigned_user VARCHAR(150), 
+	status VARCHAR(50) NOT NULL, 
+	PRIMARY KEY (id), 
+	UNIQUE (asset_number), 
+	UNIQUE (serial_number)
+);
+
+CREATE TABLE staff (
+	id INTEGER NOT NULL, 
+	first_name VARCHAR(150) NOT NULL, 
+	last_name VARCHAR(150) NOT NULL, 
+	title VARCHAR(150) NOT NULL, 
+	laptop_username VARCHAR(150) NOT NULL, 
+	laptop_password VARCHAR(150) NOT NULL, 
+	microsoft_password VARCHAR(150) NOT NULL, 
+	google_password VARCHAR(150) NOT NULL, 
+	xmedius_password VARCHAR(150) NOT NULL, 
+	pin_code_number VARCHAR(150) NOT NULL, 
+	keri_card_number VARCHAR(150) NOT NULL, 
+	apple VARCHAR(150) NOT NULL, 
+	device_id VARCHAR(150) NOT NULL, 
+	powercord_id VARCHAR(150) NOT NULL, 
+	notes VARCHAR(150) NOT NULL, 
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE repair (
+	id INTEGER NOT NULL, 
+	first_name VARCHAR(100) NOT NULL, 
+	last_name VARCHAR(100) NOT NULL, 
+	original_damage TEXT, 
+	asset_id VARCHAR(100) NOT NULL, 
+	loaner_id VARCHAR(100), 
+	loaner_damage TEXT, 
+	slip_picture VARCHAR(120), 
+	original_computer_damage_picture VARCHAR(120), 
+	status VARCHAR(50) NOT NULL, 
+	new_computer_asset_id VARCHAR(100), 
+	new_computer_damages TEXT, 
+	notes TEXT, 
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE personnel (
+	id INTEGER NOT NULL, 
+	first_name VARCHAR(150) NOT NULL, 
+	last_name VARCHAR(150) NOT NULL, 
+	laptop_username VARCHAR(150) NOT NULL, 
+	laptop_password VARCHAR(150) NOT NULL, 
+	microsoft_email VARCHAR(150) NOT NULL, 
+	microsoft_password VARCHAR(150) NOT NULL, 
+	google_email VARCHAR(150) NOT NULL, 
+	google_password VARCHAR(150) NOT NULL, 
+	clever_email VARCHAR(150) NOT NULL, 
+	clever_password VARCHAR(150) NOT NULL, 
+	powerschool_email VARCHAR(150) NOT NULL, 
+	powerschool_password VARCHAR(150) NOT NULL, 
+	device_id INTEGER, 
+	powercord_id INTEGER, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(device_id) REFERENCES device (id)
+);
+
+CREATE TABLE device_log (
+	id INTEGER NOT NULL, 
+	device_id INTEGER NOT NULL, 
+	change_description VARCHAR(500) NOT NULL, 
+	timestamp DATETIME, 
+	user_id INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(device_id) REFERENCES device (id), 
+	FOREIGN KEY(user_id) REFERENCES user (id)
+);
+
+CREATE TABLE staff_log (
+	id INTEGER NOT NULL, 
+	staff_id INTEGER NOT NULL, 
+	change_description VARCHAR(500) NOT NULL, 
+	timestamp DATETIME, 
+	user_id INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(staff_id) REFERENCES staff (id), 
+	FOREIGN KEY(user_id) REFERENCES user (id)
+);
+
+CREATE TABLE repair_log (
+	id INTEGER NOT NULL, 
+	repair_id INTEGER NOT NULL, 
+	change_description VARCHAR(500) NOT NULL, 
+	timestamp DATETIME, 
+	user_id INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(repair_id) REFERENCES repair (id), 
+	FOREIGN KEY(user_id) REFERENCES user (id)
+);
+
+CREATE TABLE personnel_log (
+	id INTEGER NOT NULL, 
+	personnel_id INTEGER NOT NULL, 
+	change_description VARCHAR(500) NOT NULL, 
+	timestamp DATETIME, 
+	user_id INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(personnel_id) REFERENCES personnel (id), 
+	FOREIGN KEY(user_id) REFERENCES user (id)
+);
@@ -0,0 +1,58 @@
+# Dev Dominic Minnich 2024
+# tests/conftest.py
+
+# Every test gets its own folder as cwd (miniRoot, backups) and its own
+# SQLite file. Run with `python -m pytest -q` from the repository root.
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    from __init__ import create_app
+
+    monkeypatch.chdir(tmp_path)
+
+    def make(db_path=None, **overrides):
+        settings = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path or tmp_path / 'inventory.db'}",
+            "WTF_CSRF_ENABLED": False,
+            "AUTO_MIGRATE": True,
+            "SCHEDULER_MODE": "off",
+            "JOURNAL_ENABLED": False,
+            "LOG_ARCHIVE_DIR": str(tmp_path / "log_archive"),
+        }
+        settings.update(overrides)
+        app = create_app(type("TestConfig", (Config,), settings))
+        app.instance_path = str(tmp_path / "instance")
+        return app
+
+    return make
+
+
+@pytest.fixture
+def login():
+    # A test client signed in as a fresh user of the given kind
+    def sign_in(app, username="tester", admin=True):
+        from __init__ import db
+        from models import User
+
+        with app.app_context():
+            user = User(username=username, is_admin=admin)
+            user.set_password("pw123456")
+            db.session.add(user)
+            db.session.commit()
+        client = app.test_client()
+        response = client.post("/login", data={"username": username, "password": "pw123456"})
+        assert response.status_code == 302
+        return client
+
+    return sign_in
@@ -0,0 +1,68 @@
+# Dev Dominic Minnich 2024
+# tests/test_backup_retention.py
+
+import os
+import time
+
+import journal
+from backup_db import snapshot_info_path
+from backup_verify import backup_folder, prune_backups, write_manifest
+from journal import append_line, journal_dir, prune_journal, read_entries
+
+DAY_NS = 24 * 3600 * 10**9
+START_NS = 1_700_000_000 * 10**9  # 2023-11-14
+
+
+def make_backup(day, verification=None):
+    folder = backup_folder()
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"backup_202311{14 + day:02d}_000000.db")
+    open(path, "w").close()
+    manifest = {"taken_ns": START_NS + day * DAY_NS}
+    if verification is not None:
+        manifest["verification"] = verification
+    write_manifest(path, manifest)
+    return path
+
+
+def test_keeps_the_newest_backups_and_the_newest_verified_one(make_app):
+    make_app()
+    good = make_backup(0, {"ok": True, "integrity": "ok"})
+    paths = [make_backup(day, {"ok": False, "integrity": "ok"}) for day in range(1, 4)]
+
+    assert prune_backups(keep=2) == START_NS
+    assert sorted(os.listdir(backup_folder())) == sorted(
+        os.path.basename(name) for path in [good] + paths[1:] for name in (path, snapshot_info_path(path))
+    )
+
+
+def test_nothing_verified_means_nothing_to_prune_from(make_app):
+    make_app()
+    for day in range(3):
+        make_backup(day)
+    assert prune_backups(keep=0) is None
+    assert len(os.listdir(backup_folder())) == 6
+
+
+def test_oldest_usable_backup_bounds_the_journal(make_app):
+    make_app()
+    make_backup(0, {"ok": False, "integrity": ["page 2 is never used"]})
+    make_backup(1, {"ok": False, "integrity": "ok"})
+    make_backup(2, {"ok": True, "integrity": "ok"})
+    assert prune_backups(keep=0) == START_NS + DAY_NS
+
+
+def test_prune_journal_drops_whole_days_before_the_backup(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "inventory.db")
+    monkeypatch.setattr(journal, "files", {})
+    monkeypatch.setitem(journal.journaled, db_path, False)
+    for day in range(4):
+        append_line(db_path, {"ts": START_NS + day * DAY_NS, "statements": [["DELETE FROM device", [], False]]})
+
+    removed = prune_journal(db_path, START_NS + 2 * DAY_NS + 3600 * 10**9)
+
+    assert removed == [time.strftime("%Y%m%d", time.gmtime(START_NS / 1e9 + day * 86400)) for day in (0, 1)]
+    assert len(os.listdir(journal_dir(db_path))) == 2
+    assert [e["ts"] for e in read_entries(db_path, 0, START_NS + 10 * DAY_NS)] == [
+        START_NS + 2 * DAY_NS, START_NS + 3 * DAY_NS
+    ]
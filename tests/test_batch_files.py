@@ -0,0 +1,62 @@
+# Dev Dominic Minnich 2024
+# tests/test_batch_files.py
+
+import os
+
+import pytest
+
+
+@pytest.fixture
+def client(make_app, login):
+    app = make_app()
+    os.makedirs(os.path.join("miniRoot", "docs"))
+    with open(os.path.join("miniRoot", "docs", "a.txt"), "w") as f:
+        f.write("hello")
+    return login(app)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        [],
+        "delete everything",
+        {"operations": ["docs/a.txt"]},
+        {"operations": [None]},
+        {"operations": [{"path": "docs/a.txt"}]},
+        {"operations": [{"op": "shred", "path": "docs/a.txt"}]},
+        {"operations": [{"op": ["delete"], "path": "docs/a.txt"}]},
+        {"operations": [{"op": "delete", "path": 7}]},
+        {"operations": [{"op": "rename", "path": "docs/a.txt", "new_name": 7}]},
+        {"operations": [{"op": "move", "path": "docs/a.txt", "target_dir": {}}]},
+        {"operations": [{"op": "delete", "path": "docs/a.txt"}], "sort": 1},
+        {"operations": [{"op": "delete", "path": "docs/a.txt"}], "dir": ["docs"]},
+    ],
+)
+def test_malformed_batches_are_rejected(client, body):
+    response = client.post("/batch_files", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+    assert os.path.exists(os.path.join("miniRoot", "docs", "a.txt"))
+
+
+def test_body_that_is_not_json(client):
+    response = client.post("/batch_files", data="operations", content_type="text/plain")
+    assert response.status_code == 400
+
+
+def test_rename_and_delete(client):
+    with open(os.path.join("miniRoot", "docs", "b.txt"), "w") as f:
+        f.write("bye")
+    response = client.post(
+        "/batch_files",
+        json={
+            "dir": "/docs",
+            "operations": [
+                {"op": "rename", "path": "/docs/a.txt", "new_name": "c.txt"},
+                {"op": "delete", "path": "/docs/b.txt"},
+            ],
+        },
+    )
+    assert response.status_code == 200
+    assert [result["ok"] for result in response.get_json()["results"]] == [True, True]
+    assert sorted(os.listdir(os.path.join("miniRoot", "docs"))) == ["c.txt"]
@@ -0,0 +1,63 @@
+# Dev Dominic Minnich 2024
+# tests/test_device_permissions.py
+
+import datetime
+
+import pytest
+
+from __init__ import db
+from models import Device
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        device = Device(
+            model_name="Latitude 3120", asset_number="10001", serial_number="SN1",
+            manufacturer="Dell", purchase_date=datetime.date(2022, 1, 1),
+            warranty_info="3 years", status="Available",
+        )
+        db.session.add(device)
+        db.session.commit()
+    return app
+
+
+def edit_form(**changes):
+    form = {
+        "model_name": "Latitude 3120", "asset_number": "10001", "serial_number": "SN1",
+        "manufacturer": "Dell", "purchase_date": "2022-01-01", "warranty_info": "3 years",
+        "assigned_user": "", "status": "Available",
+    }
+    form.update(changes)
+    return form
+
+
+def device_status(app):
+    with app.app_context():
+        device = Device.query.first()
+        return device.status if device else None
+
+
+def test_single_device_changes_need_an_admin_like_bulk(app, login):
+    client = login(app, admin=False)
+
+    assert client.get("/devices/1").status_code == 200
+    assert client.get("/edit_device/1").status_code == 302
+    client.post("/edit_device/1", data=edit_form(status="In Repair"))
+    client.post("/devices/1", data=edit_form(status="In Repair"))
+    client.post("/devices/bulk", data={"action": "set_status", "status": "In Repair", "device_ids": ["1"]})
+    assert device_status(app) == "Available"
+
+    client.post("/delete_device/1")
+    client.post("/devices/bulk", data={"action": "delete", "device_ids": ["1"]})
+    assert device_status(app) == "Available"
+
+
+def test_admins_can_edit_and_delete(app, login):
+    client = login(app, admin=True)
+
+    client.post("/edit_device/1", data=edit_form(status="In Repair"))
+    assert device_status(app) == "In Repair"
+    client.post("/delete_device/1")
+    assert device_status(app) is None
@@ -0,0 +1,41 @@
+# Dev Dominic Minnich 2024
+# tests/test_lifecycle.py
+
+import datetime
+
+from lifecycle import parse_warranty_expiry
+
+
+PURCHASED = datetime.date(2022, 1, 31)
+
+
+def test_durations_count_from_the_purchase_date():
+    assert parse_warranty_expiry(PURCHASED, "3 years") == datetime.date(2025, 1, 31)
+    assert parse_warranty_expiry(PURCHASED, "one month") == datetime.date(2022, 2, 28)
+    assert parse_warranty_expiry(PURCHASED, "90 days") == datetime.date(2022, 5, 1)
+
+
+def test_explicit_dates_win():
+    assert parse_warranty_expiry(PURCHASED, "3 years, ends 2024-06-30") == datetime.date(2024, 6, 30)
+    assert parse_warranty_expiry(PURCHASED, "until 6/30/24") == datetime.date(2024, 6, 30)
+
+
+def test_unusable_text_gives_none():
+    for text in ("", "lifetime", "2024-13-45", "100000 years", "9999999 days", "99999999999 weeks"):
+        assert parse_warranty_expiry(PURCHASED, text) is None
+
+
+def test_saving_a_device_with_an_absurd_warranty(make_app):
+    app = make_app()
+
+    from __init__ import db
+    from models import Device
+
+    with app.app_context():
+        device = Device(
+            model_name="Latitude 3120", asset_number="10001", serial_number="SN1",
+            manufacturer="Dell", purchase_date=PURCHASED, warranty_info="100000 years",
+        )
+        db.session.add(device)
+        db.session.commit()
+        assert device.warranty_expires is None
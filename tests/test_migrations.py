@@ -0,0 +1,60 @@
+# Dev Dominic Minnich 2024
+# tests/test_migrations.py
+
+import datetime
+import os
+import sqlite3
+
+from migrations import LATEST_VERSION, current_version
+
+
+BASELINE_SCHEMA = os.path.join(os.path.dirname(__file__), "baseline_schema.sql")
+
+
+def make_baseline_db(path):
+    conn = sqlite3.connect(path)
+    with open(BASELINE_SCHEMA) as fh:
+        conn.executescript(fh.read())
+    conn.execute(
+        "INSERT INTO device (model_name, asset_number, serial_number, manufacturer,"
+        " purchase_date, warranty_info, status)"
+        " VALUES ('Latitude 3120', '10001', 'SN1', 'Dell', '2022-01-01', '3 years', 'In Use')"
+    )
+    conn.execute(
+        "INSERT INTO repair (first_name, last_name, asset_id, loaner_id, status)"
+        " VALUES ('Ada', 'Lovelace', '10001', '20002', 'repair_pending')"
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_upgrade_from_baseline_schema(make_app, tmp_path):
+    db_path = tmp_path / "baseline.db"
+    make_baseline_db(db_path)
+
+    app = make_app(db_path)
+
+    from __init__ import db
+    from models import AssetIndex, Device
+
+    with app.app_context():
+        assert current_version() == LATEST_VERSION
+        entries = {(row.asset, row.entity, row.field) for row in AssetIndex.query}
+        assert entries == {
+            ("10001", "device", "asset_number"),
+            ("10001", "repair", "asset_id"),
+            ("20002", "repair", "loaner_id"),
+        }
+        device = db.session.get(Device, 1)
+        assert device.warranty_expires == datetime.date(2025, 1, 1)
+        assert device.updated_at is not None
+
+
+def test_upgrade_is_a_no_op_on_a_current_database(make_app, tmp_path):
+    app = make_app()
+    with app.app_context():
+        assert current_version() == LATEST_VERSION
+    # A second start finds nothing to do
+    app = make_app()
+    with app.app_context():
+        assert current_version() == LATEST_VERSION
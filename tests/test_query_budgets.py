@@ -0,0 +1,58 @@
+# Dev Dominic Minnich 2024
+# tests/test_query_budgets.py
+
+# Every page with a SQL_QUERY_BUDGETS entry, requested on seeded data with
+# SQL_QUERY_BUDGET_STRICT on, so a route that picks up an N+1 lazy load fails
+# here instead of only logging a warning.
+
+from urllib.parse import urlsplit
+
+import pytest
+
+import seed_data
+
+PAGES = [
+    ("GET", "/devices"),
+    ("GET", "/devices?search=Dell&sort=asset_number&order=desc"),
+    ("GET", "/devices/5"),
+    ("GET", "/personnels"),
+    ("GET", "/personnels?search=a"),
+    ("GET", "/personnels/5"),
+    ("GET", "/staffs"),
+    ("GET", "/staffs/5"),
+    ("GET", "/repairs"),
+    ("GET", "/repair/5/detail"),
+    ("GET", "/lookup/100005"),
+    ("POST", "/scan"),
+]
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(SQL_PROFILING=True, SQL_QUERY_BUDGET_STRICT=True)
+    with app.app_context():
+        seed_data.seed_database(200, logs_per_device=10)
+    return app
+
+
+def test_every_budget_has_a_page(app):
+    urls = app.url_map.bind("localhost")
+    endpoints = {urls.match(urlsplit(url).path, method)[0] for method, url in PAGES}
+    assert endpoints == set(app.config["SQL_QUERY_BUDGETS"])
+
+
+def test_pages_stay_within_their_query_budgets(app):
+    client = app.test_client()
+    client.post(
+        "/login",
+        data={"username": seed_data.BENCH_USERNAME, "password": seed_data.BENCH_PASSWORD},
+    )
+    for method, url in PAGES:
+        if method == "POST":
+            response = client.post(url, json={"code": "100005", "action": "check_in"})
+        else:
+            response = client.get(url)
+        # Over budget raises QueryBudgetExceeded out of the request
+        assert response.status_code == 200, url
+        assert "X-SQL-Queries" in response.headers, url
+        assert "X-SQL-N-Plus-One" not in response.headers, url
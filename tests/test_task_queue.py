@@ -0,0 +1,61 @@
+# Dev Dominic Minnich 2024
+# tests/test_task_queue.py
+
+import os
+from datetime import datetime, timedelta
+
+from __init__ import db
+from models import Task
+from task_queue import purge_old_task_results, recover_stale_tasks, result_path
+
+
+def add_task(**fields):
+    task = Task(name="export_csv", args="{}", **fields)
+    db.session.add(task)
+    db.session.commit()
+    return task.id
+
+
+def test_stale_tasks_on_their_last_attempt_fail(make_app):
+    app = make_app()
+    long_ago = datetime.now() - timedelta(days=1)
+    with app.app_context():
+        retry = add_task(status="running", attempts=1, max_attempts=3, started_at=long_ago)
+        last = add_task(status="running", attempts=3, max_attempts=3, started_at=long_ago)
+        fresh = add_task(status="running", attempts=3, max_attempts=3, started_at=datetime.now())
+
+    recover_stale_tasks(app)
+
+    with app.app_context():
+        assert db.session.get(Task, retry).status == "queued"
+        failed = db.session.get(Task, last)
+        assert failed.status == "failed"
+        assert failed.finished_at is not None and failed.error
+        assert db.session.get(Task, fresh).status == "running"
+
+
+def test_old_results_are_purged(make_app):
+    app = make_app()
+    now = datetime.now()
+    with app.app_context():
+        old = add_task(status="done", finished_at=now - timedelta(days=8))
+        new = add_task(status="done", finished_at=now - timedelta(days=1))
+        retrying = add_task(status="queued", finished_at=now - timedelta(days=8))
+        orphan = 999
+        for task_id in (old, new, retrying, orphan):
+            os.makedirs(result_path(app, task_id))
+
+        assert purge_old_task_results(app, timedelta(days=7)) == 2
+
+    remaining = sorted(os.listdir(os.path.dirname(result_path(app, 0))))
+    assert remaining == sorted([str(new), str(retrying)])
+
+
+def test_expired_results_are_not_offered(make_app, login):
+    app = make_app()
+    client = login(app)
+    with app.app_context():
+        task_id = add_task(status="done", result='{"file": "devices.csv"}', user_id=1)
+
+    assert client.get(f"/tasks/{task_id}").get_json()["download_url"] is None
+    assert client.get(f"/tasks/{task_id}/download").status_code == 410
@@ -0,0 +1,34 @@
+# Dev Dominic Minnich 2024
+# tests/test_tenant_urls.py
+
+import re
+
+from __init__ import db
+from models import User
+from tenancy import using_tenant
+
+
+def test_pages_call_back_under_the_tenant_prefix(make_app, tmp_path):
+    app = make_app(
+        TENANTS={"north": {}, "south": {}},
+        TENANT_ROUTING="path",
+        TENANT_DIR=str(tmp_path / "tenants"),
+    )
+    with using_tenant("north"), app.app_context():
+        user = User(username="tester", is_admin=True)
+        user.set_password("pw123456")
+        db.session.add(user)
+        db.session.commit()
+    client = app.test_client()
+    assert client.post("/north/login", data={"username": "tester", "password": "pw123456"}).status_code == 302
+
+    page = client.get("/north/web_files").get_data(as_text=True)
+    assert 'const scriptRoot = "/north";' in page
+    assert not re.search(r"""(fetch\(\s*|location\.href = )["'`]/""", page)
+    # What the explorer's first fetch asks for
+    assert client.get("/north/list?dir=&query=&sort=name-asc&offset=0").status_code == 200
+    assert client.get("/list?dir=&query=&sort=name-asc&offset=0").status_code == 404
+
+    for page in ("devices", "personnels", "repairs", "staffs"):
+        html = client.get(f"/north/{page}").get_data(as_text=True)
+        assert 'live_rows.js" data-script-root="/north"' in html
@@ -0,0 +1,29 @@
+# Dev Dominic Minnich 2024
+# wsgi.py
+
+# Production entry point, e.g.
+#   gunicorn --workers 4 --worker-class gthread --threads 16 --bind 0.0.0.0:8000 wsgi:app
+# Use threaded workers: every open list page keeps an /events stream, and a
+# stream holds its thread for up to CHANGE_FEED_MAX_STREAM seconds. Under
+# plain sync workers /events falls back to short polls so it can't take every
+# worker, but the live updates then cost a request every few seconds per tab.
+# Every worker starts the scheduler but only the elected leader runs jobs,
+# so there is exactly one backup no matter how many workers there are.
+# Set SCHEDULER_MODE=off to run the web workers without any scheduler, and
+# TASK_WORKERS to size the background task thread pool in each worker.
+# Run `python migrations.py` before starting the workers after an upgrade.
+# /metrics counts per worker process, so with --workers 4 each scrape shows
+# one worker's share (see metrics.py).
+# To serve several campuses from the same workers, list them in TENANTS in
+# config.py (see tenancy.py); the scheduler and task workers cover all of them.
+
+import startup_profile
+startup_profile.install()
+
+from __init__ import create_app
+from scheduler import start_scheduler
+from task_queue import start_task_workers
+
+app = create_app()
+start_scheduler(app)
+start_task_workers(app)